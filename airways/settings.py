@@ -4,8 +4,10 @@ Django settings for airways project.
 
 from pathlib import Path
 import os
+import tempfile
 import dj_database_url
 from decouple import config
+from whitenoise.compress import Compressor
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -45,34 +47,52 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
-    'whitenoise.middleware.WhiteNoiseMiddleware', 
+    # WhiteNoise que também corre em ASGI sem obrigar o resto da cadeia a passar por threads
+    'core.middleware.WhiteNoiseMiddleware',
+    # Depois do WhiteNoise: mede só pedidos à aplicação, incluindo as consultas da sessão
+    'core.metrics.MetricsMiddleware',
+    # Só síncrono: com a amostragem ligada em ASGI, o Django adapta a cadeia a threads
+    'core.profiling.RequestProfilingMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
-    'django.contrib.auth.middleware.AuthenticationMiddleware',
+    # AuthenticationMiddleware com o usuário em cache (ver core/user_cache.py)
+    'core.user_cache.CachedAuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
 ROOT_URLCONF = 'airways.urls'
 
+TEMPLATE_LOADERS = [
+    'django.template.loaders.filesystem.Loader',
+    'django.template.loaders.app_directories.Loader',
+]
+
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # DjangoTemplates com medição do tempo de renderização para o RequestProfilingMiddleware
+        'BACKEND': 'core.profiling.DjangoTemplates',
         'DIRS': [BASE_DIR / 'templates'],
-        'APP_DIRS': True,
         'OPTIONS': {
+            # Em produção cada template é lido e compilado uma vez por worker; em DEBUG é relido a cada pedido
+            'loaders': TEMPLATE_LOADERS if DEBUG else [('django.template.loaders.cached.Loader', TEMPLATE_LOADERS)],
             'context_processors': [
                 'django.template.context_processors.debug',
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'core.context_processors.fragment_cache',
             ],
         },
     },
 ]
 
 WSGI_APPLICATION = 'airways.wsgi.application'
+# Modo ASGI (SERVER_MODE=asgi no gunicorn.conf.py, workers uvicorn); o core/urls.py passa então às
+# versões async das vistas mais usadas
+ASGI_APPLICATION = 'airways.asgi.application'
+SERVER_MODE = config('SERVER_MODE', default='wsgi')
 
 # ======================================================================
 # DATABASE
@@ -93,12 +113,16 @@ USE_TZ = True
 # ======================================================================
 # STATIC FILES (CSS, JS, Imagens do Sistema)
 # ======================================================================
-STATIC_URL = '/static/'
+# Com STATIC_HOST (ex.: um CDN com este servidor como origem) os estáticos e o APK deixam de ocupar
+# os workers: o CDN pede cada ficheiro uma vez e, como os nomes têm hash, guarda-o indefinidamente
+STATIC_HOST = config('STATIC_HOST', default='') if not DEBUG else ''
+STATIC_URL = STATIC_HOST + '/static/'
 STATIC_ROOT = BASE_DIR / 'staticfiles'
 STATICFILES_DIRS = [BASE_DIR / 'static']
 
-# Armazenamento de arquivos estáticos (WhiteNoise)
-STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
+# O APK já é um zip: sem cópias comprimidas, para que os pedidos Range (downloads retomados) o sirvam tal como está
+WHITENOISE_SKIP_COMPRESS_EXTENSIONS = [*Compressor.SKIP_COMPRESS_EXTENSIONS, 'apk']
+WHITENOISE_MIMETYPES = {'.apk': 'application/vnd.android.package-archive'}
 
 # ======================================================================
 # MEDIA FILES (Uploads de usuários - Comprovantes, etc)
@@ -111,8 +135,91 @@ MEDIA_ROOT = BASE_DIR / 'media'
 if not os.path.exists(MEDIA_ROOT):
     os.makedirs(MEDIA_ROOT)
 
-# Default storage padrão do Django para disco local
-DEFAULT_FILE_STORAGE = 'django.core.files.storage.FileSystemStorage'
+STORAGES = {
+    # Default storage padrão do Django para disco local
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    # Estáticos com hash, gzip/Brotli e variantes WebP gerados no collectstatic (servidos pelo WhiteNoise)
+    'staticfiles': {'BACKEND': 'core.storage.StaticFilesStorage'},
+}
+
+# Comprovativos de depósito: recomprimidos (WEBP ou JPEG) numa thread em segundo plano
+DEPOSIT_PROOF_FORMAT = config('DEPOSIT_PROOF_FORMAT', default='WEBP')
+DEPOSIT_PROOF_ASYNC = config('DEPOSIT_PROOF_ASYNC', default=True, cast=bool)
+
+# ======================================================================
+# CACHES E SESSÕES
+# ======================================================================
+SESSION_CACHE_BACKEND = config('SESSION_CACHE_BACKEND', default='core.cache.FileBasedCache')
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    # Fragmentos {% cache %} dos templates (ver core.context_processors.fragment_cache)
+    'template_fragments': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'template-fragments',
+    },
+    # Sessões, usuários autenticados e painéis: têm de ser partilhados entre os workers (um logout ou
+    # uma alteração de saldo num worker vale para todos). Sem Redis/Memcached configurado usa ficheiros
+    # locais, o que serve para um único servidor.
+    'sessions': {
+        'BACKEND': SESSION_CACHE_BACKEND,
+        'LOCATION': config('SESSION_CACHE_LOCATION', default=os.path.join(tempfile.gettempdir(), 'airways-sessions')),
+    },
+}
+if SESSION_CACHE_BACKEND == 'core.cache.FileBasedCache':
+    # A contagem de ficheiros percorre o diretório inteiro: corre de 5 em 5 minutos e não em cada escrita
+    CACHES['sessions']['OPTIONS'] = {'MAX_ENTRIES': 100000, 'CULL_INTERVAL': 300}
+
+# Sessões lidas do cache, com a base de dados como cópia persistente
+SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+SESSION_CACHE_ALIAS = 'sessions'
+
+# Os testes trocam o cache `sessions` por um em memória: o diretório acima é o das sessões reais
+TEST_RUNNER = 'core.test_runner.DiscoverRunner'
+
+# ======================================================================
+# CACHE DE CONFIGURAÇÃO (PlatformSettings, Roleta, Bancos, Níveis)
+# ======================================================================
+# Alias de um cache partilhado entre workers (ex.: Redis); vazio usa só o cache local do processo
+CONFIG_CACHE_ALIAS = config('CONFIG_CACHE_ALIAS', default='') or None
+# Validade da cópia local de cada worker; limita o atraso das alterações quando não há cache partilhado
+CONFIG_CACHE_LOCAL_TTL = config('CONFIG_CACHE_LOCAL_TTL', default=60, cast=int)
+# Validade das entradas no cache partilhado: cada alteração no admin muda a versão da chave, e as entradas
+# das versões antigas, que já ninguém lê, expiram ao fim deste tempo em vez de ficarem para sempre
+CONFIG_CACHE_TIMEOUT = config('CONFIG_CACHE_TIMEOUT', default=3600, cast=int)
+# Validade dos fragmentos de template; sem cache partilhado a versão da configuração é local a cada
+# worker, e esta validade limita o atraso dos outros workers como CONFIG_CACHE_LOCAL_TTL
+FRAGMENT_CACHE_TIMEOUT = config('FRAGMENT_CACHE_TIMEOUT', default=CONFIG_CACHE_LOCAL_TTL, cast=int)
+
+# ======================================================================
+# IDEMPOTÊNCIA (process_task, spin_roulette)
+# ======================================================================
+# Horas durante as quais uma resposta gravada sob um Idempotency-Key é repetida; as chaves mais
+# antigas são apagadas pelo comando purge_idempotency_keys (cron)
+IDEMPOTENCY_KEY_TTL_HOURS = config('IDEMPOTENCY_KEY_TTL_HOURS', default=24, cast=int)
+
+# ======================================================================
+# INSTRUMENTAÇÃO DE PEDIDOS (Server-Timing, log por pedido e métricas Prometheus)
+# ======================================================================
+# Fração de pedidos medidos (0 desliga o middleware, 1 mede todos)
+REQUEST_PROFILING_SAMPLE_RATE = config('REQUEST_PROFILING_SAMPLE_RATE', default=0.0, cast=float)
+# Repetições da mesma consulta num pedido a partir das quais é assinalada como provável N+1
+REQUEST_PROFILING_REPEAT_THRESHOLD = config('REQUEST_PROFILING_REPEAT_THRESHOLD', default=3, cast=int)
+
+# Token exigido no /metrics/ (cabeçalho "Authorization: Bearer <token>"); vazio fecha o endpoint, exceto com DEBUG
+METRICS_TOKEN = config('METRICS_TOKEN', default='')
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'core.profiling': {'handlers': ['console'], 'level': 'INFO', 'propagate': False},
+    },
+}
 
 # ======================================================================
 # SEGURANÇA E OUTROS
@@ -1,19 +1,44 @@
-from django.contrib import admin
+from django.contrib import admin, messages
+from django.db.models import Exists, OuterRef, Q
+from django.http import StreamingHttpResponse
 from django.utils.safestring import mark_safe # Importação necessária para renderizar HTML no Admin
+from . import payouts
+from .deposits import approve_deposits
+from .roulette import PrizeSampler
 from .models import (
     CustomUser, PlatformSettings, Level, BankDetails, Deposit, 
-    Withdrawal, Task, Roulette, RouletteSettings, UserLevel, PlatformBankDetails
+    Withdrawal, Task, Roulette, RouletteSettings, UserLevel, PlatformBankDetails,
+    LedgerEntry
 )
 
 # ---
 
+class PhonePrefixSearchMixin:
+    """Pesquisa números de telefone por prefixo (`LIKE '923%'`, com índice); os outros termos seguem `search_fields`."""
+    phone_field = 'user__phone_number'
+    exact_search_fields = ()
+    show_full_result_count = False
+
+    def get_search_results(self, request, queryset, search_term):
+        term = search_term.strip().replace(' ', '')
+        if term.lstrip('+').isdigit():
+            condition = Q(**{f'{self.phone_field}__startswith': term})
+            for field in self.exact_search_fields:
+                condition |= Q(**{field: term})
+            return queryset.filter(condition), False
+        return super().get_search_results(request, queryset, search_term)
+
+# ---
+
 # Registrando os modelos com classes ModelAdmin personalizadas
 
 @admin.register(CustomUser)
-class CustomUserAdmin(admin.ModelAdmin):
+class CustomUserAdmin(PhonePrefixSearchMixin, admin.ModelAdmin):
     list_display = ('phone_number', 'available_balance', 'subsidy_balance', 'is_staff', 'is_active', 'date_joined', 'roulette_spins')
     search_fields = ('phone_number', 'invite_code')
     list_filter = ('is_staff', 'is_active', 'level_active')
+    phone_field = 'phone_number'
+    exact_search_fields = ('invite_code',)
 
 @admin.register(PlatformSettings)
 class PlatformSettingsAdmin(admin.ModelAdmin):
@@ -26,8 +51,9 @@ class LevelAdmin(admin.ModelAdmin):
     search_fields = ('name',)
 
 @admin.register(BankDetails)
-class BankDetailsAdmin(admin.ModelAdmin):
+class BankDetailsAdmin(PhonePrefixSearchMixin, admin.ModelAdmin):
     list_display = ('user', 'bank_name', 'account_holder_name')
+    list_select_related = ('user',)
     search_fields = ('user__phone_number', 'bank_name', 'account_holder_name')
 
 @admin.register(PlatformBankDetails)
@@ -36,21 +62,53 @@ class PlatformBankDetailsAdmin(admin.ModelAdmin):
     search_fields = ('bank_name', 'account_holder_name')
 
 @admin.register(Deposit)
-class DepositAdmin(admin.ModelAdmin):
-    list_display = ('user', 'amount', 'is_approved', 'created_at', 'proof_link') 
+class DepositAdmin(PhonePrefixSearchMixin, admin.ModelAdmin):
+    list_display = ('user', 'amount', 'is_approved', 'created_at', 'proof_link', 'duplicate_proof') 
     search_fields = ('user__phone_number',)
     list_filter = ('is_approved',)
-    readonly_fields = ('current_proof_display',)
+    list_select_related = ('user',)
+    date_hierarchy = 'created_at'
+    readonly_fields = ('current_proof_display', 'proof_thumbnail', 'proof_processed', 'proof_hash', 'duplicate_deposits')
+
+    actions = ['approve_selected']
+
+    def get_queryset(self, request):
+        # O mesmo comprovativo noutro depósito é detetado pelo índice de proof_hash, na própria consulta da lista
+        same_proof = Deposit.objects.filter(proof_hash=OuterRef('proof_hash')).exclude(pk=OuterRef('pk'))
+        return super().get_queryset(request).annotate(
+            has_duplicate_proof=Exists(same_proof) & ~Q(proof_hash='')
+        )
+
+    @admin.display(boolean=True, description='Comprovativo Repetido', ordering='has_duplicate_proof')
+    def duplicate_proof(self, obj):
+        return obj.has_duplicate_proof
+
+    @admin.display(description='Depósitos com o Mesmo Comprovativo')
+    def duplicate_deposits(self, obj):
+        if not obj.proof_hash:
+            return "-"
+        others = Deposit.objects.filter(proof_hash=obj.proof_hash).exclude(pk=obj.pk).select_related('user')
+        return ", ".join(f"#{d.pk} ({d.user.phone_number}, {d.amount})" for d in others[:20]) or "Nenhum"
 
     def save_model(self, request, obj, form, change):
-        # Se o depósito está sendo marcado como aprovado agora
-        if change and 'is_approved' in form.changed_data and obj.is_approved:
-            user = obj.user
-            user.available_balance += obj.amount
-            user.save()
+        # Se o depósito está sendo marcado como aprovado agora, grava primeiro as
+        # restantes alterações e deixa a aprovação (e o crédito) para approve_deposits
+        approving = change and 'is_approved' in form.changed_data and obj.is_approved
+        if approving:
+            obj.is_approved = False
         super().save_model(request, obj, form, change)
+        if approving:
+            approve_deposits(Deposit.objects.filter(pk=obj.pk))
+            obj.is_approved = True
+
+    @admin.action(description='Aprovar depósitos selecionados e creditar os saldos')
+    def approve_selected(self, request, queryset):
+        approved = approve_deposits(queryset)
+        self.message_user(request, f'{approved} depósito(s) aprovado(s).')
 
     def proof_link(self, obj):
+        if obj.proof_thumbnail:
+            return mark_safe(f'<a href="{obj.proof_of_payment.url}" target="_blank"><img src="{obj.proof_thumbnail.url}" style="max-height:60px;" loading="lazy" /></a>')
         if obj.proof_of_payment:
             return mark_safe(f'<a href="{obj.proof_of_payment.url}" target="_blank">Ver Comprovativo</a>')
         return "Nenhum"
@@ -58,31 +116,71 @@ class DepositAdmin(admin.ModelAdmin):
 
     def current_proof_display(self, obj):
         if obj.proof_of_payment:
+            # A miniatura evita descarregar o comprovativo completo em cada revisão
+            preview = obj.proof_thumbnail or obj.proof_of_payment
             return mark_safe(f'''
                 <a href="{obj.proof_of_payment.url}" target="_blank">Ver Imagem em Tamanho Real</a><br/>
-                <img src="{obj.proof_of_payment.url}" style="max-width:300px; height:auto; margin-top: 10px;" />
+                <img src="{preview.url}" style="max-width:300px; height:auto; margin-top: 10px;" />
             ''')
         return "Nenhum Comprovativo Carregado"
     current_proof_display.short_description = 'Comprovativo Atual'
 
 @admin.register(Withdrawal)
-class WithdrawalAdmin(admin.ModelAdmin):
-    list_display = ('user', 'get_iban', 'amount', 'status', 'created_at')
-    search_fields = ('user__phone_number',)
+class WithdrawalAdmin(PhonePrefixSearchMixin, admin.ModelAdmin):
+    list_display = ('user', 'get_iban', 'amount', 'status', 'export_batch', 'created_at')
+    search_fields = ('user__phone_number', '=export_batch')
     list_filter = ('status',)
+    list_select_related = ('user', 'user__bankdetails')
+    date_hierarchy = 'created_at'
+    actions = ['export_csv', 'export_bank_batch', 'reexport_bank_batch', 'revert_to_pending']
 
     def get_iban(self, obj):
         try:
             return obj.user.bankdetails.IBAN
-        except:
+        except BankDetails.DoesNotExist:
             return "Não cadastrado"
     get_iban.short_description = 'IBAN do Cliente'
 
+    def _export(self, queryset, fmt):
+        # O lote vai no nome do ficheiro: é por ele que se procura, repete ou reverte a exportação
+        batch = payouts.new_batch()
+        return self._download(payouts.export_pending(queryset, batch=batch), fmt, batch)
+
+    def _download(self, rows, fmt, batch):
+        render, content_type, extension = payouts.FORMATS[fmt]
+        response = StreamingHttpResponse(render(rows), content_type=content_type)
+        response['Content-Disposition'] = f'attachment; filename="saques_{batch}.{extension}"'
+        return response
+
+    @admin.action(description='Exportar saques pendentes (CSV) e marcar como em processamento')
+    def export_csv(self, request, queryset):
+        return self._export(queryset, 'csv')
+
+    @admin.action(description='Exportar ficheiro de lote bancário e marcar como em processamento')
+    def export_bank_batch(self, request, queryset):
+        return self._export(queryset, 'batch')
+
+    @admin.action(description='Reexportar o ficheiro de lote bancário dos saques em processamento selecionados')
+    def reexport_bank_batch(self, request, queryset):
+        batches = set(queryset.filter(status=payouts.PROCESSING).exclude(export_batch='').values_list('export_batch', flat=True))
+        if len(batches) != 1:
+            self.message_user(request, 'Selecione saques em processamento de um único lote.', messages.ERROR)
+            return None
+        batch = batches.pop()
+        return self._download(payouts.export_batch(batch), 'batch', batch)
+
+    @admin.action(description='Devolver a pendentes os lotes dos saques em processamento selecionados')
+    def revert_to_pending(self, request, queryset):
+        batches = set(queryset.filter(status=payouts.PROCESSING).exclude(export_batch='').values_list('export_batch', flat=True))
+        reverted = sum(payouts.revert_batch(batch) for batch in batches)
+        self.message_user(request, f'{reverted} saque(s) de volta a pendentes.')
+
     def get_form(self, request, obj=None, **kwargs):
         form = super().get_form(request, obj, **kwargs)
         # Define as opções de seleção para o campo status
         status_choices = [
             ('Pending', 'Pendente'),
+            ('Processing', 'Em Processamento'),
             ('Approved', 'Aprovado'),
             ('Rejected', 'Rejeitado'),
         ]
@@ -94,23 +192,52 @@ class WithdrawalAdmin(admin.ModelAdmin):
         return form
 
 @admin.register(Task)
-class TaskAdmin(admin.ModelAdmin):
+class TaskAdmin(PhonePrefixSearchMixin, admin.ModelAdmin):
     list_display = ('user', 'earnings', 'completed_at')
     search_fields = ('user__phone_number',)
+    list_select_related = ('user',)
+    date_hierarchy = 'completed_at'
 
 @admin.register(Roulette)
-class RouletteAdmin(admin.ModelAdmin):
+class RouletteAdmin(PhonePrefixSearchMixin, admin.ModelAdmin):
     list_display = ('user', 'prize', 'is_approved', 'spin_date')
     search_fields = ('user__phone_number',)
     list_filter = ('is_approved',)
+    list_select_related = ('user',)
+    date_hierarchy = 'spin_date'
 
 @admin.register(RouletteSettings)
 class RouletteSettingsAdmin(admin.ModelAdmin):
-    list_display = ('id', 'prizes')
+    list_display = ('id', 'prizes', 'effective_probabilities')
+    readonly_fields = ('effective_probabilities',)
+
+    def effective_probabilities(self, obj):
+        if not obj.prizes:
+            return "Prémios padrão"
+        sampler = PrizeSampler([p.strip() for p in obj.prizes.split(',')])
+        return ", ".join(f"{prize}: {float(probability):.1%}" for prize, probability in sampler.probabilities())
+    effective_probabilities.short_description = 'Probabilidades Efetivas'
 
 @admin.register(UserLevel)
-class UserLevelAdmin(admin.ModelAdmin):
+class UserLevelAdmin(PhonePrefixSearchMixin, admin.ModelAdmin):
     list_display = ('user', 'level', 'purchase_date', 'is_active')
     search_fields = ('user__phone_number', 'level__name')
     list_filter = ('is_active',)
-    
\ No newline at end of file
+    list_select_related = ('user', 'level')
+
+@admin.register(LedgerEntry)
+class LedgerEntryAdmin(PhonePrefixSearchMixin, admin.ModelAdmin):
+    list_display = ('user', 'kind', 'amount', 'subsidy_amount', 'reference', 'created_at')
+    search_fields = ('user__phone_number', 'reference')
+    list_filter = ('kind',)
+    list_select_related = ('user',)
+
+    # O razão é apenas de inserção, por isso o admin é só de leitura
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
@@ -0,0 +1,19 @@
+import time
+
+from django.core.cache.backends import filebased
+
+
+class FileBasedCache(filebased.FileBasedCache):
+    """`FileBasedCache` do Django que conta e limpa as entradas no máximo uma vez a cada `CULL_INTERVAL` segundos."""
+
+    def __init__(self, dir, params):
+        super().__init__(dir, params)
+        self._cull_interval = int(params.get('OPTIONS', {}).get('CULL_INTERVAL', 300))
+        self._next_cull = 0.0
+
+    def _cull(self):
+        now = time.monotonic()
+        if now < self._next_cull:
+            return
+        self._next_cull = now + self._cull_interval
+        super()._cull()
@@ -0,0 +1,103 @@
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+
+from .models import Level, PlatformBankDetails, PlatformSettings, RouletteSettings
+
+# Prémios usados quando a roleta ainda não foi configurada no admin
+DEFAULT_PRIZES = ['0', '500', '1000', '0', '5000', '200', '0', '10000']
+
+VERSION_KEY = 'config:version'
+_MISSING = object()
+
+_local = {}
+_local_version = 0
+_lock = threading.Lock()
+
+
+def _shared():
+    alias = getattr(settings, 'CONFIG_CACHE_ALIAS', None)
+    return caches[alias] if alias else None
+
+
+def current_version():
+    """
+    Versão atual da configuração. Com a camada partilhada ativa a versão é
+    lida do cache partilhado, para que todos os workers vejam as alterações.
+    """
+    shared = _shared()
+    if shared is None:
+        return _local_version
+    version = shared.get(VERSION_KEY)
+    if version is None:
+        shared.add(VERSION_KEY, 1, None)
+        version = shared.get(VERSION_KEY, 1)
+    return version
+
+
+def invalidate():
+    global _local_version
+    with _lock:
+        _local_version += 1
+        _local.clear()
+    shared = _shared()
+    if shared is not None:
+        try:
+            shared.incr(VERSION_KEY)
+        except ValueError:
+            shared.add(VERSION_KEY, 1, None)
+
+
+def get(name, loader):
+    """
+    Devolve o valor `name`, carregando-o com `loader()` só quando a versão
+    mudou ou a entrada local expirou (`CONFIG_CACHE_LOCAL_TTL` segundos).
+    """
+    version = current_version()
+    now = time.monotonic()
+    entry = _local.get(name)
+    if entry is not None and entry[0] == version and entry[1] > now:
+        return entry[2]
+
+    shared = _shared()
+    key = f'config:{version}:{name}'
+    value = shared.get(key, _MISSING) if shared is not None else _MISSING
+    if value is _MISSING:
+        value = loader()
+        if shared is not None:
+            shared.set(key, value, getattr(settings, 'CONFIG_CACHE_TIMEOUT', 3600))
+    ttl = getattr(settings, 'CONFIG_CACHE_LOCAL_TTL', 60)
+    with _lock:
+        _local[name] = (version, now + ttl, value)
+    return value
+
+# ---
+
+def platform_settings():
+    return get('platform_settings', lambda: PlatformSettings.objects.order_by('pk').first())
+
+
+def platform_setting(field, default=''):
+    platform = platform_settings()
+    return getattr(platform, field) if platform else default
+
+
+def platform_bank_details():
+    return get('platform_bank_details', lambda: list(PlatformBankDetails.objects.all()))
+
+
+def levels():
+    return get('levels', lambda: list(Level.objects.order_by('deposit_value')))
+
+
+def _load_roulette_prizes():
+    roulette_settings = RouletteSettings.objects.order_by('pk').first()
+    if roulette_settings and roulette_settings.prizes:
+        return [p.strip() for p in roulette_settings.prizes.split(',')]
+    return DEFAULT_PRIZES
+
+
+def roulette_prizes():
+    return get('roulette_prizes', _load_roulette_prizes)
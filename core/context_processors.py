@@ -0,0 +1,12 @@
+from django.conf import settings
+from django.utils.functional import SimpleLazyObject
+
+from . import config_cache
+
+
+def fragment_cache(request):
+    """Chaves dos fragmentos `{% cache %}` que só dependem da configuração; mudam a cada edição no admin."""
+    return {
+        'config_version': SimpleLazyObject(config_cache.current_version),
+        'fragment_cache_timeout': settings.FRAGMENT_CACHE_TIMEOUT,
+    }
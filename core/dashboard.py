@@ -0,0 +1,78 @@
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import DecimalField, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from . import config_cache
+from .history import APPROVED_STATUSES
+from .models import CustomUser, Deposit, Task, UserLevel, Withdrawal
+from .utils import local_day_range
+
+# Validade curta: os lançamentos no razão invalidam a entrada imediatamente
+CACHE_TIMEOUT = 30
+
+
+def _cache():
+    # Partilhado entre os workers como o cache de usuários: a invalidação feita num worker vale para todos
+    return caches[settings.SESSION_CACHE_ALIAS]
+
+
+def cache_key(user_id):
+    return f'dashboard:{user_id}:{timezone.localdate().isoformat()}'
+
+
+def _sum(queryset, field):
+    total = queryset.values('user').annotate(total=Sum(field)).values('total')
+    output = DecimalField(max_digits=12, decimal_places=2)
+    return Coalesce(Subquery(total, output_field=output), Value(0), output_field=output)
+
+
+def _query(user_id):
+    today_start, today_end = local_day_range()
+    user_tasks = Task.objects.filter(user=OuterRef('pk'))
+    return CustomUser.objects.filter(pk=user_id).annotate(
+        active_level_name=Subquery(
+            UserLevel.objects.filter(user=OuterRef('pk'), is_active=True).order_by('pk').values('level__name')[:1]
+        ),
+        approved_deposit_total=_sum(Deposit.objects.filter(user=OuterRef('pk'), is_approved=True), 'amount'),
+        daily_income=_sum(user_tasks.filter(completed_at__gte=today_start, completed_at__lt=today_end), 'earnings'),
+        total_withdrawals=_sum(Withdrawal.objects.filter(user=OuterRef('pk'), status__in=APPROVED_STATUSES), 'amount'),
+        task_income=_sum(user_tasks, 'earnings'),
+    ).values(
+        'active_level_name', 'approved_deposit_total', 'daily_income', 'total_withdrawals',
+        'task_income', 'subsidy_balance',
+    )
+
+
+def _with_totals(dashboard):
+    dashboard['total_income'] = dashboard['task_income'] + dashboard['subsidy_balance']
+    return dashboard
+
+
+def get_dashboard(user):
+    """Valores do painel do usuário numa única consulta, em cache durante `CACHE_TIMEOUT` segundos."""
+    key = cache_key(user.pk)
+    dashboard = _cache().get(key)
+    if dashboard is None:
+        dashboard = _with_totals(_query(user.pk).get())
+        _cache().set(key, dashboard, CACHE_TIMEOUT)
+    # A configuração tem o seu próprio cache, invalidado quando o admin a altera
+    dashboard['whatsapp_link'] = config_cache.platform_setting('whatsapp_link', '#')
+    return dashboard
+
+
+async def aget_dashboard(user):
+    """Como `get_dashboard`, com o cache e o ORM async do Django (vistas servidas por ASGI)."""
+    key = cache_key(user.pk)
+    dashboard = await _cache().aget(key)
+    if dashboard is None:
+        dashboard = _with_totals(await _query(user.pk).aget())
+        await _cache().aset(key, dashboard, CACHE_TIMEOUT)
+    dashboard['whatsapp_link'] = await sync_to_async(config_cache.platform_setting)('whatsapp_link', '#')
+    return dashboard
+
+
+def invalidate(user_id):
+    _cache().delete(cache_key(user_id))
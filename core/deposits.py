@@ -0,0 +1,26 @@
+from django.db import transaction
+
+from . import ledger, metrics
+from .models import Deposit, LedgerEntry
+
+
+def approve_deposits(queryset, batch_size=1000):
+    """Aprova numa transação os depósitos pendentes de `queryset`; devolve quantos foram aprovados."""
+    with transaction.atomic():
+        rows = list(
+            queryset.filter(is_approved=False).select_for_update().order_by('pk')
+            .values_list('pk', 'user_id', 'amount')
+        )
+        credited = set()
+        for start in range(0, len(rows), batch_size):
+            ids = [pk for pk, _, _ in rows[start:start + batch_size]]
+            Deposit.objects.filter(pk__in=ids, is_approved=False).update(is_approved=True)
+            credited.update(LedgerEntry.objects.filter(
+                kind='deposit', reference__in=[f'deposit:{pk}' for pk in ids],
+            ).values_list('reference', flat=True))
+        ledger.post_many([
+            (user_id, amount, 'deposit', f'deposit:{pk}') for pk, user_id, amount in rows
+            if f'deposit:{pk}' not in credited
+        ])
+        metrics.record(metrics.DEPOSITS_APPROVED, len(rows))
+    return len(rows)
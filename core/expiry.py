@@ -0,0 +1,62 @@
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from . import referrals, user_cache
+from .models import CustomUser, Level, UserLevel
+
+
+def expire_level(level, now, batch_size=1000, dry_run=False):
+    """Desativa em lotes por `(purchase_date, id)` os `UserLevel` do nível cujo ciclo terminou."""
+    cutoff = now - timedelta(days=level.cycle_days)
+    pending = UserLevel.objects.filter(level=level, is_active=True, purchase_date__lte=cutoff).order_by('purchase_date', 'id')
+    expired = 0
+    cursor = None
+    while True:
+        batch = pending
+        if cursor is not None:
+            last_date, last_id = cursor
+            batch = batch.filter(Q(purchase_date__gt=last_date) | Q(purchase_date=last_date, id__gt=last_id))
+        rows = list(batch.values_list('id', 'purchase_date')[:batch_size])
+        if not rows:
+            return expired
+        cursor = (rows[-1][1], rows[-1][0])
+        if dry_run:
+            expired += len(rows)
+            continue
+
+        expired += _expire_batch([row[0] for row in rows])
+
+
+def _expire_batch(ids):
+    """Desativa os `UserLevel` ainda ativos de `ids`; só os que este UPDATE alterou contam para a equipa."""
+    with transaction.atomic():
+        # Outra execução (ou uma compra) pode ter lido o mesmo lote: as linhas bloqueadas que ainda
+        # estão ativas são as únicas que esta transação desativa
+        flipped = list(
+            UserLevel.objects.filter(id__in=ids, is_active=True).select_for_update().values_list('id', 'user_id')
+        )
+        if not flipped:
+            return 0
+        UserLevel.objects.filter(id__in=[row[0] for row in flipped]).update(is_active=False)
+        user_ids = {row[1] for row in flipped}
+        still_active = set(
+            UserLevel.objects.filter(user_id__in=user_ids, is_active=True).values_list('user_id', flat=True)
+        )
+        lapsed = user_ids - still_active
+        if lapsed:
+            CustomUser.objects.filter(pk__in=lapsed).update(level_active=False)
+            user_cache.invalidate(*lapsed)
+            transaction.on_commit(lambda: user_cache.invalidate(*lapsed))
+            referrals.remove_investors(lapsed)
+    return len(flipped)
+
+def expire_levels(now=None, batch_size=1000, dry_run=False):
+    """Expira os ciclos terminados de todos os níveis; devolve `{nome do nível: linhas expiradas}`."""
+    now = now or timezone.now()
+    return {
+        level.name: expire_level(level, now, batch_size=batch_size, dry_run=dry_run)
+        for level in Level.objects.order_by('pk')
+    }
@@ -1,5 +1,6 @@
 from django import forms
 from .models import CustomUser, Deposit, BankDetails
+from .proofs import check_dimensions
 
 class RegisterForm(forms.ModelForm):
     password = forms.CharField(label="Senha", widget=forms.PasswordInput)
@@ -45,6 +46,14 @@ class DepositForm(forms.ModelForm):
         model = Deposit
         fields = ['amount', 'proof_of_payment']
 
+    def clean_proof_of_payment(self):
+        proof = self.cleaned_data['proof_of_payment']
+        # O ImageField já abriu a imagem; o tamanho vem do cabeçalho, sem descodificar os píxeis
+        image = getattr(proof, 'image', None)
+        if image is not None and not check_dimensions(image):
+            raise forms.ValidationError("Dimensões da imagem inválidas.")
+        return proof
+
 class WithdrawalForm(forms.Form):
     amount = forms.DecimalField(max_digits=10, decimal_places=2, label="Valor a Sacar")
 
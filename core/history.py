@@ -0,0 +1,62 @@
+from datetime import datetime, timedelta, timezone
+
+from django.db.models import Q
+
+from .models import Withdrawal
+from .utils import local_day_range
+
+PAGE_SIZE = 10
+# O admin grava os estados em inglês, o código antigo em português
+APPROVED_STATUSES = ('Approved', 'Aprovado')
+# Saques que contam para o limite diário
+DAILY_LIMIT_STATUSES = {'Pending', 'Processing', 'Pendente', *APPROVED_STATUSES}
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+MICROSECOND = timedelta(microseconds=1)
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(record):
+    # Microssegundos inteiros: o cursor volta a dar exatamente o mesmo created_at
+    return f'{(record.created_at - EPOCH) // MICROSECOND}-{record.pk}'
+
+
+def decode_cursor(cursor):
+    try:
+        micros, pk = (int(part) for part in cursor.split('-'))
+        return EPOCH + micros * MICROSECOND, pk
+    except (ValueError, OverflowError):
+        raise InvalidCursor('Cursor inválido.')
+
+
+def withdrawal_page(user, cursor=None, page_size=PAGE_SIZE):
+    """Página do histórico de saques, do mais recente ao mais antigo: `(saques, cursor)`, com `None` no fim."""
+    records = Withdrawal.objects.filter(user=user).order_by('-created_at', '-id')
+    if cursor:
+        created_at, pk = decode_cursor(cursor)
+        records = records.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=pk))
+    records = list(records.only('id', 'amount', 'status', 'created_at')[:page_size + 1])
+    if len(records) > page_size:
+        records = records[:page_size]
+        return records, encode_cursor(records[-1])
+    return records, None
+
+
+def withdrawals_today(user, first_page):
+    """
+    Saques de hoje que contam para o limite diário, lidos da primeira página
+    do histórico. Só é preciso outra consulta se a página inteira for de hoje.
+    """
+    records, next_cursor = first_page
+    today_start, today_end = local_day_range()
+    if next_cursor and records and records[-1].created_at >= today_start:
+        return Withdrawal.objects.filter(
+            user=user, created_at__gte=today_start, created_at__lt=today_end, status__in=DAILY_LIMIT_STATUSES,
+        ).count()
+    return sum(
+        1 for record in records
+        if today_start <= record.created_at < today_end and record.status in DAILY_LIMIT_STATUSES
+    )
@@ -0,0 +1,83 @@
+import json
+import uuid
+from datetime import timedelta
+from functools import partial, wraps
+
+from django.conf import settings
+from django.db import transaction
+from django.http import JsonResponse
+from django.utils import timezone
+
+from .models import CustomUser, IdempotencyKey
+
+HEADER = 'Idempotency-Key'
+
+
+def new_key():
+    """Chave gerada por página; repetições do mesmo pedido (toques duplos, retries) reenviam-na."""
+    return uuid.uuid4().hex
+
+
+def cutoff(now=None):
+    """Chaves gravadas antes deste instante já expiraram (`IDEMPOTENCY_KEY_TTL_HOURS`)."""
+    return (now or timezone.now()) - timedelta(hours=getattr(settings, 'IDEMPOTENCY_KEY_TTL_HOURS', 24))
+
+
+def purge_expired(now=None, batch_size=1000):
+    """Apaga as chaves expiradas em lotes de `batch_size` e devolve quantas foram apagadas."""
+    expired = IdempotencyKey.objects.filter(created_at__lt=cutoff(now))
+    deleted = 0
+    while True:
+        ids = list(expired.values_list('pk', flat=True)[:batch_size])
+        if not ids:
+            return deleted
+        deleted += IdempotencyKey.objects.filter(pk__in=ids).delete()[0]
+
+
+def idempotent(view=None, *, endpoint=None):
+    """Executa a vista com o usuário bloqueado e repete a resposta gravada para um `Idempotency-Key` já usado."""
+    if view is None:
+        return partial(idempotent, endpoint=endpoint)
+    endpoint = endpoint or view.__name__
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        key = request.headers.get(HEADER, '')[:64]
+        with transaction.atomic():
+            CustomUser.objects.select_for_update().filter(pk=request.user.pk).values_list('pk').get()
+            stored = None
+            if key:
+                stored = IdempotencyKey.objects.filter(user=request.user, endpoint=endpoint, key=key).first()
+                if stored and stored.created_at >= cutoff():
+                    return JsonResponse(stored.response, status=stored.status_code)
+            response = view(request, *args, **kwargs)
+            if key and response.status_code < 500:
+                if stored:
+                    # Expirada e ainda não apagada pelo purge_idempotency_keys
+                    stored.delete()
+                IdempotencyKey.objects.create(
+                    user=request.user,
+                    endpoint=endpoint,
+                    key=key,
+                    status_code=response.status_code,
+                    response=json.loads(response.content),
+                )
+        return response
+    return wrapper
+
+
+async def stored_response(request, endpoint):
+    """
+    Resposta já gravada para a chave do pedido, lida sem bloqueio com o ORM
+    async; as vistas async consultam-na antes das suas pré-verificações.
+    """
+    key = request.headers.get(HEADER, '')[:64]
+    if not key:
+        return None
+    user = await request.auser()
+    stored = await IdempotencyKey.objects.filter(
+        user=user, endpoint=endpoint, key=key, created_at__gte=cutoff(),
+    ).afirst()
+    if stored is None:
+        return None
+    return JsonResponse(stored.response, status=stored.status_code)
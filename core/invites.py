@@ -0,0 +1,89 @@
+import os
+import threading
+
+from django.db import connection, transaction
+from django.db.models import F
+
+# Os códigos antigos são 8 caracteres hexadecimais; os novos começam sempre
+# por uma letra fora do hexadecimal, por isso os dois conjuntos nunca colidem.
+LEAD = 'ghjkmnpqrstvwxyz'
+ALPHABET = '0123456789abcdefghjkmnpqrstvwxyz'
+SERIAL_BITS = 4 + 7 * 5
+SERIAL_MASK = (1 << SERIAL_BITS) - 1
+BLOCK_SIZE = 1000
+
+
+def scramble(serial):
+    """Bijeção de [0, 2**39) nela própria: números distintos dão resultados distintos, sem aspeto sequencial."""
+    x = serial & SERIAL_MASK
+    x ^= x >> 19
+    x = (x * 0x5DEECE66D) & SERIAL_MASK
+    x ^= x >> 17
+    x = (x * 0x2545F4914F6CDD1D) & SERIAL_MASK
+    x ^= x >> 20
+    return x
+
+
+def encode(serial):
+    """Código de convite de 8 caracteres para o número de série `serial`."""
+    if not 0 <= serial <= SERIAL_MASK:
+        raise ValueError('Número de série fora do intervalo dos códigos de convite')
+    x = scramble(serial)
+    chars = [LEAD[x >> 35]]
+    for shift in range(30, -1, -5):
+        chars.append(ALPHABET[(x >> shift) & 31])
+    return ''.join(chars)
+
+
+def reserve(count):
+    """Reserva `count` números de série consecutivos e devolve o primeiro."""
+    from .models import InviteCodeCounter
+
+    with transaction.atomic():
+        if not InviteCodeCounter.objects.filter(pk=1).update(next_serial=F('next_serial') + count):
+            InviteCodeCounter.objects.get_or_create(pk=1)
+            InviteCodeCounter.objects.filter(pk=1).update(next_serial=F('next_serial') + count)
+        end = InviteCodeCounter.objects.values_list('next_serial', flat=True).get(pk=1)
+    return end - count
+
+
+class InviteCodeAllocator:
+    """Números de série tirados de blocos reservados na base de dados; só uma em cada `block_size` gerações faz consultas."""
+
+    def __init__(self, block_size=BLOCK_SIZE):
+        self.block_size = block_size
+        self.lock = threading.Lock()
+        self.next = self.end = 0
+        self.pid = os.getpid()
+
+    def _available(self):
+        # Um bloco herdado do master no fork seria entregue também pelos outros workers
+        if self.pid != os.getpid():
+            self.pid, self.next, self.end = os.getpid(), 0, 0
+        return self.next < self.end
+
+    def refill(self):
+        """Reserva um bloco novo se o atual estiver esgotado; chamado fora de transações."""
+        with self.lock:
+            if not self._available():
+                self.next = reserve(self.block_size)
+                self.end = self.next + self.block_size
+
+    def serial(self):
+        with self.lock:
+            if self._available():
+                serial = self.next
+                self.next += 1
+                return serial
+        if connection.in_atomic_block:
+            transaction.on_commit(self.refill)
+            return reserve(1)
+        self.refill()
+        return self.serial()
+
+
+allocator = InviteCodeAllocator()
+
+
+def new_invite_code():
+    return encode(allocator.serial())
@@ -0,0 +1,60 @@
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import F
+
+from . import dashboard, user_cache
+from .models import CustomUser, LedgerEntry
+
+
+class InsufficientFunds(Exception):
+    pass
+
+
+def post(user, amount, kind, subsidy=False, reference=''):
+    """Lança um movimento no razão e aplica-o ao saldo com um UPDATE atómico (a instância `user` não é atualizada)."""
+    amount = Decimal(amount)
+    user_id = getattr(user, 'pk', user)
+
+    changes = {'available_balance': F('available_balance') + amount}
+    if subsidy:
+        changes['subsidy_balance'] = F('subsidy_balance') + amount
+
+    with transaction.atomic():
+        rows = CustomUser.objects.filter(pk=user_id)
+        if amount < 0:
+            rows = rows.filter(available_balance__gte=-amount)
+        if not rows.update(**changes):
+            if amount < 0:
+                raise InsufficientFunds('Saldo insuficiente.')
+            raise CustomUser.DoesNotExist(f'Usuário {user_id} não encontrado.')
+        dashboard.invalidate(user_id)
+        user_cache.invalidate(user_id)
+        transaction.on_commit(lambda: (dashboard.invalidate(user_id), user_cache.invalidate(user_id)))
+        return LedgerEntry.objects.create(
+            user_id=user_id,
+            kind=kind,
+            amount=amount,
+            subsidy_amount=amount if subsidy else 0,
+            reference=reference,
+        )
+
+
+def post_many(postings):
+    """Lança os créditos `(user_id, amount, kind, reference)` com um UPDATE de saldo por usuário."""
+    totals = defaultdict(Decimal)
+    entries = []
+    for user_id, amount, kind, reference in postings:
+        amount = Decimal(amount)
+        totals[user_id] += amount
+        entries.append(LedgerEntry(user_id=user_id, kind=kind, amount=amount, reference=reference))
+
+    with transaction.atomic():
+        LedgerEntry.objects.bulk_create(entries, batch_size=1000)
+        for user_id, total in totals.items():
+            CustomUser.objects.filter(pk=user_id).update(available_balance=F('available_balance') + total)
+            dashboard.invalidate(user_id)
+        user_cache.invalidate(*totals)
+        transaction.on_commit(lambda: ([dashboard.invalidate(user_id) for user_id in totals], user_cache.invalidate(*totals)))
+    return entries
@@ -0,0 +1,67 @@
+import time
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from core.deposits import approve_deposits
+from core.models import CustomUser, Deposit
+
+
+class Rollback(Exception):
+    pass
+
+
+def legacy_approve(deposits):
+    # Caminho anterior: um save completo do depósito e do usuário por aprovação
+    for deposit in deposits:
+        deposit.is_approved = True
+        deposit.save()
+        user = deposit.user
+        user.available_balance += deposit.amount
+        user.save()
+
+
+class Command(BaseCommand):
+    help = 'Compara a aprovação em lote de depósitos com o caminho antigo por objeto; os dados são revertidos.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--deposits', type=int, default=10000)
+        parser.add_argument('--users', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self.run(options['deposits'], options['users'])
+                raise Rollback
+        except Rollback:
+            pass
+
+    def make_deposits(self, users, count):
+        Deposit.objects.bulk_create(
+            [Deposit(user_id=users[i % len(users)], amount=Decimal('5000.00'), proof_of_payment='bench.jpg') for i in range(count)],
+            batch_size=1000,
+        )
+        return Deposit.objects.filter(user_id__in=users, is_approved=False, proof_of_payment='bench.jpg')
+
+    def run(self, count, user_count):
+        password = make_password(None)
+        CustomUser.objects.bulk_create(
+            [CustomUser(phone_number=f'bench{i}', invite_code=f'b{i:07x}', password=password) for i in range(user_count)],
+            batch_size=1000,
+        )
+        users = list(CustomUser.objects.filter(phone_number__startswith='bench').values_list('pk', flat=True))
+
+        pending = self.make_deposits(users, count)
+        start = time.perf_counter()
+        legacy_approve(list(pending.select_related('user')))
+        legacy = time.perf_counter() - start
+
+        pending = self.make_deposits(users, count)
+        start = time.perf_counter()
+        approved = approve_deposits(pending)
+        bulk = time.perf_counter() - start
+
+        self.stdout.write(f'Por objeto: {count} depósitos em {legacy:.2f}s')
+        self.stdout.write(f'Em lote:    {approved} depósitos em {bulk:.2f}s ({legacy / bulk:.1f}x mais rápido)')
@@ -0,0 +1,63 @@
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from core.expiry import expire_levels
+from core.models import CustomUser, Level, UserLevel
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = 'Mede expire_levels sobre UserLevel sintéticos; todos os dados são revertidos no fim.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1000000)
+        parser.add_argument('--users', type=int, default=100000)
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        rows, users, batch_size = options['rows'], options['users'], options['batch_size']
+        try:
+            with transaction.atomic():
+                self.run(rows, users, batch_size)
+                raise Rollback
+        except Rollback:
+            pass
+
+    def run(self, rows, users, batch_size):
+        now = timezone.now()
+        level = Level.objects.create(
+            name='bench-expiry', deposit_value=Decimal('1'), daily_gain=Decimal('1'),
+            monthly_gain=Decimal('1'), cycle_days=30, image='bench.png',
+        )
+        password = make_password(None)
+        start = time.perf_counter()
+        CustomUser.objects.bulk_create(
+            [CustomUser(phone_number=f'bench{i}', invite_code=f'b{i:07x}', password=password) for i in range(users)],
+            batch_size=batch_size,
+        )
+        user_ids = list(CustomUser.objects.filter(phone_number__startswith='bench').values_list('pk', flat=True))
+        for offset in range(0, rows, batch_size):
+            created = UserLevel.objects.bulk_create(
+                [UserLevel(user_id=user_ids[i % len(user_ids)], level=level) for i in range(offset, min(offset + batch_size, rows))]
+            )
+            # Metade das compras é antiga o suficiente para expirar
+            UserLevel.objects.filter(pk__in=[ul.pk for ul in created[::2]]).update(purchase_date=now - timedelta(days=45))
+        self.stdout.write(f'Dados gerados em {time.perf_counter() - start:.1f}s ({rows} UserLevel, {users} usuários)')
+
+        start = time.perf_counter()
+        expired = expire_levels(now=now, batch_size=batch_size)['bench-expiry']
+        elapsed = time.perf_counter() - start
+        self.stdout.write(f'Primeira passagem: {expired} expirados em {elapsed:.2f}s ({expired / elapsed:,.0f} linhas/s)')
+
+        start = time.perf_counter()
+        expired = expire_levels(now=now, batch_size=batch_size)['bench-expiry']
+        self.stdout.write(f'Segunda passagem: {expired} expirados em {time.perf_counter() - start:.2f}s')
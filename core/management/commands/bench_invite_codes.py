@@ -0,0 +1,80 @@
+import time
+import uuid
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from core import invites
+from core.models import CustomUser
+
+
+class Rollback(Exception):
+    pass
+
+
+def legacy_invite_code():
+    # Geração anterior: um código aleatório e uma consulta exists() por tentativa
+    while True:
+        new_invite_code = uuid.uuid4().hex[:8]
+        if not CustomUser.objects.filter(invite_code=new_invite_code).exists():
+            return new_invite_code
+
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+class Command(BaseCommand):
+    help = 'Cadastra usuários em massa e conta as consultas por cadastro da geração de códigos de convite; os dados são revertidos.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000000)
+        parser.add_argument('--legacy', type=int, default=10000, help='Cadastros medidos com a geração antiga, depois dos restantes.')
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self.run(options['users'], options['legacy'])
+                raise Rollback
+        except Rollback:
+            pass
+
+    def invite_code(self, legacy):
+        if legacy:
+            return legacy_invite_code()
+        # Num cadastro real o bloco seguinte é reservado depois do commit; aqui tudo corre numa
+        # transação revertida, por isso a reserva é feita diretamente quando o bloco se esgota
+        invites.allocator.refill()
+        return invites.new_invite_code()
+
+    def register(self, users, prefix, password, legacy=False):
+        # Só as consultas da geração do código: o cadastro também liga o usuário à rede (post_save)
+        counter = QueryCounter()
+        start = time.perf_counter()
+        for i in range(users):
+            user = CustomUser(phone_number=f'{prefix}{i}', password=password)
+            with connection.execute_wrapper(counter):
+                user.invite_code = self.invite_code(legacy)
+            user.save()
+        return time.perf_counter() - start, counter.count
+
+    def run(self, users, legacy):
+        password = make_password(None)
+        seconds, queries = self.register(users, 'bench', password)
+        extra = queries / users
+        self.stdout.write(f'Blocos:  {users} cadastros em {seconds:.2f}s, {extra:.4f} consultas extra por cadastro')
+
+        codes = CustomUser.objects.filter(phone_number__startswith='bench').values('invite_code')
+        duplicates = codes.count() - codes.distinct().count()
+        self.stdout.write(f'Códigos repetidos: {duplicates}')
+
+        if legacy:
+            seconds, queries = self.register(legacy, 'legacy', password, legacy=True)
+            extra = queries / legacy
+            self.stdout.write(f'Antigo:  {legacy} cadastros em {seconds:.2f}s, {extra:.4f} consultas extra por cadastro')
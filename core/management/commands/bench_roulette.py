@@ -0,0 +1,47 @@
+import random
+import timeit
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+
+from core import config_cache
+from core.roulette import PrizeSampler, prize_weight
+
+
+def legacy_spin(prizes):
+    # Reprodução do sorteio anterior: monta o pool ponderado em cada giro
+    weighted_pool = []
+    for p in prizes:
+        weighted_pool.extend([p] * prize_weight(Decimal(p)))
+    winning_prize_str = random.choice(weighted_pool)
+    return winning_prize_str, Decimal(winning_prize_str)
+
+
+class Command(BaseCommand):
+    help = 'Compara o custo por giro do pool ponderado antigo com o sampler de alias.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--draws', type=int, default=100000)
+        parser.add_argument('--prizes', help='Lista de prémios separados por vírgula (padrão: configuração atual).')
+
+    def handle(self, *args, **options):
+        if options['prizes']:
+            prizes = [p.strip() for p in options['prizes'].split(',')]
+        else:
+            prizes = config_cache.roulette_prizes()
+        draws = options['draws']
+        sampler = PrizeSampler(prizes)
+
+        def alias_spin():
+            winner = sampler.draw()
+            return sampler.prizes[winner], sampler.amounts[winner]
+
+        results = {
+            'pool ponderado': timeit.timeit(lambda: legacy_spin(prizes), number=draws),
+            'alias (compilado)': timeit.timeit(alias_spin, number=draws),
+            'alias (com compilação)': timeit.timeit(lambda: PrizeSampler(prizes).draw(), number=draws),
+        }
+        for name, seconds in results.items():
+            self.stdout.write(f'{name:>24}: {seconds / draws * 1e6:8.2f} µs/giro')
+        for prize, probability in sampler.probabilities():
+            self.stdout.write(f'{prize:>10}: {float(probability):.2%}')
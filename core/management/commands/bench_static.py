@@ -0,0 +1,141 @@
+import json
+import time
+from urllib.parse import urlsplit
+from wsgiref.util import setup_testing_defaults
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.management.base import BaseCommand, CommandError
+from django.core.signals import request_finished, request_started
+from django.core.wsgi import get_wsgi_application
+from django.db import close_old_connections
+from django.test.utils import override_settings
+
+from core.storage import WEBP_WIDTHS, webp_variant
+
+BANNERS = [f'images/banner{i}.jpg' for i in range(1, 6)]
+STYLESHEET = 'css/menu.css'
+APK = 'app/airways.apk'
+
+
+class Command(BaseCommand):
+    help = (
+        'Simula clientes lentos a descarregar os estáticos do menu e o APK pela aplicação WSGI (WhiteNoise) e '
+        'estima a ocupação de um worker síncrono: o tempo da resposta mais o tempo de escrever os bytes ao '
+        'débito do cliente. Compara a entrega simples (sem compressão, JPEG, APK recomeçado do zero) com a '
+        'atual (Brotli/gzip, WebP, APK retomado com Range). Requer o collectstatic.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rate-kbps', type=float, default=256.0, help='Débito de cada cliente, em kbit/s.')
+        parser.add_argument('--clients', type=int, default=100, help='Clientes simulados por cenário.')
+        parser.add_argument('--interrupt-at', type=float, default=0.5,
+                            help='Fração do APK descarregada antes de a ligação cair.')
+        parser.add_argument('--output', help='Ficheiro JSON onde gravar os resultados.')
+
+    def handle(self, *args, **options):
+        if not staticfiles_storage.hashed_files:
+            raise CommandError('Sem manifesto de estáticos; execute primeiro o collectstatic.')
+        if options['rate_kbps'] <= 0 or options['clients'] < 1 or not 0 < options['interrupt_at'] < 1:
+            raise CommandError('Parâmetros inválidos.')
+
+        # Os pedidos correm nesta thread: como no Client dos testes, o início e o fim de cada um não fecham
+        # a ligação à base de dados (nem a transação de um teste que chame o comando)
+        for signal in (request_started, request_finished):
+            signal.disconnect(close_old_connections)
+        try:
+            with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']):
+                self.app = get_wsgi_application()
+                results = self.run(options)
+        finally:
+            for signal in (request_started, request_finished):
+                signal.connect(close_old_connections)
+
+        for name, row in results['scenarios'].items():
+            before, after = row['before'], row['after']
+            self.stdout.write(
+                f'{name:>14}: antes {before["bytes"]:8d} bytes {before["worker_seconds"]:9.1f} s de worker'
+                f'  |  depois {after["bytes"]:8d} bytes {after["worker_seconds"]:9.1f} s de worker'
+                f'  ({row["saved"]:.0%} menos ocupação)'
+            )
+        self.stdout.write(
+            f'Total para {options["clients"]} clientes: {results["before_worker_seconds"]:.1f} -> '
+            f'{results["after_worker_seconds"]:.1f} segundos de worker'
+        )
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(results, f, indent=2)
+
+    def run(self, options):
+        bytes_per_second = options['rate_kbps'] * 1000 / 8
+        apk_size = staticfiles_storage.size(APK)
+        resume_from = int(apk_size * options['interrupt_at'])
+        scenarios = {
+            # Página inicial: folha de estilos e os cinco banners
+            'menu': (
+                [(STYLESHEET, {})] + [(banner, {}) for banner in BANNERS],
+                [(STYLESHEET, {'HTTP_ACCEPT_ENCODING': 'br, gzip'})]
+                + [(webp_variant(banner, WEBP_WIDTHS[0]), {}) for banner in BANNERS],
+            ),
+            # Download do APK interrompido e repetido: sem Range recomeça do zero
+            'apk_resumed': (
+                [(APK, {'HTTP_RANGE': f'bytes=0-{resume_from - 1}'}), (APK, {})],
+                [(APK, {'HTTP_RANGE': f'bytes=0-{resume_from - 1}'}), (APK, {'HTTP_RANGE': f'bytes={resume_from}-'})],
+            ),
+        }
+        results = {
+            'meta': {'rate_kbps': options['rate_kbps'], 'clients': options['clients'], 'apk_bytes': apk_size},
+            'scenarios': {},
+        }
+        for name, (before, after) in scenarios.items():
+            before = self.measure(before, bytes_per_second, options['clients'])
+            after = self.measure(after, bytes_per_second, options['clients'])
+            results['scenarios'][name] = {
+                'before': before,
+                'after': after,
+                'saved': 1 - after['worker_seconds'] / before['worker_seconds'],
+            }
+        results['before_worker_seconds'] = sum(row['before']['worker_seconds'] for row in results['scenarios'].values())
+        results['after_worker_seconds'] = sum(row['after']['worker_seconds'] for row in results['scenarios'].values())
+        return results
+
+    def measure(self, requests, bytes_per_second, clients):
+        total_bytes, total_seconds, responses = 0, 0.0, []
+        for name, headers in requests:
+            # Só o caminho: com STATIC_HOST o URL aponta para o CDN, que pede o ficheiro a esta origem
+            status, response_headers, size, elapsed = self.fetch(urlsplit(staticfiles_storage.url(name)).path, headers)
+            if status >= 400:
+                raise CommandError(f'{name}: HTTP {status}')
+            total_bytes += size
+            # Um worker síncrono fica preso até o cliente receber o último byte
+            total_seconds += elapsed + size / bytes_per_second
+            responses.append({
+                'path': name,
+                'status': status,
+                'bytes': size,
+                'encoding': response_headers.get('Content-Encoding', 'identity'),
+                'cache_control': response_headers.get('Cache-Control', ''),
+            })
+        return {
+            'bytes': total_bytes,
+            'worker_seconds': round(total_seconds * clients, 3),
+            'responses': responses,
+        }
+
+    def fetch(self, url, headers):
+        environ = {'REQUEST_METHOD': 'GET', 'PATH_INFO': url, 'HTTP_HOST': 'testserver', **headers}
+        setup_testing_defaults(environ)
+        started = {}
+
+        def start_response(status, response_headers, exc_info=None):
+            started['status'] = int(status.split()[0])
+            started['headers'] = dict(response_headers)
+
+        start = time.perf_counter()
+        body = self.app(environ, start_response)
+        try:
+            size = sum(len(chunk) for chunk in body)
+        finally:
+            if hasattr(body, 'close'):
+                body.close()
+        return started['status'], started['headers'], size, time.perf_counter() - start
@@ -0,0 +1,107 @@
+import json
+import statistics
+
+from django.conf import settings
+from django.core.management.base import CommandError
+from django.db import transaction
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from core import profiling
+from core.management.commands import bench_urls
+
+PAGES = [name for name, method in bench_urls.ENDPOINTS if method == 'get']
+
+# "Antes": templates relidos e compilados a cada renderização e fragmentos {% cache %} desligados
+UNCACHED_TEMPLATES = [{
+    **settings.TEMPLATES[0],
+    'OPTIONS': {**settings.TEMPLATES[0]['OPTIONS'], 'loaders': settings.TEMPLATE_LOADERS},
+}]
+UNCACHED_FRAGMENTS = {
+    **settings.CACHES,
+    'template_fragments': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'},
+}
+
+
+class Command(bench_urls.Command):
+    help = (
+        'Mede o tempo de renderização dos templates de cada página autenticada, sem e com o cached loader e os '
+        'fragmentos {% cache %}, sobre os dados gerados pelo seed_load. Cada pedido é revertido.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--renders', type=int, default=200, help='Renderizações medidas por página e modo.')
+        parser.add_argument('--warmup', type=int, default=10, help='Renderizações por página antes da medição.')
+        parser.add_argument('--user', help='Telefone do usuário (padrão: um investidor convidado com equipa).')
+        parser.add_argument('--only', help='Rotas a medir, separadas por vírgula.')
+        parser.add_argument('--output', help='Ficheiro JSON onde gravar os resultados.')
+
+    def handle(self, *args, **options):
+        pages = PAGES
+        if options['only']:
+            names = {name.strip() for name in options['only'].split(',')}
+            pages = [name for name in PAGES if name in names]
+        if options['renders'] < 1 or not pages:
+            raise CommandError('Nada para medir.')
+
+        try:
+            with transaction.atomic(), override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']):
+                results = self.run(pages, options)
+                raise bench_urls.Rollback
+        except bench_urls.Rollback:
+            pass
+
+        for name, row in results['pages'].items():
+            self.stdout.write(
+                f'{name:>10}: sem cache p50 {row["uncached"]["p50_ms"]:7.3f} ms  p95 {row["uncached"]["p95_ms"]:7.3f} ms'
+                f'  |  com cache p50 {row["cached"]["p50_ms"]:7.3f} ms  p95 {row["cached"]["p95_ms"]:7.3f} ms'
+                f'  ({row["speedup"]:.1f}x)'
+            )
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(results, f, indent=2)
+
+    def run(self, pages, options):
+        user = self.benchmark_user(options['user'])
+        results = {
+            'meta': {
+                'user': user.phone_number,
+                'renders': options['renders'],
+                'date': timezone.now().isoformat(),
+            },
+            'pages': {},
+        }
+        for name in pages:
+            url = reverse(name)
+            with override_settings(TEMPLATES=UNCACHED_TEMPLATES, CACHES=UNCACHED_FRAGMENTS):
+                uncached = self.measure(user, url, options)
+            cached = self.measure(user, url, options)
+            results['pages'][name] = {
+                'uncached': uncached,
+                'cached': cached,
+                'speedup': round(uncached['p50_ms'] / max(cached['p50_ms'], 0.001), 2),
+            }
+        return results
+
+    def measure(self, user, url, options):
+        # Um cliente novo por modo: o handler e os templates são carregados com as definições em vigor
+        client = Client()
+        client.force_login(user)
+        for _ in range(options['warmup']):
+            self.render(client, url)
+        samples = [self.render(client, url) * 1000 for _ in range(options['renders'])]
+        return {
+            'p50_ms': round(bench_urls.percentile(samples, 50), 3),
+            'p95_ms': round(bench_urls.percentile(samples, 95), 3),
+            'mean_ms': round(statistics.fmean(samples), 3),
+        }
+
+    def render(self, client, url):
+        """Segundos gastos a renderizar templates num pedido, numa savepoint revertida."""
+        profile = profiling.Profile()
+        with transaction.atomic(), profiling.profiled(profile):
+            client.get(url)
+            transaction.set_rollback(True)
+        return profile.template_seconds
@@ -0,0 +1,173 @@
+import json
+import statistics
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from core.models import CustomUser, Task
+from core.utils import local_day_range
+
+# (nome da rota, método); as páginas e endpoints JSON de um usuário autenticado
+ENDPOINTS = [
+    ('menu', 'get'),
+    ('renda', 'get'),
+    ('equipa', 'get'),
+    ('nivel', 'get'),
+    ('saque', 'get'),
+    ('tarefa', 'get'),
+    ('deposito', 'get'),
+    ('roleta', 'get'),
+    ('perfil', 'get'),
+    ('sobre', 'get'),
+    ('process_task', 'post'),
+    ('spin_roulette', 'post'),
+]
+
+
+class Rollback(Exception):
+    pass
+
+
+def percentile(samples, p):
+    if len(samples) == 1:
+        return samples[0]
+    return statistics.quantiles(samples, n=100, method='inclusive')[p - 1]
+
+
+class Command(BaseCommand):
+    help = (
+        'Mede latência (p50/p95/p99), consultas e bytes por pedido das páginas autenticadas com o cliente de '
+        'testes, sobre os dados gerados pelo seed_load. Cada pedido é revertido.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200, help='Pedidos medidos por endpoint.')
+        parser.add_argument('--warmup', type=int, default=10, help='Pedidos por endpoint antes da medição.')
+        parser.add_argument('--user', help='Telefone do usuário (padrão: um investidor convidado com equipa).')
+        parser.add_argument('--only', help='Rotas a medir, separadas por vírgula.')
+        parser.add_argument('--output', help='Ficheiro JSON onde gravar os resultados.')
+        parser.add_argument('--baseline', help='Resultados JSON anteriores com que comparar.')
+        parser.add_argument('--tolerance', type=float, default=0.25, help='Aumento relativo de p95 tolerado.')
+        parser.add_argument('--slack-ms', type=float, default=2.0, help='Aumento absoluto de p95 sempre tolerado.')
+
+    def handle(self, *args, **options):
+        endpoints = ENDPOINTS
+        if options['only']:
+            names = {name.strip() for name in options['only'].split(',')}
+            endpoints = [endpoint for endpoint in ENDPOINTS if endpoint[0] in names]
+        if options['requests'] < 1 or not endpoints:
+            raise CommandError('Nada para medir.')
+
+        try:
+            with transaction.atomic(), override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']):
+                results = self.run(endpoints, options)
+                raise Rollback
+        except Rollback:
+            pass
+
+        for name, row in results['endpoints'].items():
+            self.stdout.write(
+                f'{name:>14}: p50 {row["p50_ms"]:7.2f} ms  p95 {row["p95_ms"]:7.2f} ms  p99 {row["p99_ms"]:7.2f} ms'
+                f'  {row["queries"]:3d} consultas  {row["bytes"]:7d} bytes  HTTP {row["status"]}'
+            )
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(results, f, indent=2)
+        if options['baseline']:
+            self.compare(results, options)
+
+    def benchmark_user(self, phone_number):
+        if phone_number:
+            try:
+                return CustomUser.objects.get(phone_number=phone_number)
+            except CustomUser.DoesNotExist:
+                raise CommandError(f'Usuário {phone_number} não encontrado.')
+        # Um investidor com convidante e equipa percorre os caminhos mais caros (subsídios, contadores)
+        users = CustomUser.objects.order_by('pk')
+        user = (
+            users.filter(level_active=True, invited_by__isnull=False, team_stats__level_a_count__gt=0).first()
+            or users.filter(level_active=True).first()
+            or users.first()
+        )
+        if user is None:
+            raise CommandError('Sem usuários; execute primeiro o seed_load.')
+        return user
+
+    def run(self, endpoints, options):
+        user = self.benchmark_user(options['user'])
+        # Dentro da transação revertida: garante giros e a tarefa do dia por fazer
+        CustomUser.objects.filter(pk=user.pk).update(roulette_spins=1)
+        today_start, today_end = local_day_range()
+        Task.objects.filter(user=user, completed_at__gte=today_start, completed_at__lt=today_end).delete()
+
+        client = Client()
+        client.force_login(user)
+        results = {
+            'meta': {
+                'user': user.phone_number,
+                'users': CustomUser.objects.count(),
+                'requests': options['requests'],
+                'database': connection.vendor,
+                'date': timezone.now().isoformat(),
+            },
+            'endpoints': {},
+        }
+        for name, method in endpoints:
+            url = reverse(name)
+            request = getattr(client, method)
+            for _ in range(options['warmup']):
+                self.request(request, url)
+            samples, queries = [], []
+            for _ in range(options['requests']):
+                elapsed, query_count, response = self.request(request, url)
+                samples.append(elapsed * 1000)
+                queries.append(query_count)
+            results['endpoints'][name] = {
+                'p50_ms': round(percentile(samples, 50), 3),
+                'p95_ms': round(percentile(samples, 95), 3),
+                'p99_ms': round(percentile(samples, 99), 3),
+                # A mediana ignora o primeiro pedido com cache fria; o máximo fica registado à parte
+                'queries': statistics.median_low(queries),
+                'max_queries': max(queries),
+                'bytes': len(response.content),
+                'status': response.status_code,
+            }
+        return results
+
+    def request(self, request, url):
+        """Um pedido numa savepoint revertida, para que todos encontrem o mesmo estado."""
+        with transaction.atomic(), CaptureQueriesContext(connection) as queries:
+            start = time.perf_counter()
+            response = request(url)
+            elapsed = time.perf_counter() - start
+            transaction.set_rollback(True)
+        return elapsed, len(queries), response
+
+    def compare(self, results, options):
+        with open(options['baseline']) as f:
+            baseline = json.load(f)['endpoints']
+
+        regressions = []
+        for name, row in results['endpoints'].items():
+            before = baseline.get(name)
+            if before is None:
+                continue
+            limit = max(before['p95_ms'] * (1 + options['tolerance']), before['p95_ms'] + options['slack_ms'])
+            if row['p95_ms'] > limit:
+                regressions.append(f'{name}: p95 {before["p95_ms"]:.2f} -> {row["p95_ms"]:.2f} ms')
+            if row['queries'] > before['queries']:
+                regressions.append(f'{name}: consultas {before["queries"]} -> {row["queries"]}')
+            if row['status'] != before['status']:
+                regressions.append(f'{name}: HTTP {before["status"]} -> {row["status"]}')
+
+        for regression in regressions:
+            self.stderr.write(self.style.ERROR(regression))
+        if regressions:
+            raise CommandError(f'{len(regressions)} regressões face a {options["baseline"]}.')
+        self.stdout.write(self.style.SUCCESS(f'Sem regressões face a {options["baseline"]}.'))
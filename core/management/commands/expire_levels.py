@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from core.expiry import expire_levels
+
+
+class Command(BaseCommand):
+    help = 'Desativa os níveis dos usuários cujo ciclo (cycle_days) terminou. Seguro para correr periodicamente (cron).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--dry-run', action='store_true', help='Apenas conta as linhas a expirar.')
+
+    def handle(self, *args, **options):
+        results = expire_levels(batch_size=options['batch_size'], dry_run=options['dry_run'])
+        for name, count in results.items():
+            self.stdout.write(f'{name}: {count} expirados')
+        verb = 'a expirar' if options['dry_run'] else 'expirados'
+        self.stdout.write(self.style.SUCCESS(f'Total {verb}: {sum(results.values())}'))
@@ -0,0 +1,42 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core import payouts
+
+
+class Command(BaseCommand):
+    help = (
+        'Exporta os saques pendentes para pagamento e marca-os como em processamento, com o identificador do '
+        'lote (escrito no stderr). Com --reexport ou --revert repete ou desfaz uma exportação que não chegou ao banco.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=sorted(payouts.FORMATS), default='csv')
+        parser.add_argument('--output', help='Ficheiro de saída (padrão: stdout).')
+        parser.add_argument('--batch-size', type=int, default=1000)
+        group = parser.add_mutually_exclusive_group()
+        group.add_argument('--reexport', metavar='LOTE', help='Volta a exportar os saques ainda em processamento deste lote.')
+        group.add_argument('--revert', metavar='LOTE', help='Devolve a pendentes os saques ainda em processamento deste lote.')
+
+    def handle(self, *args, **options):
+        if options['revert']:
+            reverted = payouts.revert_batch(options['revert'])
+            if not reverted:
+                raise CommandError(f'Nenhum saque em processamento no lote {options["revert"]}.')
+            self.stderr.write(f'{reverted} saque(s) do lote {options["revert"]} de volta a pendentes.')
+            return
+        render = payouts.FORMATS[options['format']][0]
+        if options['reexport']:
+            batch = options['reexport']
+            rows = payouts.export_batch(batch)
+        else:
+            batch = payouts.new_batch()
+            rows = payouts.export_pending(batch_size=options['batch_size'], batch=batch)
+        self.stderr.write(f'Lote {batch}')
+        lines = render(rows)
+        if options['output']:
+            with open(options['output'], 'w', newline='', encoding='utf-8') as output:
+                output.writelines(lines)
+        else:
+            sys.stdout.writelines(lines)
@@ -0,0 +1,84 @@
+import json
+import os
+
+from django.core.management.base import CommandError
+
+from core.management.commands import loadtest_server
+from core.models import CustomUser
+
+
+class Command(loadtest_server.Command):
+    help = (
+        'Receita de escalabilidade: arranca o gunicorn com a configuração de produção restrita a 1, 2, ... N CPUs '
+        '(sched_setaffinity), deixa-o dimensionar workers e threads para essas CPUs e mede o débito de cada '
+        'configuração com o loadtest_server. O gerador de carga corre nas CPUs que sobram, quando há. '
+        'Requer o seed_load; os dados são alterados.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--cores', help='Números de CPUs a medir, separados por vírgula (padrão: 1 até todas).')
+        parser.add_argument('--mode', choices=('wsgi', 'asgi'), default='wsgi', help='SERVER_MODE do gunicorn.')
+        parser.add_argument('--endpoint', choices=loadtest_server.ENDPOINTS, default='spin_roulette')
+        parser.add_argument('--connections', type=int, default=50, help='Ligações concorrentes em cada medição.')
+        parser.add_argument('--duration', type=float, default=20.0, help='Segundos de medição por configuração.')
+        parser.add_argument('--port', type=int, default=8100)
+        parser.add_argument('--prefix', default='80', help='Prefixo dos telefones gerados pelo seed_load.')
+        parser.add_argument('--password', default='carga123')
+        parser.add_argument('--output', help='Ficheiro JSON onde gravar os resultados.')
+        parser.add_argument('--db-latency-ms', type=float, default=0.0, help='Latência acrescentada a cada consulta.')
+
+    def handle(self, *args, **options):
+        if not hasattr(os, 'sched_setaffinity'):
+            raise CommandError('Requer Linux (sched_setaffinity).')
+        available = sorted(os.sched_getaffinity(0))
+        try:
+            levels = [int(value) for value in options['cores'].split(',')] if options['cores'] else None
+        except ValueError:
+            raise CommandError('--cores deve ser uma lista de inteiros.')
+        levels = levels or list(range(1, len(available) + 1))
+        if min(levels) < 1 or max(levels) > len(available):
+            raise CommandError(f'Só há {len(available)} CPUs disponíveis.')
+        if options['connections'] < 1 or options['duration'] <= 0:
+            raise CommandError('Parâmetros inválidos.')
+        phones = list(
+            CustomUser.objects.filter(phone_number__startswith=options['prefix'])
+            .order_by('pk').values_list('phone_number', flat=True)[:options['connections']]
+        )
+        if len(phones) < options['connections']:
+            raise CommandError(f'Só {len(phones)} usuários com o prefixo {options["prefix"]}; execute o seed_load.')
+
+        results = {
+            'meta': {key: options[key] for key in ('mode', 'endpoint', 'connections', 'duration', 'db_latency_ms')},
+            'levels': [],
+        }
+        sessions = None
+        try:
+            for cores in levels:
+                server_cpus, client_cpus = available[:cores], available[cores:] or available
+                server = loadtest_server.GunicornServer(
+                    options['port'], options['mode'], cpus=server_cpus, db_latency_ms=options['db_latency_ms'],
+                )
+                with server as sizing:
+                    os.sched_setaffinity(0, client_cpus)
+                    if sessions is None:
+                        # As sessões ficam na base de dados e servem para todos os arranques
+                        self.stdout.write(f'A autenticar {len(phones)} usuários...')
+                        sessions = [
+                            loadtest_server.Session('127.0.0.1', options['port'], phone, options['password'])
+                            for phone in phones
+                        ]
+                    row = {'cores': cores, **sizing, **self.run(sessions, options)}
+                row['speedup'] = round(row['throughput'] / results['levels'][0]['throughput'], 2) if results['levels'] else 1.0
+                results['levels'].append(row)
+                self.stdout.write(
+                    f'{cores:2d} CPUs ({row["workers"]} workers x {row["threads"]} threads, {row["worker_class"]}): '
+                    f'{row["throughput"]:7.1f} pedidos/s  p50 {row["p50_ms"]:7.1f} ms  p95 {row["p95_ms"]:7.1f} ms  '
+                    f'{row["errors"]} erros  ({row["speedup"]:.2f}x)'
+                )
+        finally:
+            os.sched_setaffinity(0, available)
+
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(results, f, indent=2)
+
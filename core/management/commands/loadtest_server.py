@@ -0,0 +1,253 @@
+import http.client
+import json
+import os
+import re
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from http.cookies import SimpleCookie
+from urllib.parse import urlencode, urlsplit
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.urls import reverse
+
+from core.management.commands import bench_urls
+from core.models import CustomUser
+
+# Rotas servidas por vistas async no modo ASGI
+ENDPOINTS = {
+    'spin_roulette': 'POST',
+    'process_task': 'POST',
+    'menu': 'GET',
+    'renda': 'GET',
+}
+CSRF_INPUT = re.compile(r'name="csrfmiddlewaretoken" value="([^"]+)"')
+# A configuração de produção mais a latência simulada na base de dados
+GUNICORN_CONFIG = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'gunicorn_loadtest.conf.py',
+)
+SIZING = re.compile(r'(\d+) workers x (\d+) threads \(([^;]+);')
+
+
+class Session:
+    """Cookies de sessão e CSRF de um usuário autenticado no servidor em teste."""
+
+    def __init__(self, host, port, phone, password):
+        self.host, self.port = host, port
+        self.cookies = {}
+        status, _, body = self.request('GET', reverse('login'))
+        token = CSRF_INPUT.search(body.decode())
+        if status != 200 or token is None:
+            raise CommandError(f'GET {reverse("login")}: HTTP {status} sem token CSRF')
+        form = urlencode({'csrfmiddlewaretoken': token.group(1), 'username': phone, 'password': password})
+        status, _, _ = self.request('POST', reverse('login'), form.encode(), {
+            'Content-Type': 'application/x-www-form-urlencoded',
+        })
+        if status != 302 or 'sessionid' not in self.cookies:
+            raise CommandError(f'Login de {phone} falhou (HTTP {status}); os dados vêm do seed_load?')
+
+    def headers(self, method):
+        headers = {}
+        if self.cookies:
+            headers['Cookie'] = '; '.join(f'{name}={value}' for name, value in self.cookies.items())
+        if method == 'POST' and 'csrftoken' in self.cookies:
+            headers['X-CSRFToken'] = self.cookies['csrftoken']
+            headers['Referer'] = f'http://{self.host}:{self.port}/'
+        return headers
+
+    def request(self, method, path, body=b'', headers=None):
+        connection = http.client.HTTPConnection(self.host, self.port, timeout=60)
+        try:
+            connection.request(method, path, body or None, {**self.headers(method), **(headers or {})})
+            response = connection.getresponse()
+            body = response.read()
+        finally:
+            connection.close()
+        for header in response.headers.get_all('Set-Cookie') or []:
+            for name, morsel in SimpleCookie(header).items():
+                self.cookies[name] = morsel.value
+        return response.status, response.headers, body
+
+
+class GunicornServer:
+    """Gunicorn local com o gunicorn_loadtest.conf.py enquanto dura o bloco `with`; devolve o dimensionamento."""
+
+    def __init__(self, port, mode, cpus=None, workers=None, db_latency_ms=0):
+        self.port, self.cpus = port, cpus
+        self.env = {**os.environ, 'SERVER_MODE': mode, 'LOADTEST_DB_LATENCY_MS': str(db_latency_ms)}
+        for name in ('WEB_CONCURRENCY', 'GUNICORN_THREADS'):
+            self.env.pop(name, None)
+        if workers:
+            self.env['WEB_CONCURRENCY'] = str(workers)
+
+    def __enter__(self):
+        self.log = tempfile.NamedTemporaryFile(mode='w', suffix='.log')
+        self.process = subprocess.Popen(
+            [sys.executable, '-m', 'gunicorn', '-c', GUNICORN_CONFIG, '-b', f'127.0.0.1:{self.port}'],
+            cwd=settings.BASE_DIR, env=self.env, stdout=self.log, stderr=subprocess.STDOUT,
+            preexec_fn=(lambda: os.sched_setaffinity(0, self.cpus)) if self.cpus else None,
+        )
+        try:
+            return self.wait_ready()
+        except BaseException:
+            self.__exit__(None, None, None)
+            raise
+
+    def __exit__(self, *exc_info):
+        self.process.send_signal(signal.SIGTERM)
+        try:
+            self.process.wait(timeout=60)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+            self.process.wait()
+        self.log.close()
+
+    def output(self):
+        # Outro descritor: o do gunicorn partilha a posição de escrita com self.log
+        with open(self.log.name) as f:
+            return f.read()
+
+    def wait_ready(self, timeout=60):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                raise CommandError(f'O gunicorn terminou ao arrancar:\n{self.output()[-2000:]}')
+            sizing = SIZING.search(self.output())
+            if sizing:
+                try:
+                    connection = http.client.HTTPConnection('127.0.0.1', self.port, timeout=5)
+                    connection.request('GET', reverse('login'))
+                    ready = connection.getresponse().status == 200
+                    connection.close()
+                except OSError:
+                    ready = False
+                if ready:
+                    return {
+                        'workers': int(sizing.group(1)),
+                        'threads': int(sizing.group(2)),
+                        'worker_class': sizing.group(3),
+                    }
+            time.sleep(0.2)
+        raise CommandError(f'O gunicorn não ficou pronto em {timeout} s:\n{self.output()[-2000:]}')
+
+
+class Command(BaseCommand):
+    help = (
+        'Teste de carga de um servidor em execução (gunicorn em modo WSGI ou ASGI): para cada número de ligações '
+        'concorrentes, cada uma autenticada como um usuário do seed_load, repete pedidos a um endpoint durante um '
+        'tempo fixo. O débito relativo ao de uma só ligação dá os pedidos atendidos em simultâneo pelo servidor. '
+        'Com --serve arranca ele próprio o gunicorn no porto do --url, com latência simulada na base de dados. '
+        'Os dados são alterados.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='http://127.0.0.1:8000', help='Endereço do servidor.')
+        parser.add_argument('--endpoint', choices=ENDPOINTS, default='spin_roulette')
+        parser.add_argument('--connections', default='1,10,50',
+                            help='Ligações concorrentes a medir, separadas por vírgula; a primeira é a referência.')
+        parser.add_argument('--duration', type=float, default=20.0, help='Segundos de medição por nível.')
+        parser.add_argument('--prefix', default='80', help='Prefixo dos telefones gerados pelo seed_load.')
+        parser.add_argument('--password', default='carga123')
+        parser.add_argument('--output', help='Ficheiro JSON onde gravar os resultados.')
+        parser.add_argument('--serve', choices=('wsgi', 'asgi'),
+                            help='Arranca um gunicorn local neste SERVER_MODE em vez de usar um já em execução.')
+        parser.add_argument('--workers', type=int, help='Workers do gunicorn arrancado (padrão: automático).')
+        parser.add_argument('--db-latency-ms', type=float, default=0.0,
+                            help='Latência acrescentada a cada consulta no gunicorn arrancado.')
+
+    def handle(self, *args, **options):
+        url = urlsplit(options['url'])
+        if url.scheme != 'http' or not url.hostname:
+            raise CommandError('Use um URL http://host:porta.')
+        try:
+            levels = [int(value) for value in options['connections'].split(',')]
+        except ValueError:
+            raise CommandError('--connections deve ser uma lista de inteiros.')
+        if min(levels) < 1 or options['duration'] <= 0:
+            raise CommandError('Parâmetros inválidos.')
+        phones = list(
+            CustomUser.objects.filter(phone_number__startswith=options['prefix'])
+            .order_by('pk').values_list('phone_number', flat=True)[:max(levels)]
+        )
+        if len(phones) < max(levels):
+            raise CommandError(f'Só {len(phones)} usuários com o prefixo {options["prefix"]}; execute o seed_load.')
+
+        results = {
+            'meta': {key: options[key] for key in ('url', 'endpoint', 'duration', 'serve', 'db_latency_ms')},
+            'levels': [],
+        }
+        if options['serve']:
+            server = GunicornServer(url.port or 80, options['serve'], workers=options['workers'],
+                                    db_latency_ms=options['db_latency_ms'])
+            with server as sizing:
+                results['meta'].update(sizing)
+                self.measure(url, phones, levels, results, options)
+        else:
+            self.measure(url, phones, levels, results, options)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(results, f, indent=2)
+
+    def measure(self, url, phones, levels, results, options):
+        self.stdout.write(f'A autenticar {len(phones)} usuários em {options["url"]}...')
+        sessions = [Session(url.hostname, url.port or 80, phone, options['password']) for phone in phones]
+        for count in levels:
+            row = self.run(sessions[:count], options)
+            # Lei de Little: com o débito de uma só ligação como referência, o ganho de débito é o número
+            # de pedidos que o servidor atende ao mesmo tempo
+            row['concurrency'] = round(row['throughput'] / results['levels'][0]['throughput'], 2) if results['levels'] else 1.0
+            results['levels'].append(row)
+            self.stdout.write(
+                f'{options["endpoint"]} com {count:3d} ligações: {row["throughput"]:7.1f} pedidos/s  '
+                f'p50 {row["p50_ms"]:7.1f} ms  p95 {row["p95_ms"]:7.1f} ms  {row["errors"]} erros  '
+                f'-> {row["concurrency"]:.1f} em simultâneo'
+            )
+
+    def run(self, sessions, options):
+        method = ENDPOINTS[options['endpoint']]
+        path = reverse(options['endpoint'])
+        lock = threading.Lock()
+        samples, errors = [], []
+        started = threading.Barrier(len(sessions) + 1)
+        deadline = [0.0]
+
+        def worker(session):
+            started.wait()
+            while time.perf_counter() < deadline[0]:
+                begin = time.perf_counter()
+                try:
+                    status = session.request(method, path)[0]
+                except OSError as e:
+                    status = str(e)
+                end = time.perf_counter()
+                with lock:
+                    if status == 200:
+                        samples.append((end - begin) * 1000)
+                    else:
+                        errors.append(status)
+
+        threads = [threading.Thread(target=worker, args=(session,), daemon=True) for session in sessions]
+        for thread in threads:
+            thread.start()
+        deadline[0] = time.perf_counter() + options['duration']
+        start = time.perf_counter()
+        started.wait()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+        if not samples:
+            raise CommandError(f'Nenhum pedido bem-sucedido; erros: {errors[:5]}')
+
+        return {
+            'connections': len(sessions),
+            'requests': len(samples),
+            'errors': len(errors),
+            'seconds': round(elapsed, 3),
+            'throughput': round(len(samples) / elapsed, 2),
+            'p50_ms': round(bench_urls.percentile(samples, 50), 2),
+            'p95_ms': round(bench_urls.percentile(samples, 95), 2),
+        }
@@ -0,0 +1,67 @@
+import os
+
+from django.core.management.base import BaseCommand
+
+from core import proofs
+from core.models import Deposit
+
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.webp', '.heic', '.bmp'}
+
+
+class Command(BaseCommand):
+    help = (
+        'Recomprime os comprovativos de depósito ainda não processados. '
+        'Com --sample DIR apenas mede a poupança numa pasta de imagens, sem alterar nada.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sample', help='Pasta com imagens de exemplo para medir a poupança.')
+        parser.add_argument('--limit', type=int, help='Número máximo de depósitos a processar.')
+
+    def handle(self, *args, **options):
+        if options['sample']:
+            return self.measure(options['sample'])
+
+        pending = Deposit.objects.filter(proof_processed=False).exclude(proof_of_payment='').order_by('pk')
+        ids = pending.values_list('pk', flat=True)
+        if options['limit']:
+            ids = ids[:options['limit']]
+        before = after = count = 0
+        for deposit_id in ids.iterator():
+            try:
+                result = proofs.process(deposit_id)
+            except Exception as exc:
+                self.stderr.write(f'Depósito {deposit_id}: {exc}')
+                continue
+            if result:
+                before += result[0]
+                after += result[1]
+                count += 1
+        self.report(count, before, after)
+
+    def measure(self, folder):
+        before = after = thumbnails = count = 0
+        for name in sorted(os.listdir(folder)):
+            path = os.path.join(folder, name)
+            if os.path.splitext(name)[1].lower() not in IMAGE_EXTENSIONS:
+                continue
+            with open(path, 'rb') as file:
+                data, thumbnail, _ = proofs.recompress(file)
+            before += os.path.getsize(path)
+            after += len(data)
+            thumbnails += len(thumbnail)
+            count += 1
+        self.report(count, before, after)
+        if count:
+            self.stdout.write(
+                f'Revisão no admin: {before / count / 1024:.0f} KB por comprovativo antes, '
+                f'{thumbnails / count / 1024:.0f} KB com a miniatura'
+            )
+
+    def report(self, count, before, after):
+        saved = before - after
+        ratio = saved / before if before else 0
+        self.stdout.write(self.style.SUCCESS(
+            f'{count} imagens: {before / 1024 / 1024:.1f} MB -> {after / 1024 / 1024:.1f} MB '
+            f'({saved / 1024 / 1024:.1f} MB poupados, {ratio:.0%})'
+        ))
@@ -0,0 +1,54 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from core import referrals
+from core.models import CustomUser, TeamStats
+
+FIELDS = [
+    'level_a_count', 'level_b_count', 'level_c_count',
+    'level_a_investors', 'level_b_investors', 'level_c_investors',
+]
+
+
+class Command(BaseCommand):
+    help = 'Recalcula os contadores TeamStats a partir da rede e mostra as diferenças.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true', help='Apenas mostra as diferenças, sem gravar; falha se houver alguma.')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        live = referrals.live_team_stats()
+        stored = {
+            row['user_id']: row
+            for row in TeamStats.objects.values('user_id', *FIELDS).iterator(chunk_size=options['batch_size'])
+        }
+
+        changed = []
+        for user_id in CustomUser.objects.values_list('id', flat=True).iterator(chunk_size=options['batch_size']):
+            expected = {field: live.get(user_id, {}).get(field, 0) for field in FIELDS}
+            current = stored.get(user_id)
+            if current is not None and all(current[field] == expected[field] for field in FIELDS):
+                continue
+            for field in FIELDS:
+                before = current[field] if current else None
+                if before != expected[field]:
+                    self.stdout.write(f'Usuário {user_id}: {field} {before} -> {expected[field]}')
+            changed.append(TeamStats(user_id=user_id, **expected))
+
+        if options['check']:
+            self.stdout.write(f'{len(changed)} usuários com contadores divergentes.')
+            # Código de saída diferente de zero para o cron/CI detetar a divergência
+            if changed:
+                raise CommandError('Contadores divergentes; execute sem --check para corrigir.')
+            return
+
+        with transaction.atomic():
+            TeamStats.objects.bulk_create(
+                changed,
+                batch_size=options['batch_size'],
+                update_conflicts=True,
+                unique_fields=['user'],
+                update_fields=FIELDS,
+            )
+        self.stdout.write(self.style.SUCCESS(f'{len(changed)} usuários atualizados.'))
@@ -0,0 +1,266 @@
+import random
+import time
+from array import array
+from contextlib import contextmanager
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from core import invites
+from core.models import (
+    CustomUser, Deposit, LedgerEntry, Level, Referral, Roulette, RouletteSettings, Task, TeamStats, UserLevel, Withdrawal,
+)
+from core.referrals import DEPTH_LETTERS, MAX_DEPTH
+
+DEFAULT_LEVELS = [
+    # (nome, depósito, ganho diário, ciclo em dias)
+    ('Carga 1', Decimal('5000.00'), Decimal('500.00'), 30),
+    ('Carga 2', Decimal('15000.00'), Decimal('1600.00'), 30),
+    ('Carga 3', Decimal('45000.00'), Decimal('5000.00'), 60),
+]
+DEFAULT_PRIZES = [Decimal('0'), Decimal('100'), Decimal('200'), Decimal('500'), Decimal('1000')]
+WITHDRAWAL_STATUSES = ['Pending', 'Approved', 'Rejected']
+WITHDRAWAL_WEIGHTS = [2, 7, 1]
+# Referências dos movimentos do razão, como as vistas as gravam
+REFERENCES = {Deposit: 'deposit', Task: 'task', Withdrawal: 'withdrawal', Roulette: 'roulette'}
+
+
+@contextmanager
+def explicit_dates(*fields):
+    """Deixa o bulk_create gravar datas passadas em campos `auto_now_add`."""
+    saved = [field.auto_now_add for field in fields]
+    try:
+        for field in fields:
+            field.auto_now_add = False
+        yield
+    finally:
+        for field, auto_now_add in zip(fields, saved):
+            field.auto_now_add = auto_now_add
+
+
+class Command(BaseCommand):
+    help = (
+        'Gera usuários sintéticos com redes de convites e histórico de níveis, tarefas, depósitos, '
+        'saques e roleta, para testes de carga. Os dados ficam gravados.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000000)
+        parser.add_argument('--fan-out', type=int, default=4, help='Média de convidados diretos por usuário.')
+        parser.add_argument('--depth', type=int, default=6, help='Profundidade máxima de cada rede de convites.')
+        parser.add_argument('--days', type=int, default=90, help='Dias de histórico até hoje.')
+        parser.add_argument('--investors', type=float, default=0.4, help='Fração de usuários com níveis comprados.')
+        parser.add_argument('--tasks', type=int, default=5, help='Média de tarefas por investidor.')
+        parser.add_argument('--spins', type=int, default=1, help='Média de rodadas da roleta por usuário.')
+        parser.add_argument('--withdrawals', type=float, default=0.3, help='Fração de investidores com um saque.')
+        parser.add_argument('--prefix', default='80', help='Prefixo dos números de telefone gerados.')
+        parser.add_argument('--password', default='carga123')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        if options['users'] < 1 or options['fan_out'] < 0 or options['depth'] < 0 or options['days'] < 1:
+            raise CommandError('Parâmetros inválidos.')
+        self.options = options
+        self.rng = random.Random(options['seed'])
+        self.now = timezone.now()
+        self.start = self.now - timedelta(days=options['days'])
+        self.password = make_password(options['password'])
+        self.levels = self.level_catalog()
+        self.prizes = self.prize_list()
+
+        started = time.perf_counter()
+        parents = self.referral_forest(options['users'], options['fan_out'], options['depth'])
+        self.pks = array('q')
+        # Contadores de equipa por usuário gerado: membros e investidores nos níveis A, B e C
+        self.members = [array('l', [0]) * len(parents) for _ in range(MAX_DEPTH)]
+        self.investors = [array('l', [0]) * len(parents) for _ in range(MAX_DEPTH)]
+        self.first_serial = invites.reserve(len(parents))
+        self.first_phone = CustomUser.objects.filter(phone_number__startswith=options['prefix']).count()
+
+        offset = 0
+        while offset < len(parents):
+            # O lote pára antes do primeiro usuário cujo convidante ainda não está gravado
+            last = offset + 1
+            while last < min(offset + options['batch_size'], len(parents)) and parents[last] < offset:
+                last += 1
+            with transaction.atomic():
+                self.create_chunk(parents, offset, last)
+            offset = last
+            self.stdout.write(f'{offset}/{len(parents)} usuários ({time.perf_counter() - started:.1f}s)')
+
+        with transaction.atomic():
+            self.create_team_stats()
+        self.stdout.write(self.style.SUCCESS(f'{len(parents)} usuários gerados em {time.perf_counter() - started:.1f}s.'))
+
+    def level_catalog(self):
+        if not Level.objects.exists():
+            for name, deposit, daily, cycle in DEFAULT_LEVELS:
+                Level.objects.create(
+                    name=name, deposit_value=deposit, daily_gain=daily,
+                    monthly_gain=daily * 30, cycle_days=cycle, image='level_images/carga.png',
+                )
+        return list(Level.objects.order_by('deposit_value'))
+
+    def prize_list(self):
+        settings = RouletteSettings.objects.first()
+        if settings and settings.prizes:
+            try:
+                return [Decimal(p.strip()) for p in settings.prizes.split(',') if p.strip()]
+            except ArithmeticError:
+                pass
+        return DEFAULT_PRIZES
+
+    def referral_forest(self, users, fan_out, depth):
+        """`parents[i]`: o índice do convidante do usuário `i`, ou -1; cada convidante vem antes dos convidados."""
+        parents = array('q')
+        depths = array('l')
+        cursor = 0
+        while len(parents) < users:
+            if cursor == len(parents):
+                parents.append(-1)
+                depths.append(0)
+                continue
+            node = cursor
+            cursor += 1
+            if depths[node] >= depth:
+                continue
+            for _ in range(min(self.rng.randint(0, 2 * fan_out), users - len(parents))):
+                parents.append(node)
+                depths.append(depths[node] + 1)
+        return parents
+
+    def random_date(self, after, before=None):
+        before = before or self.now
+        return after + (before - after) * self.rng.random()
+
+    def create_chunk(self, parents, first, last):
+        rng, span = self.rng, self.now - self.start
+        users, history = [], []
+        for i in range(first, last):
+            # A data de cadastro cresce com o índice, por isso os convidados entram depois dos convidantes
+            joined = self.start + span * ((i + rng.random()) / len(parents))
+            user_history = self.user_history(joined)
+            users.append(CustomUser(
+                phone_number=f'{self.options["prefix"]}{self.first_phone + i:07d}',
+                password=self.password,
+                invite_code=invites.encode(self.first_serial + i),
+                invited_by_id=self.pks[parents[i]] if parents[i] >= 0 else None,
+                date_joined=joined,
+                available_balance=user_history['balance'],
+                subsidy_balance=user_history['subsidy'],
+                level_active=user_history['active'],
+                roulette_spins=rng.randint(0, 2),
+            ))
+            history.append(user_history)
+
+        batch_size = self.options['batch_size']
+        users = CustomUser.objects.bulk_create(users, batch_size=batch_size)
+        if users[0].pk is None:
+            # Bases de dados que não devolvem as chaves geradas no INSERT
+            pks = dict(CustomUser.objects.filter(phone_number__in=[u.phone_number for u in users]).values_list('phone_number', 'pk'))
+            for user in users:
+                user.pk = pks[user.phone_number]
+        self.pks.extend(user.pk for user in users)
+
+        rows = {model: [] for model in (Referral, UserLevel, Deposit, Task, Withdrawal, Roulette)}
+        for i, user, user_history in zip(range(first, last), users, history):
+            ancestor, depth = parents[i], 1
+            while ancestor >= 0 and depth <= MAX_DEPTH:
+                rows[Referral].append(Referral(ancestor_id=self.pks[ancestor], descendant_id=user.pk, depth=depth))
+                self.members[depth - 1][ancestor] += 1
+                self.investors[depth - 1][ancestor] += user_history['active']
+                ancestor, depth = parents[ancestor], depth + 1
+            for model, objs in user_history['rows'].items():
+                for obj in objs:
+                    obj.user_id = user.pk
+                rows[model].extend(objs)
+
+        with explicit_dates(
+            UserLevel._meta.get_field('purchase_date'), Deposit._meta.get_field('created_at'),
+            Task._meta.get_field('completed_at'), Withdrawal._meta.get_field('created_at'),
+            Roulette._meta.get_field('spin_date'), LedgerEntry._meta.get_field('created_at'),
+        ):
+            for model, objs in rows.items():
+                model.objects.bulk_create(objs, batch_size=batch_size)
+            # Depois das linhas que referenciam: um depósito aprovado sem o seu movimento seria creditado
+            # outra vez ao voltar a aprová-lo no admin
+            entries = []
+            for user, user_history in zip(users, history):
+                for kind, amount, subsidy, target, created_at in user_history['postings']:
+                    entries.append(LedgerEntry(
+                        user_id=user.pk, kind=kind, amount=amount, subsidy_amount=amount if subsidy else 0,
+                        reference=target if isinstance(target, str) else f'{REFERENCES[type(target)]}:{target.pk}',
+                        created_at=created_at,
+                    ))
+            LedgerEntry.objects.bulk_create(entries, batch_size=batch_size)
+
+    def user_history(self, joined):
+        """Níveis, depósitos, tarefas, saques e rodadas de um usuário, com os movimentos e saldos resultantes."""
+        rng, options = self.rng, self.options
+        rows = {UserLevel: [], Deposit: [], Task: [], Withdrawal: [], Roulette: []}
+        # (tipo, valor, subsídio, linha ou referência, data) de cada movimento do razão
+        postings = []
+        balance, subsidy, active = Decimal('0.00'), Decimal('0.00'), False
+
+        if rng.random() < options['investors']:
+            for level in rng.sample(self.levels, rng.randint(1, min(2, len(self.levels)))):
+                purchased = self.random_date(joined)
+                ends = purchased + timedelta(days=level.cycle_days)
+                is_active = ends > self.now
+                active = active or is_active
+                # O depósito aprovado paga o nível, por isso não altera o saldo
+                deposit = Deposit(
+                    amount=level.deposit_value, proof_of_payment='deposit_proofs/carga.png', proof_processed=True,
+                    is_approved=True, created_at=purchased - timedelta(minutes=rng.randint(5, 600)),
+                )
+                rows[Deposit].append(deposit)
+                postings.append(('deposit', level.deposit_value, False, deposit, deposit.created_at))
+                rows[UserLevel].append(UserLevel(level=level, purchase_date=purchased, is_active=is_active))
+                postings.append(('level_purchase', -level.deposit_value, False, f'level:{level.pk}', purchased))
+                for _ in range(rng.randint(0, 2 * options['tasks'])):
+                    task = Task(earnings=level.daily_gain, completed_at=self.random_date(purchased, min(ends, self.now)))
+                    rows[Task].append(task)
+                    postings.append(('task', level.daily_gain, False, task, task.completed_at))
+                    balance += level.daily_gain
+            if balance and rng.random() < options['withdrawals']:
+                amount = (balance * Decimal(rng.uniform(0.2, 1))).quantize(Decimal('1'))
+                status = rng.choices(WITHDRAWAL_STATUSES, WITHDRAWAL_WEIGHTS)[0]
+                withdrawal = Withdrawal(amount=amount, status=status, created_at=self.random_date(purchased))
+                rows[Withdrawal].append(withdrawal)
+                # Os rejeitados contam como devolvidos
+                if status != 'Rejected':
+                    postings.append(('withdrawal', -amount, False, withdrawal, withdrawal.created_at))
+                    balance -= amount
+        elif rng.random() < 0.1:
+            rows[Deposit].append(Deposit(
+                amount=rng.choice(self.levels).deposit_value, proof_of_payment='deposit_proofs/carga.png',
+                proof_processed=True, created_at=self.random_date(joined),
+            ))
+
+        for _ in range(rng.randint(0, 2 * options['spins'])):
+            prize = rng.choice(self.prizes)
+            roulette = Roulette(prize=prize, spin_date=self.random_date(joined), is_approved=True)
+            rows[Roulette].append(roulette)
+            # Como o _spin_roulette: o prémio entra no saldo disponível e no de subsídios
+            postings.append(('roulette', prize, True, roulette, roulette.spin_date))
+            balance += prize
+            subsidy += prize
+
+        return {'rows': rows, 'postings': postings, 'balance': balance, 'subsidy': subsidy, 'active': active}
+
+    def create_team_stats(self):
+        batch_size = self.options['batch_size']
+        for offset in range(0, len(self.pks), batch_size):
+            stats = []
+            for i in range(offset, min(offset + batch_size, len(self.pks))):
+                fields = {}
+                for depth, letter in DEPTH_LETTERS.items():
+                    fields[f'level_{letter}_count'] = self.members[depth - 1][i]
+                    fields[f'level_{letter}_investors'] = self.investors[depth - 1][i]
+                stats.append(TeamStats(user_id=self.pks[i], **fields))
+            TeamStats.objects.bulk_create(stats, batch_size=batch_size)
@@ -0,0 +1,27 @@
+# Configuração do gunicorn só para os testes de carga (loadtest_server --serve, loadtest_scaling): a de
+# produção (gunicorn.conf.py) mais uma latência simulada em cada consulta, em LOADTEST_DB_LATENCY_MS.
+import os
+import runpy
+import time
+
+_base = runpy.run_path(os.path.join(os.path.dirname(__file__), os.pardir, os.pardir, 'gunicorn.conf.py'))
+globals().update({name: value for name, value in _base.items() if not name.startswith('__')})
+
+
+def post_worker_init(worker):
+    # A latência de rede de uma base de dados gerida, que é o que prende um worker síncrono e que o
+    # modo ASGI sobrepõe entre pedidos
+    latency = float(os.environ.get('LOADTEST_DB_LATENCY_MS', 0)) / 1000
+    if not latency:
+        return
+    from django.db.backends.signals import connection_created
+
+    def delay(execute, sql, params, many, context):
+        time.sleep(latency)
+        return execute(sql, params, many, context)
+
+    def install(sender, connection, **kwargs):
+        # À cabeça da lista: os wrappers por pedido (métricas) são retirados do fim
+        connection.execute_wrappers.insert(0, delay)
+
+    connection_created.connect(install, weak=False)
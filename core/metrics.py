@@ -0,0 +1,141 @@
+import hmac
+import os
+import time
+from contextlib import ExitStack
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connections, transaction
+from django.http import HttpResponse, HttpResponseForbidden
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, generate_latest, multiprocess,
+)
+
+# Com vários workers do gunicorn (PROMETHEUS_MULTIPROC_DIR definido em gunicorn.conf.py) cada
+# processo grava as suas métricas em ficheiros partilhados e o /metrics/ soma-as todas.
+
+REQUEST_LATENCY = Histogram(
+    'airways_request_duration_seconds', 'Duração dos pedidos por vista.', ['view', 'method'],
+)
+REQUEST_QUERIES = Histogram(
+    'airways_request_db_queries', 'Consultas SQL por pedido e vista.', ['view'],
+    buckets=(0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89, float('inf')),
+)
+TASKS_PROCESSED = Counter('airways_tasks_processed_total', 'Tarefas concluídas.')
+ROULETTE_SPINS = Counter('airways_roulette_spins_total', 'Giros da roleta.')
+DEPOSITS_CREATED = Counter('airways_deposits_created_total', 'Depósitos enviados.')
+DEPOSITS_APPROVED = Counter('airways_deposits_approved_total', 'Depósitos aprovados.')
+WITHDRAWALS_REQUESTED = Counter('airways_withdrawals_requested_total', 'Saques solicitados.')
+
+# Por worker do gunicorn, atualizadas pelos hooks de gunicorn.conf.py; as séries dos workers que já
+# saíram desaparecem com o mark_process_dead
+WORKER_REQUESTS = Gauge(
+    'airways_worker_requests', 'Pedidos atendidos pelo worker desde que arrancou.', multiprocess_mode='liveall',
+)
+WORKER_MAX_REQUESTS = Gauge(
+    'airways_worker_max_requests', 'Pedidos após os quais o worker é reciclado.', multiprocess_mode='liveall',
+)
+WORKER_MEMORY = Gauge(
+    'airways_worker_resident_memory_bytes', 'Memória residente do worker.', multiprocess_mode='liveall',
+)
+WORKER_EXITS = Counter('airways_worker_exits_total', 'Saídas de workers, por motivo.', ['reason'])
+
+
+def resident_memory():
+    """Memória residente do processo em bytes (Linux), ou None."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except OSError:
+        return None
+
+
+def observe_worker(worker):
+    WORKER_REQUESTS.set(worker.nr)
+    WORKER_MAX_REQUESTS.set(worker.max_requests)
+    memory = resident_memory()
+    if memory is not None:
+        WORKER_MEMORY.set(memory)
+
+
+def record(counter, amount=1):
+    """Incrementa um contador de negócio só quando a transação atual for confirmada."""
+    if amount:
+        transaction.on_commit(lambda: counter.inc(amount))
+
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+def install_wrapper(stack, wrapper):
+    for connection in connections.all():
+        stack.enter_context(connection.execute_wrapper(wrapper))
+
+
+class MetricsMiddleware:
+    """Regista a duração e o número de consultas de cada pedido, por nome de vista."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        queries = QueryCounter()
+        start = time.perf_counter()
+        with ExitStack() as stack:
+            install_wrapper(stack, queries)
+            response = self.get_response(request)
+        self.observe(request, queries, time.perf_counter() - start)
+        return response
+
+    async def __acall__(self, request):
+        queries = QueryCounter()
+        start = time.perf_counter()
+        # Em ASGI as consultas correm na thread síncrona do pedido (ORM async, sync_to_async), não no
+        # event loop: o contador é instalado e removido nessa mesma thread
+        stack = ExitStack()
+        await sync_to_async(install_wrapper)(stack, queries)
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(stack.close)()
+        self.observe(request, queries, time.perf_counter() - start)
+        return response
+
+    def observe(self, request, queries, elapsed):
+        # Pedidos sem rota (404) ficam agrupados para não criar uma série por URL
+        match = getattr(request, 'resolver_match', None)
+        view = match.view_name if match else '<unmatched>'
+        REQUEST_LATENCY.labels(view, request.method).observe(elapsed)
+        REQUEST_QUERIES.labels(view).observe(queries.count)
+
+
+def registry():
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        collected = CollectorRegistry()
+        multiprocess.MultiProcessCollector(collected)
+        return collected
+    return REGISTRY
+
+
+def metrics_view(request):
+    token = getattr(settings, 'METRICS_TOKEN', '')
+    if token:
+        if not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+            return HttpResponseForbidden()
+    elif not settings.DEBUG:
+        # Sem token o endpoint só fica aberto em desenvolvimento
+        return HttpResponseForbidden()
+    return HttpResponse(generate_latest(registry()), content_type=CONTENT_TYPE_LATEST)
@@ -0,0 +1,36 @@
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from whitenoise.middleware import WhiteNoiseMiddleware as BaseWhiteNoiseMiddleware
+
+
+class WhiteNoiseMiddleware(BaseWhiteNoiseMiddleware):
+    """`WhiteNoiseMiddleware` que também corre em modo async, sem passar os pedidos por uma thread."""
+
+    # Blocos lidos por cada ida à thread de ficheiros ao servir em modo async
+    block_size = 64 * 1024
+
+    async_capable = True
+
+    def __init__(self, get_response=None, **kwargs):
+        super().__init__(get_response, **kwargs)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return super().__call__(request)
+
+    async def __acall__(self, request):
+        static_file = self.find_file(request.path_info) if self.autorefresh else self.files.get(request.path_info)
+        if static_file is not None:
+            response = self.serve(static_file, request)
+            if response.file_to_stream is not None:
+                # Sem isto o Django leria o ficheiro inteiro para memória antes de o enviar
+                response.streaming_content = self.read_blocks(response.file_to_stream)
+            return response
+        return await self.get_response(request)
+
+    async def read_blocks(self, file):
+        read = sync_to_async(file.read, thread_sensitive=False)
+        while block := await read(self.block_size):
+            yield block
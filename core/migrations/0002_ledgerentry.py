@@ -0,0 +1,31 @@
+# Generated by Django 5.2.5 on 2026-10-17 15:51
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LedgerEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('deposit', 'Depósito'), ('withdrawal', 'Saque'), ('task', 'Tarefa'), ('task_subsidy', 'Subsídio de Tarefa'), ('level_purchase', 'Compra de Nível'), ('level_commission', 'Comissão de Nível'), ('roulette', 'Roleta')], max_length=20, verbose_name='Tipo')),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=10, verbose_name='Valor')),
+                ('subsidy_amount', models.DecimalField(decimal_places=2, default=0, max_digits=10, verbose_name='Valor de Subsídio')),
+                ('reference', models.CharField(blank=True, max_length=50, verbose_name='Referência')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Data de Criação')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ledger_entries', to=settings.AUTH_USER_MODEL, verbose_name='Usuário')),
+            ],
+            options={
+                'verbose_name': 'Movimento de Saldo',
+                'verbose_name_plural': 'Movimentos de Saldo',
+            },
+        ),
+    ]
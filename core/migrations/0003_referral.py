@@ -0,0 +1,45 @@
+# Generated by Django 5.2.5 on 2026-10-17 15:51
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def build_referrals(apps, schema_editor):
+    CustomUser = apps.get_model('core', 'CustomUser')
+    Referral = apps.get_model('core', 'Referral')
+    parents = dict(CustomUser.objects.values_list('id', 'invited_by_id'))
+    links = []
+    for user_id, parent_id in parents.items():
+        depth = 1
+        while parent_id and depth <= 3:
+            links.append(Referral(ancestor_id=parent_id, descendant_id=user_id, depth=depth))
+            parent_id = parents.get(parent_id)
+            depth += 1
+    Referral.objects.bulk_create(links, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0002_ledgerentry'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Referral',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('depth', models.PositiveSmallIntegerField(verbose_name='Profundidade')),
+                ('ancestor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='descendant_links', to=settings.AUTH_USER_MODEL, verbose_name='Ascendente')),
+                ('descendant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ancestor_links', to=settings.AUTH_USER_MODEL, verbose_name='Descendente')),
+            ],
+            options={
+                'verbose_name': 'Ligação de Rede',
+                'verbose_name_plural': 'Ligações de Rede',
+                'indexes': [models.Index(fields=['ancestor', 'depth'], name='referral_ancestor_depth_idx'), models.Index(fields=['descendant', 'depth'], name='referral_descendant_depth_idx')],
+                'constraints': [models.UniqueConstraint(fields=('ancestor', 'descendant'), name='unique_referral_link')],
+            },
+        ),
+        migrations.RunPython(build_referrals, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 5.2.5 on 2026-10-17 15:52
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def build_team_stats(apps, schema_editor):
+    from django.db.models import Count, Exists, OuterRef, Q
+
+    CustomUser = apps.get_model('core', 'CustomUser')
+    Referral = apps.get_model('core', 'Referral')
+    TeamStats = apps.get_model('core', 'TeamStats')
+    UserLevel = apps.get_model('core', 'UserLevel')
+
+    stats = {user_id: TeamStats(user_id=user_id) for user_id in CustomUser.objects.values_list('id', flat=True)}
+    active = Exists(UserLevel.objects.filter(user=OuterRef('descendant_id'), is_active=True))
+    rows = (
+        Referral.objects.annotate(active=active)
+        .values('ancestor_id', 'depth')
+        .annotate(members=Count('id'), investors=Count('id', filter=Q(active=True)))
+    )
+    for row in rows:
+        letter = {1: 'a', 2: 'b', 3: 'c'}[row['depth']]
+        setattr(stats[row['ancestor_id']], f'level_{letter}_count', row['members'])
+        setattr(stats[row['ancestor_id']], f'level_{letter}_investors', row['investors'])
+    TeamStats.objects.bulk_create(stats.values(), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_referral'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TeamStats',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='team_stats', serialize=False, to=settings.AUTH_USER_MODEL, verbose_name='Usuário')),
+                ('level_a_count', models.PositiveIntegerField(default=0, verbose_name='Membros Nível A')),
+                ('level_b_count', models.PositiveIntegerField(default=0, verbose_name='Membros Nível B')),
+                ('level_c_count', models.PositiveIntegerField(default=0, verbose_name='Membros Nível C')),
+                ('level_a_investors', models.PositiveIntegerField(default=0, verbose_name='Investidores Nível A')),
+                ('level_b_investors', models.PositiveIntegerField(default=0, verbose_name='Investidores Nível B')),
+                ('level_c_investors', models.PositiveIntegerField(default=0, verbose_name='Investidores Nível C')),
+            ],
+            options={
+                'verbose_name': 'Estatística de Equipa',
+                'verbose_name_plural': 'Estatísticas de Equipa',
+            },
+        ),
+        migrations.RunPython(build_team_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.5 on 2026-10-17 15:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_teamstats'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='deposit',
+            index=models.Index(fields=['user', 'is_approved'], name='deposit_user_approved_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='roulette',
+            index=models.Index(fields=['is_approved', 'spin_date'], name='roulette_approved_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(fields=['user', 'completed_at'], name='task_user_completed_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='userlevel',
+            index=models.Index(fields=['user', 'is_active'], name='userlevel_user_active_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='withdrawal',
+            index=models.Index(fields=['user', 'status', 'created_at'], name='withdrawal_user_status_idx'),
+        ),
+    ]
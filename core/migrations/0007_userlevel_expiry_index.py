@@ -0,0 +1,17 @@
+# Generated by Django 5.2.5 on 2026-10-17 15:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_idempotencykey'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='userlevel',
+            index=models.Index(fields=['level', 'is_active', 'purchase_date'], name='userlevel_level_expiry_idx'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.5 on 2026-10-17 16:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_userlevel_expiry_index'),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name='ledgerentry',
+            constraint=models.UniqueConstraint(condition=models.Q(('kind', 'deposit')), fields=('reference',), name='unique_deposit_credit'),
+        ),
+    ]
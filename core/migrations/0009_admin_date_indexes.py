@@ -0,0 +1,33 @@
+# Generated by Django 5.2.5 on 2026-10-17 16:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_unique_deposit_credit'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='deposit',
+            name='created_at',
+            field=models.DateTimeField(auto_now_add=True, db_index=True, verbose_name='Data de Criação'),
+        ),
+        migrations.AlterField(
+            model_name='roulette',
+            name='spin_date',
+            field=models.DateTimeField(auto_now_add=True, db_index=True, verbose_name='Data da Rodada'),
+        ),
+        migrations.AlterField(
+            model_name='task',
+            name='completed_at',
+            field=models.DateTimeField(auto_now_add=True, db_index=True, verbose_name='Data de Conclusão'),
+        ),
+        migrations.AlterField(
+            model_name='withdrawal',
+            name='created_at',
+            field=models.DateTimeField(auto_now_add=True, db_index=True, verbose_name='Data de Criação'),
+        ),
+    ]
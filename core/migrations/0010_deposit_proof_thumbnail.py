@@ -0,0 +1,23 @@
+# Generated by Django 5.2.5 on 2026-10-17 16:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_admin_date_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='deposit',
+            name='proof_processed',
+            field=models.BooleanField(default=False, verbose_name='Comprovativo Processado'),
+        ),
+        migrations.AddField(
+            model_name='deposit',
+            name='proof_thumbnail',
+            field=models.ImageField(blank=True, upload_to='deposit_proofs/thumbs/', verbose_name='Miniatura do Comprovativo'),
+        ),
+    ]
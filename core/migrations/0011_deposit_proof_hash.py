@@ -0,0 +1,29 @@
+# Generated by Django 5.2.5 on 2026-10-17 16:06
+
+import core.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_deposit_proof_thumbnail'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='deposit',
+            name='proof_hash',
+            field=models.CharField(blank=True, db_index=True, max_length=64, verbose_name='Hash do Comprovativo'),
+        ),
+        migrations.AlterField(
+            model_name='deposit',
+            name='proof_of_payment',
+            field=models.ImageField(storage=core.storage.ContentAddressedStorage(), upload_to='deposit_proofs/', verbose_name='Comprovativo'),
+        ),
+        migrations.AlterField(
+            model_name='deposit',
+            name='proof_thumbnail',
+            field=models.ImageField(blank=True, storage=core.storage.ContentAddressedStorage(), upload_to='deposit_proofs/thumbs/', verbose_name='Miniatura do Comprovativo'),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.5 on 2026-10-17 16:09
+
+from django.db import migrations, models
+
+
+def create_counter(apps, schema_editor):
+    InviteCodeCounter = apps.get_model('core', 'InviteCodeCounter')
+    InviteCodeCounter.objects.get_or_create(pk=1)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_deposit_proof_hash'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InviteCodeCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('next_serial', models.BigIntegerField(default=0, verbose_name='Próximo Número de Série')),
+            ],
+            options={
+                'verbose_name': 'Contador de Códigos de Convite',
+                'verbose_name_plural': 'Contadores de Códigos de Convite',
+            },
+        ),
+        migrations.RunPython(create_counter, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.5 on 2026-10-17 17:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_invitecodecounter'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='withdrawal',
+            index=models.Index(fields=['user', 'created_at', 'id'], name='withdrawal_user_created_idx'),
+        ),
+    ]
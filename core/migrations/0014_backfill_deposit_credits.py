@@ -0,0 +1,26 @@
+from django.db import migrations
+
+
+def backfill_deposit_credits(apps, schema_editor):
+    # Depósitos aprovados antes do razão (0002) foram creditados sem movimento: sem ele, voltar a aprovar
+    # um destes depósitos no admin creditava-o outra vez. O saldo já inclui o valor e não é alterado.
+    Deposit = apps.get_model('core', 'Deposit')
+    LedgerEntry = apps.get_model('core', 'LedgerEntry')
+    credited = set(LedgerEntry.objects.filter(kind='deposit').values_list('reference', flat=True))
+    entries = [
+        LedgerEntry(user_id=user_id, kind='deposit', amount=amount, reference=f'deposit:{pk}')
+        for pk, user_id, amount in Deposit.objects.filter(is_approved=True).values_list('pk', 'user_id', 'amount').iterator()
+        if f'deposit:{pk}' not in credited
+    ]
+    LedgerEntry.objects.bulk_create(entries, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_withdrawal_user_created_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_deposit_credits, migrations.RunPython.noop),
+    ]
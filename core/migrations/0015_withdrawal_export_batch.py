@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-17 18:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0014_backfill_deposit_credits'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='withdrawal',
+            name='export_batch',
+            field=models.CharField(blank=True, db_index=True, max_length=32, verbose_name='Lote de Exportação'),
+        ),
+    ]
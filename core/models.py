@@ -1,9 +1,12 @@
-from django.db import models
+from django.db import models, transaction
+from django.core.exceptions import ValidationError
 from django.contrib.auth.models import AbstractBaseUser, BaseUserManager, PermissionsMixin
 from django.utils import timezone
-import uuid
 import os
 
+from . import invites
+from .storage import proof_storage
+
 # ---
 
 class CustomUserManager(BaseUserManager):
@@ -44,17 +47,34 @@ class CustomUser(AbstractBaseUser, PermissionsMixin):
     def __str__(self):
         return self.phone_number
 
+    def clean(self):
+        super().clean()
+        if self.invited_by_id and self.pk and (
+            self.invited_by_id == self.pk
+            or Referral.objects.filter(ancestor_id=self.pk, descendant_id=self.invited_by_id).exists()
+        ):
+            raise ValidationError({'invited_by': 'O convidante não pode pertencer à equipa do próprio usuário.'})
+
     def save(self, *args, **kwargs):
         if not self.invite_code:
-            while True:
-                new_invite_code = uuid.uuid4().hex[:8]
-                if not CustomUser.objects.filter(invite_code=new_invite_code).exists():
-                    self.invite_code = new_invite_code
-                    break
+            # Sem consulta por cadastro: o código vem de um bloco de números já reservado
+            self.invite_code = invites.new_invite_code()
         super().save(*args, **kwargs)
 
 # ---
 
+class InviteCodeCounter(models.Model):
+    next_serial = models.BigIntegerField(default=0, verbose_name="Próximo Número de Série")
+
+    class Meta:
+        verbose_name = "Contador de Códigos de Convite"
+        verbose_name_plural = "Contadores de Códigos de Convite"
+
+    def __str__(self):
+        return str(self.next_serial)
+
+# ---
+
 class PlatformSettings(models.Model):
     whatsapp_link = models.URLField(
         verbose_name="Link do grupo de apoio do WhatsApp",
@@ -114,28 +134,58 @@ class BankDetails(models.Model):
 class Deposit(models.Model):
     user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, verbose_name="Usuário")
     amount = models.DecimalField(max_digits=10, decimal_places=2, verbose_name="Valor")
-    proof_of_payment = models.ImageField(upload_to='deposit_proofs/', verbose_name="Comprovativo")
+    proof_of_payment = models.ImageField(upload_to='deposit_proofs/', storage=proof_storage, verbose_name="Comprovativo")
+    proof_hash = models.CharField(max_length=64, blank=True, db_index=True, verbose_name="Hash do Comprovativo")
+    proof_thumbnail = models.ImageField(upload_to='deposit_proofs/thumbs/', storage=proof_storage, blank=True, verbose_name="Miniatura do Comprovativo")
+    proof_processed = models.BooleanField(default=False, verbose_name="Comprovativo Processado")
     is_approved = models.BooleanField(default=False, verbose_name="Aprovado")
-    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Data de Criação")
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True, verbose_name="Data de Criação")
     
     class Meta:
         verbose_name = "Depósito"
         verbose_name_plural = "Depósitos"
+        indexes = [
+            models.Index(fields=['user', 'is_approved'], name='deposit_user_approved_idx'),
+        ]
 
     def __str__(self):
         return f"Depósito de {self.amount} por {self.user.phone_number}"
 
+    def save(self, *args, **kwargs):
+        # Grava primeiro o comprovativo novo para registar o hash do upload calculado pelo storage
+        uploaded = self.proof_of_payment and not self.proof_of_payment._committed
+        if uploaded:
+            self.proof_of_payment.save(self.proof_of_payment.name, self.proof_of_payment.file, save=False)
+            self.proof_hash = proof_storage.digest(self.proof_of_payment.name)
+            # Também ao substituir o comprovativo de um depósito já processado: a miniatura é a do antigo
+            self.proof_processed = False
+            self.proof_thumbnail = ''
+            if kwargs.get('update_fields') is not None:
+                kwargs['update_fields'] = {*kwargs['update_fields'], 'proof_hash', 'proof_processed', 'proof_thumbnail'}
+        super().save(*args, **kwargs)
+        if uploaded:
+            from . import proofs  # o módulo importa os modelos
+
+            # Recompressão e miniatura fora do pedido, depois de o depósito estar gravado
+            transaction.on_commit(lambda: proofs.schedule(self.pk))
+
 # ---
 
 class Withdrawal(models.Model):
     user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, verbose_name="Usuário")
     amount = models.DecimalField(max_digits=10, decimal_places=2, verbose_name="Valor")
     status = models.CharField(max_length=20, default='Pending', verbose_name="Status")
-    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Data de Criação")
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True, verbose_name="Data de Criação")
+    # Exportação que passou o saque a "em processamento", para a repetir ou reverter
+    export_batch = models.CharField(max_length=32, blank=True, db_index=True, verbose_name="Lote de Exportação")
     
     class Meta:
         verbose_name = "Saque"
         verbose_name_plural = "Saques"
+        indexes = [
+            models.Index(fields=['user', 'status', 'created_at'], name='withdrawal_user_status_idx'),
+            models.Index(fields=['user', 'created_at', 'id'], name='withdrawal_user_created_idx'),
+        ]
 
     def __str__(self):
         return f"Saque de {self.amount} por {self.user.phone_number} ({self.status})"
@@ -168,6 +218,10 @@ class UserLevel(models.Model):
     class Meta:
         verbose_name = "Nível do Usuário"
         verbose_name_plural = "Níveis dos Usuários"
+        indexes = [
+            models.Index(fields=['user', 'is_active'], name='userlevel_user_active_idx'),
+            models.Index(fields=['level', 'is_active', 'purchase_date'], name='userlevel_level_expiry_idx'),
+        ]
 
     def __str__(self):
         return f"{self.user.phone_number} - {self.level.name}"
@@ -177,11 +231,14 @@ class UserLevel(models.Model):
 class Task(models.Model):
     user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, verbose_name="Usuário")
     earnings = models.DecimalField(max_digits=10, decimal_places=2, verbose_name="Ganhos")
-    completed_at = models.DateTimeField(auto_now_add=True, verbose_name="Data de Conclusão")
+    completed_at = models.DateTimeField(auto_now_add=True, db_index=True, verbose_name="Data de Conclusão")
 
     class Meta:
         verbose_name = "Tarefa"
         verbose_name_plural = "Tarefas"
+        indexes = [
+            models.Index(fields=['user', 'completed_at'], name='task_user_completed_idx'),
+        ]
 
     def __str__(self):
         return f"Tarefa de {self.user.phone_number} em {self.completed_at}"
@@ -191,12 +248,15 @@ class Task(models.Model):
 class Roulette(models.Model):
     user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, verbose_name="Usuário")
     prize = models.DecimalField(max_digits=10, decimal_places=2, verbose_name="Prêmio")
-    spin_date = models.DateTimeField(auto_now_add=True, verbose_name="Data da Rodada")
+    spin_date = models.DateTimeField(auto_now_add=True, db_index=True, verbose_name="Data da Rodada")
     is_approved = models.BooleanField(default=False, verbose_name="Aprovado")
 
     class Meta:
         verbose_name = "Roleta"
         verbose_name_plural = "Roletas"
+        indexes = [
+            models.Index(fields=['is_approved', 'spin_date'], name='roulette_approved_date_idx'),
+        ]
 
     def __str__(self):
         return f"Roleta de {self.user.phone_number} - Prêmio: {self.prize}"
@@ -216,4 +276,111 @@ class RouletteSettings(models.Model):
 
     def __str__(self):
         return "Configurações da Roleta"
-        
\ No newline at end of file
+        
+# ---
+
+class LedgerEntry(models.Model):
+    KIND_CHOICES = [
+        ('deposit', 'Depósito'),
+        ('withdrawal', 'Saque'),
+        ('task', 'Tarefa'),
+        ('task_subsidy', 'Subsídio de Tarefa'),
+        ('level_purchase', 'Compra de Nível'),
+        ('level_commission', 'Comissão de Nível'),
+        ('roulette', 'Roleta'),
+    ]
+
+    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='ledger_entries', verbose_name="Usuário")
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES, verbose_name="Tipo")
+    amount = models.DecimalField(max_digits=10, decimal_places=2, verbose_name="Valor")
+    subsidy_amount = models.DecimalField(max_digits=10, decimal_places=2, default=0, verbose_name="Valor de Subsídio")
+    reference = models.CharField(max_length=50, blank=True, verbose_name="Referência")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Data de Criação")
+
+    class Meta:
+        verbose_name = "Movimento de Saldo"
+        verbose_name_plural = "Movimentos de Saldo"
+        constraints = [
+            # Um depósito só pode ser creditado uma vez
+            models.UniqueConstraint(fields=['reference'], condition=models.Q(kind='deposit'), name='unique_deposit_credit'),
+        ]
+
+    def __str__(self):
+        return f"{self.get_kind_display()} de {self.amount} para o usuário {self.user_id}"
+
+    def save(self, *args, **kwargs):
+        # O razão é apenas de inserção: um movimento nunca é alterado depois de gravado
+        if not self._state.adding:
+            raise ValueError('Movimentos de saldo não podem ser alterados.')
+        super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        raise ValueError('Movimentos de saldo não podem ser apagados.')
+
+# ---
+
+class Referral(models.Model):
+    ancestor = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='descendant_links', verbose_name="Ascendente")
+    descendant = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='ancestor_links', verbose_name="Descendente")
+    depth = models.PositiveSmallIntegerField(verbose_name="Profundidade")
+
+    class Meta:
+        verbose_name = "Ligação de Rede"
+        verbose_name_plural = "Ligações de Rede"
+        constraints = [
+            models.UniqueConstraint(fields=['ancestor', 'descendant'], name='unique_referral_link'),
+        ]
+        indexes = [
+            models.Index(fields=['ancestor', 'depth'], name='referral_ancestor_depth_idx'),
+            models.Index(fields=['descendant', 'depth'], name='referral_descendant_depth_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.ancestor_id} -> {self.descendant_id} (nível {self.depth})"
+
+# ---
+
+class TeamStats(models.Model):
+    user = models.OneToOneField(CustomUser, on_delete=models.CASCADE, primary_key=True, related_name='team_stats', verbose_name="Usuário")
+    level_a_count = models.PositiveIntegerField(default=0, verbose_name="Membros Nível A")
+    level_b_count = models.PositiveIntegerField(default=0, verbose_name="Membros Nível B")
+    level_c_count = models.PositiveIntegerField(default=0, verbose_name="Membros Nível C")
+    level_a_investors = models.PositiveIntegerField(default=0, verbose_name="Investidores Nível A")
+    level_b_investors = models.PositiveIntegerField(default=0, verbose_name="Investidores Nível B")
+    level_c_investors = models.PositiveIntegerField(default=0, verbose_name="Investidores Nível C")
+
+    class Meta:
+        verbose_name = "Estatística de Equipa"
+        verbose_name_plural = "Estatísticas de Equipa"
+
+    def __str__(self):
+        return f"Equipa do usuário {self.user_id}"
+
+    @property
+    def team_count(self):
+        return self.level_a_count + self.level_b_count + self.level_c_count
+
+    @property
+    def total_investors(self):
+        return self.level_a_investors + self.level_b_investors + self.level_c_investors
+
+# ---
+
+class IdempotencyKey(models.Model):
+    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, verbose_name="Usuário")
+    endpoint = models.CharField(max_length=50, verbose_name="Endpoint")
+    key = models.CharField(max_length=64, verbose_name="Chave")
+    status_code = models.PositiveSmallIntegerField(verbose_name="Código HTTP")
+    response = models.JSONField(verbose_name="Resposta")
+    # Indexada para o purge_idempotency_keys
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True, verbose_name="Data de Criação")
+
+    class Meta:
+        verbose_name = "Chave de Idempotência"
+        verbose_name_plural = "Chaves de Idempotência"
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'endpoint', 'key'], name='unique_idempotency_key'),
+        ]
+
+    def __str__(self):
+        return f"{self.endpoint} {self.key} ({self.user_id})"
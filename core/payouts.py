@@ -0,0 +1,88 @@
+import csv
+import secrets
+from decimal import Decimal
+
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Withdrawal
+
+PENDING = 'Pending'
+PROCESSING = 'Processing'
+
+CSV_HEADER = ['id', 'telefone', 'titular', 'banco', 'iban', 'valor', 'data']
+FIELDS = [
+    'id', 'user__phone_number', 'user__bankdetails__account_holder_name',
+    'user__bankdetails__bank_name', 'user__bankdetails__IBAN', 'amount', 'created_at',
+]
+
+
+def new_batch():
+    """Identificador de uma exportação: data e hora mais um sufixo aleatório."""
+    return f'{timezone.localtime():%Y%m%d-%H%M%S}-{secrets.token_hex(3)}'
+
+
+def export_pending(queryset=None, batch_size=1000, batch=None):
+    """Gera um tuplo por saque pendente, marcando-os em lotes como em processamento sob `batch`."""
+    batch = batch or new_batch()
+    queryset = Withdrawal.objects.all() if queryset is None else queryset
+    pending = queryset.filter(status=PENDING, user__bankdetails__isnull=False).order_by('id')
+    last_id = 0
+    while True:
+        with transaction.atomic():
+            ids = list(
+                pending.filter(id__gt=last_id).select_for_update(skip_locked=True, of=('self',))
+                .values_list('id', flat=True)[:batch_size]
+            )
+            if not ids:
+                return
+            rows = list(Withdrawal.objects.filter(id__in=ids).order_by('id').values_list(*FIELDS).iterator(chunk_size=batch_size))
+            Withdrawal.objects.filter(id__in=ids).update(status=PROCESSING, export_batch=batch)
+        last_id = ids[-1]
+        yield from rows
+
+
+def export_batch(batch):
+    """Volta a gerar as tuplas dos saques de uma exportação que continuam em processamento."""
+    return (
+        Withdrawal.objects.filter(export_batch=batch, status=PROCESSING).order_by('id')
+        .values_list(*FIELDS).iterator(chunk_size=1000)
+    )
+
+
+def revert_batch(batch):
+    """Devolve a pendentes os saques de uma exportação ainda em processamento e conta-os."""
+    return Withdrawal.objects.filter(export_batch=batch, status=PROCESSING).update(status=PENDING, export_batch='')
+
+
+class _Echo:
+    def write(self, value):
+        return value
+
+
+def csv_lines(rows):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(CSV_HEADER)
+    for row in rows:
+        *values, created_at = row
+        yield writer.writerow([*values, timezone.localtime(created_at).strftime('%Y-%m-%d %H:%M')])
+
+
+def batch_lines(rows):
+    """
+    Ficheiro de lote para o banco: cabeçalho `H`, uma linha `D` por
+    transferência (valor em cêntimos) e o trailer `T` com contagem e total.
+    """
+    yield f"H;AIRWAYS;{timezone.localdate():%Y%m%d}\r\n"
+    count, total = 0, Decimal('0')
+    for withdrawal_id, phone_number, holder, bank, iban, amount, created_at in rows:
+        count += 1
+        total += amount
+        yield f"D;{iban.replace(' ', '')};{int(amount * 100)};{holder[:35]};SAQUE{withdrawal_id}\r\n"
+    yield f"T;{count};{int(total * 100)}\r\n"
+
+
+FORMATS = {
+    'csv': (csv_lines, 'text/csv', 'csv'),
+    'batch': (batch_lines, 'text/plain', 'txt'),
+}
@@ -0,0 +1,121 @@
+import json
+import logging
+import random
+import time
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.template import TemplateDoesNotExist
+from django.template.backends import django as django_backend
+
+logger = logging.getLogger(__name__)
+
+_current = ContextVar('request_profile', default=None)
+
+
+class Profile:
+    """Consultas, tempo de base de dados e de templates de um pedido amostrado."""
+
+    def __init__(self):
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.template_seconds = 0.0
+        self.statements = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        # Usado com connection.execute_wrapper; o SQL com marcadores agrupa consultas que só diferem nos parâmetros
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_seconds += time.perf_counter() - start
+            self.queries += 1
+            self.statements[sql] += 1
+
+    def repeated(self, threshold):
+        """Consultas idênticas executadas pelo menos `threshold` vezes: provável N+1."""
+        return [(sql, count) for sql, count in self.statements.most_common() if count >= threshold]
+
+
+@contextmanager
+def profiled(profile):
+    """Acumula em `profile` o tempo das renderizações de templates feitas dentro do bloco."""
+    token = _current.set(profile)
+    try:
+        yield profile
+    finally:
+        _current.reset(token)
+
+
+class Template(django_backend.Template):
+    def render(self, context=None, request=None):
+        profile = _current.get()
+        if profile is None:
+            return super().render(context, request)
+        start = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            profile.template_seconds += time.perf_counter() - start
+
+
+class DjangoTemplates(django_backend.DjangoTemplates):
+    """Backend de templates do Django que mede a renderização dos pedidos amostrados."""
+
+    def from_string(self, template_code):
+        return Template(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        try:
+            return Template(self.engine.get_template(template_name), self)
+        except TemplateDoesNotExist as exc:
+            django_backend.reraise(exc, self)
+
+
+class RequestProfilingMiddleware:
+    """Mede consultas, base de dados e templates de uma fração `REQUEST_PROFILING_SAMPLE_RATE` dos pedidos."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.sample_rate = getattr(settings, 'REQUEST_PROFILING_SAMPLE_RATE', 0.0)
+        self.repeat_threshold = getattr(settings, 'REQUEST_PROFILING_REPEAT_THRESHOLD', 3)
+        if self.sample_rate <= 0:
+            raise MiddlewareNotUsed
+
+    def __call__(self, request):
+        if self.sample_rate < 1 and random.random() >= self.sample_rate:
+            return self.get_response(request)
+
+        profile = Profile()
+        start = time.perf_counter()
+        with ExitStack() as stack:
+            stack.enter_context(profiled(profile))
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(profile))
+            response = self.get_response(request)
+        total = time.perf_counter() - start
+
+        repeated = profile.repeated(self.repeat_threshold)
+        response['Server-Timing'] = ', '.join([
+            f'db;dur={profile.db_seconds * 1000:.1f};desc="{profile.queries} queries"',
+            f'tpl;dur={profile.template_seconds * 1000:.1f}',
+            f'total;dur={total * 1000:.1f}',
+        ])
+        match = getattr(request, 'resolver_match', None)
+        line = json.dumps({
+            'method': request.method,
+            'path': request.path,
+            'view': match.view_name if match else None,
+            'status': response.status_code,
+            'total_ms': round(total * 1000, 1),
+            'db_ms': round(profile.db_seconds * 1000, 1),
+            'template_ms': round(profile.template_seconds * 1000, 1),
+            'queries': profile.queries,
+            'repeated': [{'sql': sql[:200], 'count': count} for sql, count in repeated],
+        })
+        logger.log(logging.WARNING if repeated else logging.INFO, line)
+        return response
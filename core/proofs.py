@@ -0,0 +1,107 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import close_old_connections
+from PIL import Image, ImageOps
+
+from .models import Deposit
+
+logger = logging.getLogger(__name__)
+
+# Maior lado da imagem guardada e da miniatura do admin, em píxeis
+MAX_SIDE = 1600
+THUMBNAIL_SIDE = 240
+# Limite de píxeis aceite no upload, verificado só com o cabeçalho da imagem
+MAX_PIXELS = 40_000_000
+
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='deposit-proofs')
+
+
+def check_dimensions(image):
+    """Valida as dimensões lidas do cabeçalho, sem descodificar a imagem."""
+    width, height = image.size
+    return width * height <= MAX_PIXELS and min(width, height) >= 50
+
+
+def _encode(image, side):
+    image = image.copy()
+    image.thumbnail((side, side), Image.LANCZOS)
+    output = BytesIO()
+    fmt = getattr(settings, 'DEPOSIT_PROOF_FORMAT', 'WEBP')
+    # Sem o argumento `exif`, os metadados do original não são copiados
+    image.save(output, fmt, quality=80, optimize=True)
+    return output.getvalue(), 'webp' if fmt == 'WEBP' else 'jpg'
+
+
+def recompress(file):
+    """
+    Devolve `(imagem, miniatura, extensão)` já recomprimidas a partir de um
+    ficheiro de imagem, aplicando a orientação EXIF e descartando o EXIF.
+    """
+    image = Image.open(file)
+    # Em JPEG, descodifica diretamente numa escala reduzida
+    image.draft('RGB', (MAX_SIDE, MAX_SIDE))
+    image = ImageOps.exif_transpose(image).convert('RGB')
+    data, extension = _encode(image, MAX_SIDE)
+    thumbnail, _ = _encode(image, THUMBNAIL_SIDE)
+    return data, thumbnail, extension
+
+
+def process(deposit_id):
+    """Substitui o comprovativo original pela versão recomprimida e gera a miniatura."""
+    deposit = Deposit.objects.get(pk=deposit_id)
+    if deposit.proof_processed or not deposit.proof_of_payment:
+        return None
+    original = deposit.proof_of_payment.name
+    original_size = deposit.proof_of_payment.size
+
+    twin = None
+    if deposit.proof_hash:
+        twin = (
+            Deposit.objects.filter(proof_hash=deposit.proof_hash, proof_processed=True)
+            .exclude(pk=deposit.pk).values('proof_of_payment', 'proof_thumbnail').first()
+        )
+    if twin:
+        proof_name, thumbnail_name = twin['proof_of_payment'], twin['proof_thumbnail']
+        size = deposit.proof_of_payment.storage.size(proof_name)
+    else:
+        with deposit.proof_of_payment.open('rb') as file:
+            data, thumbnail, extension = recompress(file)
+        proof_name = deposit.proof_of_payment.storage.save(
+            f'deposit_proofs/proof.{extension}', ContentFile(data))
+        thumbnail_name = deposit.proof_thumbnail.storage.save(
+            f'deposit_proofs/thumbs/proof.{extension}', ContentFile(thumbnail))
+        size = len(data)
+
+    Deposit.objects.filter(pk=deposit.pk).update(
+        proof_of_payment=proof_name,
+        proof_thumbnail=thumbnail_name,
+        proof_processed=True,
+    )
+    if proof_name != original and not Deposit.objects.filter(proof_of_payment=original).exists():
+        deposit.proof_of_payment.storage.delete(original)
+    return original_size, size
+
+
+def _run(deposit_id):
+    close_old_connections()
+    try:
+        process(deposit_id)
+    except Exception:
+        logger.exception('Falha ao processar o comprovativo do depósito %s', deposit_id)
+    finally:
+        close_old_connections()
+
+
+def schedule(deposit_id):
+    """
+    Processa o comprovativo fora do ciclo do pedido. Com
+    `DEPOSIT_PROOF_ASYNC = False` o processamento corre de imediato.
+    """
+    if getattr(settings, 'DEPOSIT_PROOF_ASYNC', True):
+        _executor.submit(_run, deposit_id)
+    else:
+        process(deposit_id)
@@ -0,0 +1,129 @@
+from collections import Counter
+
+from django.db import transaction
+from django.db.models import Count, Exists, F, OuterRef, Q
+from django.db.models.functions import Greatest
+
+from .models import Referral, TeamStats, UserLevel
+
+# Níveis da rede considerados nos subsídios e comissões (A, B, C)
+MAX_DEPTH = 3
+DEPTH_LETTERS = {1: 'a', 2: 'b', 3: 'c'}
+
+
+def link(user):
+    """Regista o usuário recém-criado na tabela de fecho e nos contadores da rede."""
+    with transaction.atomic():
+        TeamStats.objects.get_or_create(user=user)
+        if not user.invited_by_id:
+            return []
+        links = Referral.objects.bulk_create(_upline_links(user.invited_by_id, {user.pk: 0}))
+        increment([link.ancestor_id for link in sorted(links, key=lambda link: link.depth)], 'count')
+    return links
+
+
+def relink(user):
+    """Move o usuário e a sua equipa para o novo convidante (`invited_by`), acertando os contadores."""
+    with transaction.atomic():
+        subtree = {user.pk: 0, **dict(Referral.objects.filter(ancestor=user).values_list('descendant_id', 'depth'))}
+        if user.invited_by_id in subtree:
+            raise ValueError('O convidante não pode pertencer à equipa do próprio usuário.')
+        # Numa árvore, os ascendentes de fora da equipa são os do usuário, que mudam com ele
+        old = Referral.objects.filter(descendant_id__in=subtree).exclude(ancestor_id__in=subtree)
+        removed = list(old.values_list('ancestor_id', 'descendant_id', 'depth'))
+        old.delete()
+        added = [
+            (link.ancestor_id, link.descendant_id, link.depth)
+            for link in Referral.objects.bulk_create(_upline_links(user.invited_by_id, subtree))
+        ]
+        investors = set(UserLevel.objects.filter(user_id__in=subtree, is_active=True).values_list('user_id', flat=True))
+        for kind, members in (('count', subtree), ('investors', investors)):
+            totals = Counter()
+            for sign, links in ((-1, removed), (1, added)):
+                for ancestor_id, descendant_id, depth in links:
+                    if descendant_id in members:
+                        totals[ancestor_id, depth] += sign
+            _add(totals, kind)
+
+
+def parent_id(user):
+    """O convidante do usuário segundo a tabela de fecho."""
+    return Referral.objects.filter(descendant=user, depth=1).values_list('ancestor_id', flat=True).first()
+
+
+def uplines(user, with_active_level=False):
+    """Convidantes do usuário por profundidade; com `with_active_level`, pares `(ancestor_id, ativo)`."""
+    links = Referral.objects.filter(descendant=user).order_by('depth')
+    if not with_active_level:
+        return list(links.values_list('ancestor_id', flat=True))
+    active = Exists(UserLevel.objects.filter(user=OuterRef('ancestor_id'), is_active=True))
+    return list(links.annotate(active=active).values_list('ancestor_id', 'active'))
+
+
+def _upline_links(parent_id, subtree):
+    """Ligações de cada membro de `subtree` (`{user_id: profundidade}`) ao convidante e aos ascendentes deste."""
+    if not parent_id:
+        return []
+    upline = [(parent_id, 1)] + [
+        (ancestor_id, depth + 1)
+        for ancestor_id, depth in Referral.objects.filter(descendant_id=parent_id, depth__lt=MAX_DEPTH).values_list('ancestor_id', 'depth')
+    ]
+    return [
+        Referral(ancestor_id=ancestor_id, descendant_id=descendant_id, depth=offset + depth)
+        for descendant_id, offset in subtree.items()
+        for ancestor_id, depth in upline
+        if offset + depth <= MAX_DEPTH
+    ]
+
+
+def increment(ancestor_ids, kind, delta=1):
+    """
+    Atualiza os contadores `TeamStats` dos convidantes, dados por ordem de
+    profundidade (A, B, C). `kind` é `'count'` (membros) ou `'investors'`.
+    """
+    for depth, ancestor_id in enumerate(ancestor_ids[:MAX_DEPTH], start=1):
+        field = f'level_{DEPTH_LETTERS[depth]}_{kind}'
+        if not TeamStats.objects.filter(user_id=ancestor_id).update(**{field: F(field) + delta}):
+            # Usuários anteriores aos contadores ou criados fora do cadastro
+            TeamStats.objects.create(user_id=ancestor_id, **{field: max(delta, 0)})
+
+
+def _add(totals, kind):
+    """Soma aos contadores `kind` dos convidantes as variações `{(ancestor_id, profundidade): delta}`."""
+    for (ancestor_id, depth), delta in totals.items():
+        if not delta:
+            continue
+        field = f'level_{DEPTH_LETTERS[depth]}_{kind}'
+        if not TeamStats.objects.filter(user_id=ancestor_id).update(**{field: Greatest(F(field) + delta, 0)}):
+            TeamStats.objects.create(user_id=ancestor_id, **{field: max(delta, 0)})
+
+
+def remove_investors(user_ids):
+    """
+    Desconta dos investidores das equipas dos convidantes os usuários que
+    deixaram de ter um nível ativo, com um UPDATE por convidante e nível.
+    """
+    totals = Counter(Referral.objects.filter(descendant_id__in=user_ids).values_list('ancestor_id', 'depth'))
+    for (ancestor_id, depth), count in totals.items():
+        field = f'level_{DEPTH_LETTERS[depth]}_investors'
+        TeamStats.objects.filter(user_id=ancestor_id).update(**{field: Greatest(F(field) - count, 0)})
+
+
+def live_team_stats():
+    """
+    Recalcula a partir da tabela de fecho os contadores de todos os usuários
+    que têm equipa, devolvendo `{user_id: {campo: valor}}`.
+    """
+    active = Exists(UserLevel.objects.filter(user=OuterRef('descendant_id'), is_active=True))
+    rows = (
+        Referral.objects.annotate(active=active)
+        .values('ancestor_id', 'depth')
+        .annotate(members=Count('id'), investors=Count('id', filter=Q(active=True)))
+    )
+    stats = {}
+    for row in rows:
+        letter = DEPTH_LETTERS[row['depth']]
+        fields = stats.setdefault(row['ancestor_id'], {})
+        fields[f'level_{letter}_count'] = row['members']
+        fields[f'level_{letter}_investors'] = row['investors']
+    return stats
@@ -0,0 +1,57 @@
+import secrets
+from decimal import Decimal
+from fractions import Fraction
+
+from . import config_cache
+
+
+def prize_weight(amount):
+    """Peso de cada prémio na roleta: 0 é o mais comum, até 500 KZ é comum e acima disso é raro."""
+    if amount == 0:
+        return 10
+    if amount <= 500:
+        return 5
+    return 1
+
+
+class PrizeSampler:
+    """Distribuição de prémios compilada com o método de alias de Walker, com probabilidades exatas."""
+
+    def __init__(self, prizes):
+        weights = {}
+        for prize in prizes:
+            weights[prize] = weights.get(prize, 0) + prize_weight(Decimal(prize))
+        self.prizes = list(weights)
+        self.amounts = [Decimal(prize) for prize in self.prizes]
+        self.weights = [weights[prize] for prize in self.prizes]
+        self.total = sum(self.weights)
+
+        n = len(self.prizes)
+        # Cada coluna tem capacidade `total`; escala os pesos para que a soma seja n * total
+        scaled = [weight * n for weight in self.weights]
+        self.threshold = [self.total] * n
+        self.alias = list(range(n))
+        small = [i for i, value in enumerate(scaled) if value < self.total]
+        large = [i for i, value in enumerate(scaled) if value >= self.total]
+        while small and large:
+            s, l = small.pop(), large.pop()
+            self.threshold[s] = scaled[s]
+            self.alias[s] = l
+            scaled[l] -= self.total - scaled[s]
+            (small if scaled[l] < self.total else large).append(l)
+
+    def draw(self):
+        """Devolve o índice do prémio sorteado."""
+        column = secrets.randbelow(len(self.prizes))
+        if secrets.randbelow(self.total) < self.threshold[column]:
+            return column
+        return self.alias[column]
+
+    def probabilities(self):
+        """Probabilidade efetiva de cada prémio, `[(prémio, Fraction)]`."""
+        return [(prize, Fraction(weight, self.total)) for prize, weight in zip(self.prizes, self.weights)]
+
+
+def get_sampler():
+    """Sampler da configuração atual, compilado uma vez por versão da configuração."""
+    return config_cache.get('roulette_sampler', lambda: PrizeSampler(config_cache.roulette_prizes()))
@@ -0,0 +1,39 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+
+from . import config_cache, referrals, user_cache
+from .models import CustomUser, Level, PlatformBankDetails, PlatformSettings, RouletteSettings
+
+
+def invalidate_config_cache(sender, **kwargs):
+    config_cache.invalidate()
+    # Volta a invalidar após o commit para descartar leituras feitas durante a transação
+    transaction.on_commit(config_cache.invalidate)
+
+
+for model in (PlatformSettings, RouletteSettings, PlatformBankDetails, Level):
+    post_save.connect(invalidate_config_cache, sender=model, dispatch_uid=f'config_cache_save_{model.__name__}')
+    post_delete.connect(invalidate_config_cache, sender=model, dispatch_uid=f'config_cache_delete_{model.__name__}')
+
+
+def invalidate_user_cache(sender, instance, **kwargs):
+    user_cache.invalidate(instance.pk)
+    transaction.on_commit(lambda: user_cache.invalidate(instance.pk))
+
+
+post_save.connect(invalidate_user_cache, sender=CustomUser, dispatch_uid='user_cache_save')
+post_delete.connect(invalidate_user_cache, sender=CustomUser, dispatch_uid='user_cache_delete')
+
+
+def update_referrals(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    # Qualquer criação (cadastro, create_user, createsuperuser, admin) e qualquer mudança de convidante
+    if raw:
+        return
+    if created:
+        referrals.link(instance)
+    elif update_fields is None or {'invited_by', 'invited_by_id'} & set(update_fields):
+        if referrals.parent_id(instance) != instance.invited_by_id:
+            referrals.relink(instance)
+
+
+post_save.connect(update_referrals, sender=CustomUser, dispatch_uid='referrals_save')
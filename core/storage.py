@@ -0,0 +1,121 @@
+import fnmatch
+import hashlib
+import os
+import re
+import tempfile
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+from PIL import Image
+from whitenoise.storage import CompressedManifestStaticFilesStorage
+
+DIGEST_RE = re.compile(r'^[0-9a-f]{64}$')
+
+# Imagens estáticas com variantes WebP responsivas (`<nome>-<largura>w.webp`), geradas no collectstatic
+WEBP_PATTERNS = ('images/banner*.jpg',)
+WEBP_WIDTHS = (480, 960)
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """Guarda cada ficheiro sob o SHA-256 do conteúdo; conteúdos iguais partilham o mesmo ficheiro."""
+
+    def __init__(self, **kwargs):
+        # Reescrever um ficheiro existente é inofensivo: o conteúdo é idêntico
+        kwargs.setdefault('allow_overwrite', True)
+        super().__init__(**kwargs)
+
+    def _save(self, name, content):
+        folder = os.path.dirname(name)
+        extension = os.path.splitext(name)[1].lower()
+        hasher = hashlib.sha256()
+        if hasattr(content, 'temporary_file_path'):
+            # Upload já em disco: lido uma vez para o hash e depois movido (o FileSystemStorage não o copia)
+            with open(content.temporary_file_path(), 'rb') as f:
+                for chunk in iter(lambda: f.read(content.DEFAULT_CHUNK_SIZE), b''):
+                    hasher.update(chunk)
+            name = self._digest_name(folder, hasher.hexdigest(), extension)
+            return name if self.exists(name) else super()._save(name, content)
+
+        # Os blocos são escritos num ficheiro temporário da mesma pasta enquanto se calcula o hash
+        directory = self.path(folder)
+        self._makedirs(directory)
+        fd, temporary = tempfile.mkstemp(dir=directory, prefix='.upload-')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                for chunk in content.chunks():
+                    hasher.update(chunk)
+                    f.write(chunk)
+            name = self._digest_name(folder, hasher.hexdigest(), extension)
+            if not self.exists(name):
+                self._makedirs(os.path.dirname(self.path(name)))
+                os.chmod(temporary, self.file_permissions_mode or 0o644)
+                os.replace(temporary, self.path(name))
+        finally:
+            if os.path.exists(temporary):
+                os.remove(temporary)
+        return name
+
+    @staticmethod
+    def _digest_name(folder, digest, extension):
+        return os.path.join(folder, digest[:2], f'{digest}{extension}').replace('\\', '/')
+
+    def _makedirs(self, directory):
+        # Como o FileSystemStorage._save: respeita FILE_UPLOAD_DIRECTORY_PERMISSIONS
+        if self.directory_permissions_mode is None:
+            os.makedirs(directory, exist_ok=True)
+            return
+        old_umask = os.umask(0o777 & ~self.directory_permissions_mode)
+        try:
+            os.makedirs(directory, self.directory_permissions_mode, exist_ok=True)
+        finally:
+            os.umask(old_umask)
+
+    @staticmethod
+    def digest(name):
+        """Devolve o SHA-256 codificado num nome gerado por este storage, ou ''."""
+        stem = os.path.splitext(os.path.basename(name or ''))[0]
+        return stem if DIGEST_RE.match(stem) else ''
+
+
+proof_storage = ContentAddressedStorage()
+
+
+def webp_variant(name, width):
+    return f'{os.path.splitext(name)[0]}-{width}w.webp'
+
+
+class StaticFilesStorage(CompressedManifestStaticFilesStorage):
+    """Storage do collectstatic com nomes com hash, cópias comprimidas e variantes WebP."""
+
+    def stored_name(self, name):
+        if not self.hashed_files:
+            return name
+        return super().stored_name(name)
+
+    def post_process(self, paths, dry_run=False, **options):
+        if not dry_run:
+            paths = {**paths, **self.create_webp_variants(paths)}
+        yield from super().post_process(paths, dry_run, **options)
+
+    def create_webp_variants(self, paths):
+        variants = {}
+        for name in paths:
+            if not any(fnmatch.fnmatch(name, pattern) for pattern in WEBP_PATTERNS):
+                continue
+            with self.open(name) as file:
+                image = Image.open(file).convert('RGB')
+            for width in WEBP_WIDTHS:
+                variant = image.copy()
+                # Nunca amplia: uma imagem mais estreita fica com a largura original
+                variant.thumbnail((width, variant.height), Image.LANCZOS)
+                output = BytesIO()
+                variant.save(output, 'WEBP', quality=80, method=6)
+                variant_name = webp_variant(name, width)
+                if self.exists(variant_name):
+                    self.delete(variant_name)
+                self._save(variant_name, ContentFile(output.getvalue()))
+                variants[variant_name] = (self, variant_name)
+        return variants
@@ -0,0 +1,44 @@
+import os
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.db import connections
+from django.test import runner
+from django.test.utils import override_settings
+
+
+class DiscoverRunner(runner.DiscoverRunner):
+    """
+    Corre os testes com o cache `sessions` em memória, sem tocar nas sessões
+    reais da máquina, e o SQLite num ficheiro temporário desta execução.
+    """
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self.caches = override_settings(CACHES={
+            **settings.CACHES,
+            settings.SESSION_CACHE_ALIAS: {
+                'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+                'LOCATION': 'test-sessions',
+            },
+        })
+        self.caches.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self.caches.disable()
+        super().teardown_test_environment(**kwargs)
+
+    def setup_databases(self, **kwargs):
+        # Em memória as ligações de outras threads partilham o cache do SQLite e falham com "table is locked";
+        # num ficheiro esperam pelo bloqueio, e os testes com threads (LedgerStressTests) correm sem PostgreSQL
+        self.database_dir = tempfile.mkdtemp(prefix='airways-test-')
+        for connection in connections.all(initialized_only=False):
+            test = connection.settings_dict['TEST']
+            if connection.vendor == 'sqlite' and not test.get('NAME'):
+                test['NAME'] = os.path.join(self.database_dir, f'{connection.alias}.sqlite3')
+        return super().setup_databases(**kwargs)
+
+    def teardown_databases(self, old_config, **kwargs):
+        super().teardown_databases(old_config, **kwargs)
+        shutil.rmtree(self.database_dir, ignore_errors=True)
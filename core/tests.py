@@ -1,3 +1,1514 @@
-from django.test import TestCase
+from datetime import timedelta
+from decimal import Decimal
+from collections import Counter
+from fractions import Fraction
+from io import BytesIO, StringIO
+import hashlib
+import importlib
+import json
+import math
+import os
+import re
+import runpy
+import shutil
+import tempfile
+import threading
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.apps import apps as django_apps
+from django.conf import settings
+from django.core.cache import caches
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.files.uploadedfile import SimpleUploadedFile, TemporaryUploadedFile
+from django.core.management import call_command
+from django.core.exceptions import ValidationError
+from django.core.management.base import CommandError
+from django.core.servers.basehttp import WSGIServer
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Sum
+from django.test import Client, LiveServerTestCase, TestCase, TransactionTestCase, skipUnlessDBFeature
+from django.test.testcases import LiveServerThread, QuietWSGIRequestHandler
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.shortcuts import render
+from django.urls import clear_url_caches, include, path, resolve, reverse
+from django.utils import timezone
+from PIL import Image
+
+from . import config_cache, dashboard, expiry, history, invites, ledger, metrics, payouts, proofs, referrals, urls, user_cache, views
+from .cache import FileBasedCache
+from .dashboard import get_dashboard
+from .deposits import approve_deposits
+from .expiry import expire_levels
+from .forms import DepositForm
+from .management.commands import loadtest_server
+from .roulette import PrizeSampler
+from .storage import ContentAddressedStorage
+from .models import (
+    BankDetails, CustomUser, Deposit, IdempotencyKey, LedgerEntry, Level, PlatformBankDetails, PlatformSettings, RouletteSettings,
+    Roulette, Task, TeamStats, UserLevel, Withdrawal,
+)
+
+
+def create_level(**fields):
+    """O nível VIP1 dos testes; `fields` substitui os valores por omissão."""
+    return Level.objects.create(**{
+        'name': 'VIP1', 'deposit_value': Decimal('5000.00'), 'daily_gain': Decimal('500.00'),
+        'monthly_gain': Decimal('15000.00'), 'cycle_days': 30, **fields,
+    })
+
+
+def create_user(phone_number, level=None, **fields):
+    """Usuário com a senha 'senha' e, com `level`, esse nível ativo."""
+    user = CustomUser.objects.create_user(phone_number=phone_number, password='senha', **fields)
+    if level is not None:
+        UserLevel.objects.create(user=user, level=level)
+    return user
+
+
+class LedgerTests(TestCase):
+    def setUp(self):
+        self.user = create_user('923000001')
+
+    def test_interleaved_postings_do_not_lose_updates(self):
+        # Simula vários pedidos concorrentes, cada um com a sua cópia (desatualizada) do usuário
+        copies = [CustomUser.objects.get(pk=self.user.pk) for _ in range(20)]
+        for copy in copies:
+            ledger.post(copy, Decimal('10.00'), 'task')
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.available_balance, Decimal('200.00'))
+        self.assertEqual(LedgerEntry.objects.filter(user=self.user).count(), 20)
+
+    def test_posting_updates_only_balance_columns(self):
+        with CaptureQueriesContext(connection) as ctx:
+            ledger.post(self.user, Decimal('5.00'), 'task_subsidy', subsidy=True)
+        updates = [q['sql'] for q in ctx.captured_queries if q['sql'].startswith('UPDATE')]
+        self.assertEqual(len(updates), 1)
+        self.assertIn('available_balance', updates[0])
+        self.assertIn('subsidy_balance', updates[0])
+        self.assertNotIn('password', updates[0])
+        self.assertNotIn('phone_number', updates[0])
+
+        # O save() de antes regravava todas as colunas do usuário
+        with CaptureQueriesContext(connection) as ctx:
+            CustomUser.objects.get(pk=self.user.pk).save()
+        full = [q['sql'] for q in ctx.captured_queries if q['sql'].startswith('UPDATE "core_customuser"')]
+        self.assertEqual(self.set_columns(updates[0]), {'available_balance', 'subsidy_balance'})
+        self.assertGreaterEqual(len(self.set_columns(full[0])), 10)
+
+    @staticmethod
+    def set_columns(sql):
+        return set(re.findall(r'"(\w+)" = ', sql.split(' SET ', 1)[1].split(' WHERE ', 1)[0]))
+
+    def test_debit_requires_funds(self):
+        ledger.post(self.user, Decimal('100.00'), 'deposit')
+        with self.assertRaises(ledger.InsufficientFunds):
+            ledger.post(self.user, Decimal('-150.00'), 'withdrawal')
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.available_balance, Decimal('100.00'))
+        self.assertEqual(LedgerEntry.objects.filter(user=self.user).count(), 1)
+
+    def test_entries_are_append_only(self):
+        entry = ledger.post(self.user, Decimal('1.00'), 'roulette')
+        with self.assertRaises(ValueError):
+            entry.save()
+        with self.assertRaises(ValueError):
+            entry.delete()
+
+
+class ProcessTaskTests(TestCase):
+    def setUp(self):
+        self.level = create_level()
+        self.p3 = create_user('923000013')
+        self.p2 = create_user('923000012', invited_by=self.p3)
+        self.p1 = create_user('923000011', invited_by=self.p2)
+        self.user = create_user('923000010', invited_by=self.p1, level=self.level)
+        self.client.force_login(self.user)
+
+    def test_task_credits_user_and_upline(self):
+        response = self.client.post(reverse('process_task'))
+        self.assertTrue(response.json()['success'])
+        expected = {self.user: '500.00', self.p1: '100.00', self.p2: '30.00', self.p3: '10.00'}
+        for user, amount in expected.items():
+            user.refresh_from_db()
+            self.assertEqual(user.available_balance, Decimal(amount))
+
+        response = self.client.post(reverse('process_task'))
+        self.assertFalse(response.json()['success'])
+        self.assertEqual(Task.objects.filter(user=self.user).count(), 1)
+
+
+class ReferralTests(TestCase):
+    def setUp(self):
+        self.level = create_level()
+        self.root = create_user('923000020')
+
+    def register(self, phone_number, invited_by):
+        return create_user(phone_number, invited_by=invited_by)
+
+    def test_cadastro_links_upline(self):
+        a = self.register('923000021', self.root)
+        self.client.post(reverse('cadastro'), {
+            'phone_number': '923000022', 'password': 'senha', 'confirm_password': 'senha',
+            'invited_by_code': a.invite_code,
+        })
+        user = CustomUser.objects.get(phone_number='923000022')
+        self.assertEqual(referrals.uplines(user), [a.pk, self.root.pk])
+
+    def test_team_stats_follow_registrations_and_activations(self):
+        a1 = self.register('923000021', self.root)
+        self.register('923000022', self.root)
+        b1 = self.register('923000023', a1)
+        c1 = self.register('923000024', b1)
+        self.register('923000025', c1)  # Nível D não é contado
+        for user in (a1, c1):
+            user.available_balance = Decimal('10000.00')
+            user.save()
+            self.client.force_login(user)
+            self.client.post(reverse('nivel'), {'level_id': self.level.pk})
+
+        stats = TeamStats.objects.get(user=self.root)
+        self.assertEqual(
+            (stats.level_a_count, stats.level_b_count, stats.level_c_count), (2, 1, 1))
+        self.assertEqual(
+            (stats.level_a_investors, stats.level_b_investors, stats.level_c_investors), (1, 0, 1))
+
+        out = StringIO()
+        call_command('rebuild_team_stats', '--check', stdout=out, stderr=StringIO())
+        self.assertIn('0 usuários com contadores divergentes', out.getvalue())
+
+    def test_rebuild_team_stats_check_fails_on_drift(self):
+        self.register('923000021', self.root)
+        TeamStats.objects.filter(user=self.root).update(level_a_count=7)
+
+        out = StringIO()
+        with self.assertRaises(CommandError):
+            call_command('rebuild_team_stats', '--check', stdout=out, stderr=StringIO())
+        self.assertIn('1 usuários com contadores divergentes', out.getvalue())
+        self.assertEqual(TeamStats.objects.get(user=self.root).level_a_count, 7)
+
+    def test_rebuild_team_stats_repairs_drift(self):
+        a1 = self.register('923000021', self.root)
+        TeamStats.objects.filter(user=self.root).update(level_a_count=7)
+        TeamStats.objects.filter(user=a1).delete()
+
+        call_command('rebuild_team_stats', stdout=StringIO())
+        self.assertEqual(TeamStats.objects.get(user=self.root).level_a_count, 1)
+        self.assertTrue(TeamStats.objects.filter(user=a1).exists())
+
+    def test_equipa_reads_counters_by_primary_key(self):
+        for i in range(5):
+            self.register(f'92300003{i}', self.root)
+        self.client.force_login(self.root)
+        # Usuário e TeamStats, independentemente do tamanho da equipa; a sessão vem do cache
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('equipa'))
+        self.assertEqual(response.context['level_a_count'], 5)
+
+    def test_level_commission_stops_at_inactive_upline(self):
+        a = self.register('923000021', self.root)
+        buyer = self.register('923000022', a)
+        UserLevel.objects.create(user=self.root, level=self.level)
+        buyer.available_balance = Decimal('5000.00')
+        buyer.save()
+
+        self.client.force_login(buyer)
+        self.client.post(reverse('nivel'), {'level_id': self.level.pk})
+        a.refresh_from_db()
+        self.root.refresh_from_db()
+        buyer.refresh_from_db()
+        self.assertEqual(buyer.available_balance, Decimal('0.00'))
+        self.assertTrue(buyer.level_active)
+        self.assertEqual(a.available_balance, Decimal('0.00'))
+        self.assertEqual(self.root.available_balance, Decimal('0.00'))
+
+    def test_every_creation_path_links_upline(self):
+        admin = CustomUser.objects.create_superuser(phone_number='923000029', password='senha', invited_by=self.root)
+        self.assertEqual(referrals.uplines(admin), [self.root.pk])
+        self.client.force_login(admin)
+        self.client.post(reverse('admin:core_customuser_add'), {
+            'phone_number': '923000028', 'password': 'x', 'date_joined_0': '2026-01-01', 'date_joined_1': '00:00:00',
+            'invited_by': admin.pk, 'is_active': 'on', 'available_balance': '0', 'subsidy_balance': '0',
+            'roulette_spins': '0',
+        })
+        user = CustomUser.objects.get(phone_number='923000028')
+        self.assertEqual(referrals.uplines(user), [admin.pk, self.root.pk])
+        self.assertEqual(TeamStats.objects.get(user=self.root).level_b_count, 1)
+
+    def test_changing_inviter_moves_the_whole_team(self):
+        other = self.register('923000029', None)
+        a = self.register('923000021', self.root)
+        b = self.register('923000022', a)
+        c = self.register('923000023', b)
+        UserLevel.objects.create(user=c, level=self.level)
+        referrals.increment(referrals.uplines(c), 'investors')
+
+        b.invited_by = other
+        b.save(update_fields=['invited_by'])
+        self.assertEqual(referrals.uplines(b), [other.pk])
+        self.assertEqual(referrals.uplines(c), [b.pk, other.pk])
+        stats = TeamStats.objects.get(user=self.root)
+        self.assertEqual((stats.level_a_count, stats.level_b_count, stats.level_c_count), (1, 0, 0))
+        self.assertEqual(stats.level_c_investors, 0)
+        stats = TeamStats.objects.get(user=other)
+        self.assertEqual((stats.level_a_count, stats.level_b_count, stats.level_b_investors), (1, 1, 1))
+        out = StringIO()
+        call_command('rebuild_team_stats', '--check', stdout=out, stderr=StringIO())
+        self.assertIn('0 usuários com contadores divergentes', out.getvalue())
+
+        # Um usuário da própria equipa não pode passar a convidante
+        b.invited_by = c
+        with self.assertRaises(ValidationError):
+            b.clean()
+        with self.assertRaises(ValueError):
+            referrals.relink(b)
+
+
+class DashboardTests(TestCase):
+    def setUp(self):
+        caches['sessions'].clear()
+        config_cache.invalidate()
+        PlatformSettings.objects.create(
+            whatsapp_link='https://chat.whatsapp.com/airways', history_text='-',
+            deposit_instruction='-', withdrawal_instruction='-',
+        )
+        self.user = create_user('923000050', level=create_level())
+        Deposit.objects.create(user=self.user, amount=Decimal('5000.00'), proof_of_payment='p.jpg', is_approved=True)
+        Deposit.objects.create(user=self.user, amount=Decimal('900.00'), proof_of_payment='p.jpg')
+        # O admin grava 'Approved'; 'Aprovado' vem do código antigo
+        Withdrawal.objects.create(user=self.user, amount=Decimal('2000.00'), status='Approved')
+        Withdrawal.objects.create(user=self.user, amount=Decimal('300.00'), status='Aprovado')
+        Withdrawal.objects.create(user=self.user, amount=Decimal('700.00'), status='Pending')
+        Task.objects.create(user=self.user, earnings=Decimal('500.00'))
+        ledger.post(self.user, Decimal('100.00'), 'task_subsidy', subsidy=True)
+        config_cache.platform_settings()
+        self.client.force_login(self.user)
+
+    def test_dashboard_figures_in_one_query(self):
+        with self.assertNumQueries(1):
+            dashboard = get_dashboard(self.user)
+        self.assertEqual(dashboard['active_level_name'], 'VIP1')
+        self.assertEqual(dashboard['approved_deposit_total'], Decimal('5000.00'))
+        self.assertEqual(dashboard['daily_income'], Decimal('500.00'))
+        self.assertEqual(dashboard['total_withdrawals'], Decimal('2300.00'))
+        self.assertEqual(dashboard['total_income'], Decimal('600.00'))
+        self.assertEqual(dashboard['whatsapp_link'], 'https://chat.whatsapp.com/airways')
+
+        with self.assertNumQueries(0):
+            get_dashboard(self.user)
+
+    def test_menu_reads_only_the_user_and_renda_caches_dashboard(self):
+        # Só o usuário: a sessão vem do cache e o link do WhatsApp do cache de configuração
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('menu'))
+        self.assertContains(response, 'https://chat.whatsapp.com/airways')
+        # Painel
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('renda'))
+        self.assertContains(response, 'VIP1')
+        # Usuário, sessão e painel já em cache
+        with self.assertNumQueries(0):
+            self.client.get(reverse('renda'))
+
+    def test_ledger_posting_invalidates_dashboard(self):
+        get_dashboard(self.user)
+        # No cache partilhado pelos workers: a invalidação num worker vale para todos
+        self.assertIsNotNone(caches['sessions'].get(dashboard.cache_key(self.user.pk)))
+        ledger.post(self.user, Decimal('50.00'), 'roulette', subsidy=True)
+        self.user.refresh_from_db()
+        self.assertEqual(get_dashboard(self.user)['total_income'], Decimal('650.00'))
+
+
+
+class ConfigCacheTests(TestCase):
+    def setUp(self):
+        config_cache.invalidate()
+        self.platform = PlatformSettings.objects.create(
+            whatsapp_link='https://chat.whatsapp.com/airways', history_text='História',
+            deposit_instruction='Depositar', withdrawal_instruction='Sacar',
+        )
+        RouletteSettings.objects.create(prizes='0, 100, 500')
+        PlatformBankDetails.objects.create(bank_name='BAI', IBAN='AO06', account_holder_name='Airways')
+        create_level()
+        self.user = create_user('923000060')
+        self.client.force_login(self.user)
+
+    def warm(self):
+        config_cache.platform_settings()
+        config_cache.platform_bank_details()
+        config_cache.levels()
+        config_cache.roulette_prizes()
+
+    def test_steady_state_costs_no_queries(self):
+        self.warm()
+        with self.assertNumQueries(0):
+            self.assertEqual(config_cache.platform_setting('history_text'), 'História')
+            self.assertEqual(len(config_cache.platform_bank_details()), 1)
+            self.assertEqual([level.name for level in config_cache.levels()], ['VIP1'])
+            self.assertEqual(config_cache.roulette_prizes(), ['0', '100', '500'])
+
+    def test_views_read_settings_without_queries(self):
+        self.warm()
+        # Apenas o usuário; a sessão vem do cache
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('sobre'))
+        self.assertEqual(response.context['history_text'], 'História')
+
+    def test_admin_edits_invalidate(self):
+        self.warm()
+        self.platform.history_text = 'Nova história'
+        self.platform.save()
+        RouletteSettings.objects.update(prizes='1000')  # update() não emite sinais
+        RouletteSettings.objects.first().save()
+        self.assertEqual(config_cache.platform_setting('history_text'), 'Nova história')
+        self.assertEqual(config_cache.roulette_prizes(), ['1000'])
+
+        Level.objects.all().delete()
+        self.assertEqual(config_cache.levels(), [])
+
+    @override_settings(CONFIG_CACHE_ALIAS='default', CONFIG_CACHE_TIMEOUT=120)
+    def test_shared_entries_expire(self):
+        shared = caches['default']
+        shared.clear()
+        config_cache.invalidate()
+        with mock.patch.object(shared, 'set', wraps=shared.set) as set_entry:
+            self.warm()
+        # As entradas de versões antigas não ficam no cache partilhado para sempre
+        self.assertEqual(set_entry.call_count, 4)
+        self.assertTrue(all(call.args[2] == 120 for call in set_entry.call_args_list))
+        config_cache.invalidate()
+        shared.clear()
+
+
+
+class PrizeSamplerTests(TestCase):
+    PRIZES = ['0', '500', '1000', '0', '5000', '200', '0', '10000']
+
+    def legacy_pool(self):
+        pool = []
+        for p in self.PRIZES:
+            val = Decimal(p)
+            if val == 0: pool.extend([p] * 10)
+            elif val <= 500: pool.extend([p] * 5)
+            else: pool.append(p)
+        return pool
+
+    def test_alias_tables_match_legacy_weighting_exactly(self):
+        sampler = PrizeSampler(self.PRIZES)
+        pool = Counter(self.legacy_pool())
+        expected = {prize: Fraction(count, sum(pool.values())) for prize, count in pool.items()}
+        self.assertEqual(dict(sampler.probabilities()), expected)
+
+        # Probabilidade implícita nas tabelas de alias
+        n = len(sampler.prizes)
+        implied = Counter()
+        for column in range(n):
+            keep = Fraction(sampler.threshold[column], sampler.total)
+            implied[sampler.prizes[column]] += keep / n
+            implied[sampler.prizes[sampler.alias[column]]] += (1 - keep) / n
+        self.assertEqual(dict(implied), expected)
+
+    def test_draws_follow_legacy_distribution(self):
+        sampler = PrizeSampler(self.PRIZES)
+        draws = 60000
+        observed = Counter(sampler.prizes[sampler.draw()] for _ in range(draws))
+        chi2 = sum(
+            (observed[prize] - draws * p) ** 2 / (draws * p)
+            for prize, p in ((prize, float(p)) for prize, p in sampler.probabilities())
+        )
+        # Valor crítico do qui-quadrado com 5 graus de liberdade para p = 0.001
+        self.assertLess(chi2, 20.52)
+
+    def test_spin_consumes_one_spin_and_credits_prize(self):
+        config_cache.invalidate()
+        user = create_user('923000070', roulette_spins=2)
+        self.client.force_login(user)
+        data = self.client.post(reverse('spin_roulette')).json()
+        self.assertTrue(data['success'])
+        self.assertIn(data['prize'], self.PRIZES)
+        self.assertEqual(data['remaining_spins'], 1)
+        user.refresh_from_db()
+        self.assertEqual(user.available_balance, Decimal(data['prize']))
+
+
+
+class IdempotencyTests(TestCase):
+    def setUp(self):
+        config_cache.invalidate()
+        self.user = create_user('923000080', roulette_spins=3, level=create_level())
+        self.client.force_login(self.user)
+
+    def test_repeated_key_replays_stored_response(self):
+        first = self.client.post(reverse('process_task'), headers={'Idempotency-Key': 'abc'}).json()
+        second = self.client.post(reverse('process_task'), headers={'Idempotency-Key': 'abc'}).json()
+        self.assertTrue(first['success'])
+        self.assertEqual(first, second)
+        self.assertEqual(Task.objects.filter(user=self.user).count(), 1)
+        self.assertEqual(IdempotencyKey.objects.filter(user=self.user).count(), 1)
+
+    def test_spin_key_is_not_reused_across_spins(self):
+        for key in ('s1', 's1', 's2', 's3', 's4'):
+            self.client.post(reverse('spin_roulette'), headers={'Idempotency-Key': key})
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.roulette_spins, 0)
+        self.assertEqual(Roulette.objects.filter(user=self.user).count(), 3)
+
+    def test_error_responses_are_not_stored(self):
+        with mock.patch('core.views.ledger.post', side_effect=RuntimeError('falha')):
+            response = self.client.post(reverse('process_task'), headers={'Idempotency-Key': 'abc'})
+        self.assertEqual(response.status_code, 500)
+        self.assertFalse(IdempotencyKey.objects.exists())
+        # A repetição com a mesma chave volta a executar a tarefa
+        self.assertTrue(self.client.post(reverse('process_task'), headers={'Idempotency-Key': 'abc'}).json()['success'])
+
+    def test_expired_keys_are_purged_and_not_replayed(self):
+        self.client.post(reverse('spin_roulette'), headers={'Idempotency-Key': 's1'})
+        IdempotencyKey.objects.update(created_at=timezone.now() - timedelta(hours=25))
+        self.client.post(reverse('spin_roulette'), headers={'Idempotency-Key': 's1'})
+        self.assertEqual(Roulette.objects.filter(user=self.user).count(), 2)
+        self.assertEqual(IdempotencyKey.objects.count(), 1)
+
+        IdempotencyKey.objects.update(created_at=timezone.now() - timedelta(hours=25))
+        out = StringIO()
+        call_command('purge_idempotency_keys', stdout=out)
+        self.assertIn('1 chaves expiradas apagadas', out.getvalue())
+        self.assertFalse(IdempotencyKey.objects.exists())
+
+
+
+class LevelExpiryTests(TestCase):
+    def setUp(self):
+        self.level = create_level()
+        self.root = create_user('923000100')
+        self.now = timezone.now()
+
+    def buy(self, user, days_ago):
+        user_level = UserLevel.objects.create(user=user, level=self.level)
+        UserLevel.objects.filter(pk=user_level.pk).update(purchase_date=self.now - timedelta(days=days_ago))
+        CustomUser.objects.filter(pk=user.pk).update(level_active=True)
+        return user_level
+
+    def test_expires_finished_cycles_in_batches(self):
+        users = []
+        for i in range(5):
+            user = create_user(f'92300011{i}', invited_by=self.root)
+            users.append(user)
+        for user in users:
+            self.buy(user, days_ago=31)
+            referrals.increment([self.root.pk], 'investors')
+        # O último usuário tem também um nível ainda dentro do ciclo
+        self.buy(users[-1], days_ago=5)
+
+        self.assertEqual(expire_levels(now=self.now, batch_size=2), {'VIP1': 5})
+        self.assertEqual(UserLevel.objects.filter(is_active=True).count(), 1)
+        self.assertEqual(
+            list(CustomUser.objects.filter(level_active=True).values_list('pk', flat=True)), [users[-1].pk])
+        self.assertEqual(TeamStats.objects.get(user=self.root).level_a_investors, 1)
+
+        # Uma segunda execução não altera nada
+        self.assertEqual(expire_levels(now=self.now, batch_size=2), {'VIP1': 0})
+        self.assertEqual(TeamStats.objects.get(user=self.root).level_a_investors, 1)
+
+    def test_overlapping_runs_discount_investors_once(self):
+        for i in range(4):
+            user = create_user(f'92300012{i}', invited_by=self.root)
+            # O último continua investidor e o contador não desce a zero
+            self.buy(user, days_ago=31 if i < 3 else 5)
+            referrals.increment([self.root.pk], 'investors')
+        expire_batch = expiry._expire_batch
+
+        def overlapping(ids):
+            # Outra execução leu o mesmo lote e desativou-o primeiro
+            self.assertEqual(expire_batch(ids), 3)
+            return expire_batch(ids)
+
+        with mock.patch.object(expiry, '_expire_batch', side_effect=overlapping):
+            self.assertEqual(expire_levels(now=self.now), {'VIP1': 0})
+        self.assertEqual(UserLevel.objects.filter(is_active=True).count(), 1)
+        self.assertEqual(TeamStats.objects.get(user=self.root).level_a_investors, 1)
+
+    def test_dry_run_does_not_write(self):
+        self.buy(self.root, days_ago=40)
+        self.assertEqual(expire_levels(now=self.now, dry_run=True), {'VIP1': 1})
+        self.assertTrue(UserLevel.objects.get(user=self.root).is_active)
+
+
+
+class WithdrawalExportTests(TestCase):
+    def setUp(self):
+        self.admin = CustomUser.objects.create_superuser(phone_number='923000200', password='senha')
+        for i in range(5):
+            user = create_user(f'92300021{i}')
+            BankDetails.objects.create(user=user, bank_name='BAI', IBAN=f'AO06 0040 {i}', account_holder_name=f'Cliente {i}')
+            Withdrawal.objects.create(user=user, amount=Decimal('2500.50'))
+        no_bank = create_user('923000220')
+        Withdrawal.objects.create(user=no_bank, amount=Decimal('3000.00'))
+        Withdrawal.objects.create(user=user, amount=Decimal('9000.00'), status='Approved')
+
+    def test_admin_action_streams_csv_and_marks_processing(self):
+        self.client.force_login(self.admin)
+        response = self.client.post(reverse('admin:core_withdrawal_changelist'), {
+            'action': 'export_csv',
+            '_selected_action': list(Withdrawal.objects.values_list('pk', flat=True)),
+        })
+        self.assertTrue(response.streaming)
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0], ','.join(payouts.CSV_HEADER))
+        self.assertEqual(len(lines), 6)
+        self.assertEqual(Withdrawal.objects.filter(status=payouts.PROCESSING).count(), 5)
+        self.assertEqual(Withdrawal.objects.filter(status=payouts.PENDING).count(), 1)
+
+    def test_command_writes_bank_batch_once(self):
+        out = StringIO()
+        with mock.patch('sys.stdout', out):
+            call_command('export_withdrawals', '--format', 'batch', '--batch-size', '2', stderr=StringIO())
+        lines = out.getvalue().splitlines()
+        self.assertTrue(lines[0].startswith('H;AIRWAYS;'))
+        self.assertEqual(len([line for line in lines if line.startswith('D;')]), 5)
+        self.assertEqual(lines[-1], 'T;5;1250250')
+
+        out = StringIO()
+        with mock.patch('sys.stdout', out):
+            call_command('export_withdrawals', '--format', 'batch', stderr=StringIO())
+        self.assertEqual(out.getvalue().splitlines()[-1], 'T;0;0')
+
+    def test_lost_export_can_be_reexported_or_reverted(self):
+        out, err = StringIO(), StringIO()
+        with mock.patch('sys.stdout', out):
+            call_command('export_withdrawals', '--format', 'batch', stderr=err)
+        batch = err.getvalue().split()[-1]
+        self.assertEqual(Withdrawal.objects.filter(export_batch=batch, status=payouts.PROCESSING).count(), 5)
+
+        # O ficheiro perdeu-se: volta a ser gerado com as mesmas transferências
+        again = StringIO()
+        with mock.patch('sys.stdout', again):
+            call_command('export_withdrawals', '--format', 'batch', '--reexport', batch, stderr=StringIO())
+        self.assertEqual(again.getvalue().splitlines()[1:], out.getvalue().splitlines()[1:])
+
+        self.client.force_login(self.admin)
+        changelist = reverse('admin:core_withdrawal_changelist')
+        response = self.client.post(changelist, {
+            'action': 'reexport_bank_batch', '_selected_action': list(Withdrawal.objects.values_list('pk', flat=True)),
+        })
+        self.assertIn(f'saques_{batch}.txt', response['Content-Disposition'])
+        self.assertEqual(b''.join(response.streaming_content).decode().splitlines()[-1], 'T;5;1250250')
+
+        # Um saque já pago fica como está; os restantes quatro e o que não tem IBAN ficam pendentes
+        paid = Withdrawal.objects.filter(export_batch=batch).order_by('pk').first()
+        Withdrawal.objects.filter(pk=paid.pk).update(status='Approved')
+        self.client.post(changelist, {
+            'action': 'revert_to_pending', '_selected_action': list(Withdrawal.objects.values_list('pk', flat=True)),
+        })
+        self.assertEqual(Withdrawal.objects.filter(status=payouts.PENDING).count(), 5)
+        self.assertFalse(Withdrawal.objects.filter(status=payouts.PROCESSING).exists())
+        with self.assertRaises(CommandError):
+            call_command('export_withdrawals', '--revert', batch, stderr=StringIO())
+
+
+
+class DepositApprovalTests(TestCase):
+    def setUp(self):
+        self.admin = CustomUser.objects.create_superuser(phone_number='923000300', password='senha')
+        self.users = [create_user(f'92300031{i}') for i in range(3)]
+        for i in range(9):
+            Deposit.objects.create(user=self.users[i % 3], amount=Decimal('1000.00'), proof_of_payment='p.jpg')
+
+    def test_bulk_action_groups_credits_per_user(self):
+        self.client.force_login(self.admin)
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.post(reverse('admin:core_deposit_changelist'), {
+                'action': 'approve_selected',
+                '_selected_action': list(Deposit.objects.values_list('pk', flat=True)),
+            })
+        balance_updates = [q for q in ctx.captured_queries if q['sql'].startswith('UPDATE "core_customuser"')]
+        self.assertEqual(len(balance_updates), 3)
+        for user in self.users:
+            user.refresh_from_db()
+            self.assertEqual(user.available_balance, Decimal('3000.00'))
+        self.assertFalse(Deposit.objects.filter(is_approved=False).exists())
+
+    def test_reapproval_never_credits_twice(self):
+        deposit = Deposit.objects.first()
+        self.assertEqual(approve_deposits(Deposit.objects.filter(pk=deposit.pk)), 1)
+        self.assertEqual(approve_deposits(Deposit.objects.all()), 8)
+        self.assertEqual(approve_deposits(Deposit.objects.all()), 0)
+
+        # Mesmo contornando a verificação de estado, o razão recusa o segundo crédito
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            ledger.post_many([(deposit.user_id, deposit.amount, 'deposit', f'deposit:{deposit.pk}')])
+        user = deposit.user
+        user.refresh_from_db()
+        self.assertEqual(user.available_balance, Decimal('3000.00'))
+
+    def test_admin_change_form_approval_credits_once(self):
+        deposit = Deposit.objects.first()
+        self.client.force_login(self.admin)
+        url = reverse('admin:core_deposit_change', args=[deposit.pk])
+        data = {'user': deposit.user_id, 'amount': '1500.00', 'is_approved': 'on'}
+        self.client.post(url, data)
+        self.client.post(url, data)
+        deposit.user.refresh_from_db()
+        self.assertEqual(deposit.user.available_balance, Decimal('1500.00'))
+
+    def test_backfill_records_deposits_approved_before_the_ledger(self):
+        backfill = importlib.import_module('core.migrations.0014_backfill_deposit_credits').backfill_deposit_credits
+        old, credited = Deposit.objects.order_by('pk')[:2]
+        approve_deposits(Deposit.objects.filter(pk=credited.pk))
+        Deposit.objects.filter(pk=old.pk).update(is_approved=True)
+        backfill(django_apps, None)
+        backfill(django_apps, None)
+        self.assertEqual(LedgerEntry.objects.filter(reference=f'deposit:{old.pk}').count(), 1)
+        self.assertEqual(LedgerEntry.objects.filter(reference=f'deposit:{credited.pk}').count(), 1)
+        self.assertEqual(LedgerEntry.objects.count(), 2)
+
+        Deposit.objects.filter(pk=old.pk).update(is_approved=False)
+        approve_deposits(Deposit.objects.filter(pk=old.pk))
+        old.user.refresh_from_db()
+        self.assertEqual(old.user.available_balance, Decimal('0.00'))
+
+    def test_admin_retick_approves_without_second_credit(self):
+        deposit = Deposit.objects.first()
+        approve_deposits(Deposit.objects.filter(pk=deposit.pk))
+        self.client.force_login(self.admin)
+        url = reverse('admin:core_deposit_change', args=[deposit.pk])
+        self.client.post(url, {'user': deposit.user_id, 'amount': '1000.00'})
+        deposit.refresh_from_db()
+        self.assertFalse(deposit.is_approved)
+
+        response = self.client.post(url, {'user': deposit.user_id, 'amount': '1000.00', 'is_approved': 'on'})
+        self.assertEqual(response.status_code, 302)
+        deposit.refresh_from_db()
+        self.assertTrue(deposit.is_approved)
+        deposit.user.refresh_from_db()
+        self.assertEqual(deposit.user.available_balance, Decimal('1000.00'))
+        self.assertEqual(LedgerEntry.objects.filter(reference=f'deposit:{deposit.pk}').count(), 1)
+
+
+
+class AdminChangelistTests(TestCase):
+    CHANGELISTS = [
+        'core_customuser', 'core_bankdetails', 'core_deposit', 'core_withdrawal',
+        'core_task', 'core_roulette', 'core_userlevel', 'core_ledgerentry',
+    ]
+    MAX_QUERIES = 10
+
+    def setUp(self):
+        self.admin = CustomUser.objects.create_superuser(phone_number='923000400', password='senha')
+        self.level = create_level()
+        self.client.force_login(self.admin)
+        # Deixa o usuário em cache para que todas as listas sejam medidas nas mesmas condições
+        self.client.get(reverse('admin:index'))
+
+    def add_rows(self, start, count):
+        for i in range(start, start + count):
+            user = CustomUser.objects.create(phone_number=f'92400{i:04d}')
+            if i % 2:
+                BankDetails.objects.create(user=user, bank_name='BAI', IBAN=f'AO06{i}', account_holder_name='Cliente')
+            Deposit.objects.create(user=user, amount=Decimal('100.00'), proof_of_payment='p.jpg')
+            Withdrawal.objects.create(user=user, amount=Decimal('100.00'))
+            Task.objects.create(user=user, earnings=Decimal('1.00'))
+            Roulette.objects.create(user=user, prize=Decimal('0'))
+            UserLevel.objects.create(user=user, level=self.level)
+            ledger.post(user, Decimal('1.00'), 'task')
+
+    def changelist_queries(self, name):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse(f'admin:{name}_changelist'))
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries)
+
+    def test_queries_per_page_do_not_grow_with_rows(self):
+        self.add_rows(0, 3)
+        small = {name: self.changelist_queries(name) for name in self.CHANGELISTS}
+        self.add_rows(3, 20)
+        for name in self.CHANGELISTS:
+            queries = self.changelist_queries(name)
+            self.assertEqual(queries, small[name], name)
+            self.assertLessEqual(queries, self.MAX_QUERIES, name)
+
+    def test_phone_search_uses_prefix(self):
+        self.add_rows(0, 3)
+        url = reverse('admin:core_task_changelist')
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url, {'q': '924000'})
+        self.assertEqual(len(response.context['cl'].result_list), 3)
+        self.assertTrue(any("LIKE '924000%'" in q['sql'] for q in ctx.captured_queries))
+        self.assertEqual(len(self.client.get(url, {'q': '924000001'}).context['cl'].result_list), 1)
+
+
+
+class DepositProofTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        settings_override = override_settings(MEDIA_ROOT=self.media_root, DEPOSIT_PROOF_ASYNC=False)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.user = create_user('923000500')
+        self.client.force_login(self.user)
+
+    def upload(self, width, height):
+        image = Image.new('RGB', (width, height), (200, 30, 30))
+        exif = Image.Exif()
+        exif[0x010F] = 'Camera'
+        output = BytesIO()
+        image.save(output, 'JPEG', quality=95, exif=exif)
+        return SimpleUploadedFile('foto.jpg', output.getvalue(), content_type='image/jpeg')
+
+    def test_upload_is_recompressed_with_thumbnail(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('deposito'), {'amount': '5000', 'proof_of_payment': self.upload(3000, 2000)})
+        deposit = Deposit.objects.get(user=self.user)
+        self.assertTrue(deposit.proof_processed)
+        self.assertTrue(deposit.proof_of_payment.name.endswith('.webp'))
+        with Image.open(deposit.proof_of_payment.path) as stored:
+            self.assertEqual(max(stored.size), proofs.MAX_SIDE)
+            self.assertFalse(stored.getexif())
+        with Image.open(deposit.proof_thumbnail.path) as thumbnail:
+            self.assertEqual(max(thumbnail.size), proofs.THUMBNAIL_SIDE)
+        # O original foi removido: restam a imagem recomprimida e a miniatura
+        stored = [files for _, _, files in os.walk(os.path.join(self.media_root, 'deposit_proofs'))]
+        self.assertEqual(sum(len(files) for files in stored), 2)
+        self.assertTrue(deposit.proof_hash)
+
+    def test_replaced_proof_is_processed_again(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('deposito'), {'amount': '5000', 'proof_of_payment': self.upload(1200, 900)})
+        deposit = Deposit.objects.get(user=self.user)
+        old_proof, old_thumbnail = deposit.proof_of_payment.name, deposit.proof_thumbnail.name
+
+        deposit.proof_of_payment = self.upload(900, 1200)
+        with self.captureOnCommitCallbacks() as callbacks:
+            deposit.save()
+        deposit.refresh_from_db()
+        self.assertFalse(deposit.proof_processed)
+        self.assertFalse(deposit.proof_thumbnail)
+        self.assertEqual(len(callbacks), 1)
+
+        callbacks[0]()
+        deposit.refresh_from_db()
+        self.assertTrue(deposit.proof_processed)
+        self.assertNotIn(deposit.proof_of_payment.name, (old_proof, ''))
+        self.assertNotEqual(deposit.proof_thumbnail.name, old_thumbnail)
+        with Image.open(deposit.proof_thumbnail.path) as thumbnail:
+            self.assertEqual(thumbnail.size[1], proofs.THUMBNAIL_SIDE)
+
+    def test_identical_uploads_are_stored_once(self):
+        data = self.upload(1200, 900).read()
+        with self.captureOnCommitCallbacks(execute=True):
+            for _ in range(3):
+                proof = SimpleUploadedFile('foto.jpg', data, content_type='image/jpeg')
+                self.client.post(reverse('deposito'), {'amount': '5000', 'proof_of_payment': proof})
+        deposits = list(Deposit.objects.filter(user=self.user))
+        self.assertEqual(len(deposits), 3)
+        self.assertEqual(len({d.proof_hash for d in deposits}), 1)
+        self.assertEqual(len({d.proof_of_payment.name for d in deposits}), 1)
+        self.assertTrue(all(d.proof_processed for d in deposits))
+        stored = [files for _, _, files in os.walk(os.path.join(self.media_root, 'deposit_proofs'))]
+        self.assertEqual(sum(len(files) for files in stored), 2)
+
+        admin = CustomUser.objects.create_superuser(phone_number='923000501', password='senha')
+        self.client.force_login(admin)
+        response = self.client.get(reverse('admin:core_deposit_changelist'))
+        self.assertTrue(all(d.has_duplicate_proof for d in response.context['cl'].result_list))
+
+    def test_storage_reads_each_upload_once(self):
+        storage = ContentAddressedStorage(location=self.media_root)
+        data = os.urandom(3 * 64 * 1024 + 5)
+        digest = hashlib.sha256(data).hexdigest()
+        expected = f'deposit_proofs/{digest[:2]}/{digest}.png'
+
+        # Em memória: o hash é calculado enquanto os blocos são escritos
+        upload = SimpleUploadedFile('foto.PNG', data)
+        with mock.patch.object(upload, 'chunks', wraps=upload.chunks) as chunks:
+            self.assertEqual(storage.save('deposit_proofs/foto.PNG', upload), expected)
+        self.assertEqual(chunks.call_count, 1)
+        with storage.open(expected) as f:
+            self.assertEqual(f.read(), data)
+
+        # Em disco: lido uma vez para o hash e movido; um conteúdo repetido não é escrito de novo
+        upload = TemporaryUploadedFile('foto.png', 'image/png', len(data), None)
+        self.addCleanup(upload.close)
+        upload.write(data)
+        upload.flush()
+        with mock.patch.object(upload, 'chunks', wraps=upload.chunks) as chunks:
+            self.assertEqual(storage.save('deposit_proofs/foto.png', upload), expected)
+        self.assertEqual(chunks.call_count, 0)
+        self.assertEqual(storage.save('deposit_proofs/outra.png', SimpleUploadedFile('outra.png', data)), expected)
+
+        stored = [name for _, _, files in os.walk(self.media_root) for name in files]
+        self.assertEqual(stored, [f'{digest}.png'])
+
+    def test_rejects_invalid_dimensions(self):
+        form = DepositForm({'amount': '5000'}, {'proof_of_payment': self.upload(20, 20)})
+        self.assertFalse(form.is_valid())
+        self.assertIn('proof_of_payment', form.errors)
+        self.assertTrue(DepositForm({'amount': '5000'}, {'proof_of_payment': self.upload(800, 600)}).is_valid())
+
+
+class InviteCodeTests(TestCase):
+    def test_codes_are_distinct_and_never_look_like_legacy_codes(self):
+        codes = {invites.encode(serial) for serial in range(100000)}
+        self.assertEqual(len(codes), 100000)
+        for code in list(codes)[:1000]:
+            self.assertEqual(len(code), 8)
+            self.assertNotIn(code[0], '0123456789abcdef')
+
+    def test_registration_uses_no_extra_queries_once_a_block_is_reserved(self):
+        # O bloco é reservado depois do commit do primeiro cadastro
+        with self.captureOnCommitCallbacks(execute=True):
+            CustomUser.objects.create(phone_number='923100000')
+        with CaptureQueriesContext(connection) as queries:
+            user = CustomUser.objects.create(phone_number='923100001')
+        # As restantes consultas são as da ligação à rede (post_save)
+        self.assertFalse([q for q in queries if 'core_invitecodecounter' in q['sql']])
+        self.assertEqual(len([q for q in queries if q['sql'].startswith('INSERT INTO "core_customuser"')]), 1)
+        self.assertEqual(len(user.invite_code), 8)
+
+    def test_block_reserved_in_rolled_back_transaction_is_discarded(self):
+        allocator = invites.InviteCodeAllocator(block_size=10)
+        try:
+            with transaction.atomic():
+                first = allocator.serial()
+                self.assertEqual(allocator.serial(), first + 1)
+                raise IntegrityError
+        except IntegrityError:
+            pass
+        # A reserva foi revertida, por isso o bloco volta a ser reservado do início
+        self.assertEqual(allocator.serial(), first)
+
+    def test_blocks_are_shared_by_threads_only_once_committed(self):
+        allocator = invites.InviteCodeAllocator(block_size=10)
+        with self.captureOnCommitCallbacks(execute=True):
+            first = allocator.serial()
+        serials = []
+        threads = [threading.Thread(target=lambda: serials.append(allocator.serial())) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        # Números do bloco confirmado, sem consultas nas outras threads
+        self.assertEqual(sorted(serials), list(range(first + 1, first + 6)))
+
+
+class SeedLoadTests(TestCase):
+    def test_seeds_consistent_referral_trees_and_history(self):
+        call_command('seed_load', users=300, fan_out=3, depth=5, batch_size=64, stdout=StringIO())
+
+        users = CustomUser.objects.filter(phone_number__startswith='80')
+        self.assertEqual(users.count(), 300)
+        self.assertEqual(users.values('invite_code').distinct().count(), 300)
+        self.assertEqual(users.values('password').distinct().count(), 1)
+        self.assertTrue(users.first().check_password('carga123'))
+        self.assertTrue(users.filter(invited_by__isnull=False).exists())
+        self.assertTrue(Task.objects.exists() and Deposit.objects.exists() and Roulette.objects.exists())
+        self.assertTrue(UserLevel.objects.filter(purchase_date__lt=timezone.now() - timedelta(days=1)).exists())
+
+        # Tabela de fecho, contadores de equipa e níveis ativos coincidem com o que o cadastro manteria
+        out = StringIO()
+        call_command('rebuild_team_stats', check=True, stdout=out, stderr=StringIO())
+        self.assertIn('0 usuários com contadores divergentes.', out.getvalue())
+        for user in users.filter(invited_by__isnull=False)[:20]:
+            chain, ancestor = [], user.invited_by
+            while ancestor and len(chain) < referrals.MAX_DEPTH:
+                chain.append(ancestor.pk)
+                ancestor = ancestor.invited_by
+            self.assertEqual(referrals.uplines(user), chain)
+        self.assertEqual(
+            set(users.filter(level_active=True).values_list('pk', flat=True)),
+            set(UserLevel.objects.filter(is_active=True).values_list('user_id', flat=True)),
+        )
+
+        # O razão explica os saldos, como nos dados criados pelas vistas
+        for user in users.filter(ledger_entries__isnull=False).distinct()[:50]:
+            totals = LedgerEntry.objects.filter(user=user).aggregate(amount=Sum('amount'), subsidy=Sum('subsidy_amount'))
+            self.assertEqual((totals['amount'], totals['subsidy']), (user.available_balance, user.subsidy_balance))
+        self.assertEqual(
+            LedgerEntry.objects.filter(kind='deposit').count(), Deposit.objects.filter(is_approved=True).count())
+        self.assertTrue(Deposit._meta.get_field('created_at').auto_now_add)
+
+        # Voltar a aprovar um depósito gerado no admin não o credita outra vez
+        deposit = Deposit.objects.filter(is_approved=True).first()
+        balance = deposit.user.available_balance
+        Deposit.objects.filter(pk=deposit.pk).update(is_approved=False)
+        approve_deposits(Deposit.objects.filter(pk=deposit.pk))
+        deposit.user.refresh_from_db()
+        self.assertEqual(deposit.user.available_balance, balance)
+
+
+class BenchUrlsTests(TestCase):
+    def setUp(self):
+        call_command('seed_load', users=60, fan_out=3, depth=3, stdout=StringIO())
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir)
+
+    def test_records_every_endpoint_and_compares_with_baseline(self):
+        output = os.path.join(self.dir, 'bench.json')
+        call_command('bench_urls', requests=3, warmup=1, output=output, stdout=StringIO())
+        with open(output) as f:
+            results = json.load(f)
+        self.assertEqual(set(results['endpoints']), {'menu', 'renda', 'equipa', 'nivel', 'saque', 'tarefa', 'deposito',
+                                                     'roleta', 'perfil', 'sobre', 'process_task', 'spin_roulette'})
+        self.assertTrue(all(row['status'] == 200 and row['bytes'] > 0 for row in results['endpoints'].values()))
+        # Cada pedido é revertido: a base de dados fica como estava
+        self.assertFalse(Task.objects.filter(completed_at__gte=timezone.now() - timedelta(minutes=5)).exists())
+
+        # Comparar com os próprios resultados (com folga de sobra) passa; menos consultas no baseline falha
+        call_command('bench_urls', requests=3, warmup=0, baseline=output, slack_ms=10000, stdout=StringIO())
+        results['endpoints']['menu']['queries'] -= 1
+        with open(output, 'w') as f:
+            json.dump(results, f)
+        with self.assertRaisesMessage(CommandError, '1 regressões'):
+            call_command('bench_urls', requests=3, warmup=0, only='menu', baseline=output, slack_ms=10000,
+                         stdout=StringIO(), stderr=StringIO())
+
+
+class TemplateFragmentTests(TestCase):
+    def setUp(self):
+        self.level = create_level()
+        self.user = create_user('923001100')
+        self.client.force_login(self.user)
+
+    def test_level_cards_follow_config_changes_and_user_levels(self):
+        self.assertContains(self.client.get(reverse('nivel')), 'KZ 500,00')
+        self.level.daily_gain = Decimal('750.00')
+        self.level.save()
+        response = self.client.get(reverse('nivel'))
+        self.assertContains(response, 'KZ 750,00')
+        self.assertContains(response, 'form="level-purchase-form"')
+
+        # Outro usuário com o nível ativo não recebe os cartões em cache do primeiro
+        other = create_user('923001101', level=self.level)
+        self.client.force_login(other)
+        self.assertContains(self.client.get(reverse('nivel')), 'PRODUZINDO')
+
+    def test_purchase_button_posts_shared_form(self):
+        CustomUser.objects.filter(pk=self.user.pk).update(available_balance=Decimal('10000.00'))
+        self.client.post(reverse('nivel'), {'level_id': self.level.pk})
+        self.assertTrue(UserLevel.objects.filter(user=self.user, level=self.level, is_active=True).exists())
+
+    def test_bench_templates_reports_every_page(self):
+        call_command('seed_load', users=20, fan_out=3, depth=2, stdout=StringIO())
+        output = os.path.join(tempfile.mkdtemp(), 'templates.json')
+        self.addCleanup(shutil.rmtree, os.path.dirname(output))
+        call_command('bench_templates', renders=2, warmup=1, output=output, stdout=StringIO())
+        with open(output) as f:
+            results = json.load(f)
+        self.assertEqual(set(results['pages']), {'menu', 'renda', 'equipa', 'nivel', 'saque', 'tarefa', 'deposito',
+                                                 'roleta', 'perfil', 'sobre'})
+        self.assertTrue(all(row['uncached']['p50_ms'] > 0 for row in results['pages'].values()))
+
+
+class StaticFilesTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.static_root = tempfile.mkdtemp()
+        cls.addClassCleanup(shutil.rmtree, cls.static_root)
+        cls.enterClassContext(override_settings(STATIC_ROOT=cls.static_root))
+        call_command('collectstatic', interactive=False, verbosity=0)
+
+    def test_collectstatic_fingerprints_and_precompresses(self):
+        url = staticfiles_storage.url('images/banner1-480w.webp')
+        self.assertRegex(url, r'^/static/images/banner1-480w\.[0-9a-f]{12}\.webp$')
+        css = staticfiles_storage.stored_name('css/menu.css')
+        self.assertTrue(os.path.exists(os.path.join(self.static_root, css + '.gz')))
+
+        response = self.client.get(staticfiles_storage.url('css/menu.css'), HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('immutable', response['Cache-Control'])
+
+        # O menu aponta para as variantes com hash (fragmentos de execuções anteriores descartados)
+        caches['template_fragments'].clear()
+        self.client.force_login(create_user('923001200'))
+        self.assertContains(self.client.get(reverse('menu')), url)
+
+    def test_apk_supports_range_requests(self):
+        url = staticfiles_storage.url('app/airways.apk')
+        response = self.client.get(url, HTTP_RANGE='bytes=100-199')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(len(b''.join(response.streaming_content)), 100)
+        self.assertEqual(response['Content-Type'], 'application/vnd.android.package-archive')
+        self.assertNotIn('Content-Encoding', response)
+
+    def test_bench_static_reports_lower_worker_occupancy(self):
+        output = os.path.join(self.static_root, 'bench.json')
+        call_command('bench_static', clients=1, output=output, stdout=StringIO())
+        with open(output) as f:
+            results = json.load(f)
+        for row in results['scenarios'].values():
+            self.assertLess(row['after']['worker_seconds'], row['before']['worker_seconds'])
+
+
+class UserCacheTests(TestCase):
+    def setUp(self):
+        self.user = create_user('923000900')
+        self.client.force_login(self.user)
+        self.client.get(reverse('sobre'))
+
+    def test_authenticated_pages_skip_session_and_user_queries(self):
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('sobre'))
+        self.assertEqual(response.context['user'].pk, self.user.pk)
+
+    def test_balance_change_invalidates_cached_user(self):
+        ledger.post(self.user, Decimal('250.00'), 'task')
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('sobre'))
+        self.assertEqual(response.context['user'].available_balance, Decimal('250.00'))
+
+    def test_password_change_elsewhere_logs_out_cached_session(self):
+        user = CustomUser.objects.get(pk=self.user.pk)
+        user.set_password('outra')
+        user.save()
+        self.assertIsNone(caches['sessions'].get(user_cache.cache_key(user.pk)))
+        self.assertRedirects(self.client.get(reverse('sobre')), '/login/?next=/sobre/', fetch_redirect_response=False)
+
+    def test_suite_never_touches_the_real_session_store(self):
+        self.assertEqual(settings.CACHES['sessions']['BACKEND'], 'django.core.cache.backends.locmem.LocMemCache')
+        self.assertNotIsInstance(caches['sessions'], FileBasedCache)
+
+    def test_file_cache_lists_directory_once_per_cull_interval(self):
+        location = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, location)
+        file_cache = FileBasedCache(location, {'OPTIONS': {'MAX_ENTRIES': 2, 'CULL_INTERVAL': 300}})
+        with mock.patch.object(file_cache, '_list_cache_files', wraps=file_cache._list_cache_files) as listing:
+            for i in range(10):
+                file_cache.set(f'chave{i}', i)
+        self.assertEqual(listing.call_count, 1)
+        self.assertEqual(file_cache.get('chave9'), 9)
+
+
+def roleta_without_select_related(request):
+    # A roleta sem o select_related: o usuário de cada vencedor é lido com uma consulta por linha
+    recent_winners = Roulette.objects.filter(is_approved=True).order_by('-spin_date')[:10]
+    return render(request, 'roleta.html', {'recent_winners': recent_winners})
+
+
+urlpatterns = [
+    path('n-mais-1/roleta/', roleta_without_select_related, name='roleta_n_plus_one'),
+    path('', include('airways.urls')),
+]
+
+
+class RequestProfilingTests(TestCase):
+    def setUp(self):
+        self.user = create_user('923000700')
+        for i in range(3):
+            winner = create_user(f'92300071{i}')
+            Roulette.objects.create(user=winner, prize=Decimal('100.00'), is_approved=True)
+        self.client.force_login(self.user)
+
+    def test_disabled_by_default(self):
+        response = self.client.get(reverse('sobre'))
+        self.assertNotIn('Server-Timing', response)
+
+    @override_settings(REQUEST_PROFILING_SAMPLE_RATE=1.0, ROOT_URLCONF=__name__)
+    def test_sampled_request_reports_timings_and_repeated_queries(self):
+        with self.assertLogs('core.profiling', 'WARNING') as logs, CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('roleta_n_plus_one'))
+        timing = response['Server-Timing']
+        self.assertIn('db;dur=', timing)
+        self.assertIn(f'desc="{len(queries)} queries"', timing)
+        self.assertRegex(timing, r'tpl;dur=\d+\.\d, total;dur=\d+\.\d')
+
+        line = json.loads(logs.records[0].getMessage())
+        self.assertEqual(line['view'], 'roleta_n_plus_one')
+        self.assertEqual(line['queries'], len(queries))
+        self.assertGreater(line['template_ms'], 0)
+        self.assertGreaterEqual(line['repeated'][0]['count'], 3)
+        self.assertIn('core_customuser', line['repeated'][0]['sql'])
+
+    @override_settings(REQUEST_PROFILING_SAMPLE_RATE=1.0)
+    def test_roleta_reads_winners_with_their_users(self):
+        with self.assertLogs('core.profiling', 'INFO') as logs:
+            self.client.get(reverse('roleta'))
+        line = json.loads(logs.records[0].getMessage())
+        self.assertEqual(line['view'], 'roleta')
+        self.assertEqual(line['repeated'], [])
+
+
+class MetricsTests(TestCase):
+    def setUp(self):
+        config_cache.invalidate()
+        self.user = create_user('923000800', roulette_spins=1, level=create_level())
+        self.client.force_login(self.user)
+
+    def sample(self, name, **labels):
+        return metrics.REGISTRY.get_sample_value(name, labels) or 0
+
+    def test_requests_and_business_counters_are_exported(self):
+        requests = self.sample('airways_request_duration_seconds_count', view='menu', method='GET')
+        queries = self.sample('airways_request_db_queries_sum', view='menu')
+        tasks = self.sample('airways_tasks_processed_total')
+        spins = self.sample('airways_roulette_spins_total')
+
+        with CaptureQueriesContext(connection) as captured:
+            self.client.get(reverse('menu'))
+        menu_queries = len(captured)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertTrue(self.client.post(reverse('process_task')).json()['success'])
+            self.assertTrue(self.client.post(reverse('spin_roulette')).json()['success'])
+            # Recusado: não conta
+            self.assertFalse(self.client.post(reverse('process_task')).json()['success'])
+
+        self.assertEqual(self.sample('airways_request_duration_seconds_count', view='menu', method='GET'), requests + 1)
+        self.assertEqual(self.sample('airways_request_db_queries_sum', view='menu'), queries + menu_queries)
+        self.assertEqual(self.sample('airways_tasks_processed_total'), tasks + 1)
+        self.assertEqual(self.sample('airways_roulette_spins_total'), spins + 1)
+
+        with override_settings(METRICS_TOKEN='segredo'):
+            response = self.client.get(reverse('metrics'), headers={'Authorization': 'Bearer segredo'})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'airways_request_duration_seconds_bucket{', response.content)
+        self.assertIn(b'airways_deposits_approved_total', response.content)
+
+    def test_deposit_approvals_are_counted_once_committed(self):
+        approved = self.sample('airways_deposits_approved_total')
+        for _ in range(2):
+            Deposit.objects.create(user=self.user, amount=Decimal('5000.00'), proof_of_payment='p.jpg')
+        with self.captureOnCommitCallbacks(execute=True):
+            approve_deposits(Deposit.objects.all())
+            approve_deposits(Deposit.objects.all())
+        self.assertEqual(self.sample('airways_deposits_approved_total'), approved + 2)
+
+    @override_settings(METRICS_TOKEN='segredo')
+    def test_token_is_required_when_configured(self):
+        self.assertEqual(reverse('metrics'), '/metrics/')
+        self.assertEqual(Client().get('/metrics/').status_code, 403)
+        self.assertEqual(Client().get('/metrics/', headers={'Authorization': 'Bearer segredo'}).status_code, 200)
+
+    @override_settings(METRICS_TOKEN='')
+    def test_endpoint_is_closed_without_token_outside_debug(self):
+        self.assertEqual(Client().get('/metrics/').status_code, 403)
+        with override_settings(DEBUG=True):
+            self.assertEqual(Client().get('/metrics/').status_code, 200)
+
+
+class GunicornConfigTests(TestCase):
+    def load(self, cpus=(0, 1), **env):
+        env = {'SERVER_MODE': 'wsgi', 'WEB_CONCURRENCY': '', 'GUNICORN_THREADS': '', **env}
+        with mock.patch.dict(os.environ, env), mock.patch('os.sched_getaffinity', return_value=set(cpus)):
+            return runpy.run_path(os.path.join(settings.BASE_DIR, 'gunicorn.conf.py'))
+
+    def test_sizes_workers_from_cpus_and_threads_from_memory(self):
+        config = self.load(GUNICORN_WORKER_MEMORY_MB='1')
+        slots = 2 * config['CPUS'] + 1
+        self.assertEqual((config['workers'], config['threads']), (slots, 1))
+        self.assertNotIn('worker_class', config)
+        self.assertTrue(config['preload_app'])
+        self.assertEqual(self.load(cpus=(0,))['CPUS'], 1)
+
+        # Memória para dois workers: os restantes pedidos simultâneos passam a threads
+        config = self.load(GUNICORN_WORKER_MEMORY_MB=str(config['MEMORY_MB'] // 2))
+        self.assertEqual((config['workers'], config['threads']), (2, math.ceil(slots / 2)))
+        self.assertEqual(config['worker_class'], 'gthread')
+
+        config = self.load(SERVER_MODE='asgi', GUNICORN_WORKER_MEMORY_MB='1')
+        self.assertEqual(config['workers'], config['CPUS'])
+        self.assertEqual(config['worker_class'], 'uvicorn_worker.UvicornWorker')
+        self.assertEqual(self.load(WEB_CONCURRENCY='7')['workers'], 7)
+
+    def test_simulated_db_latency_only_in_loadtest_config(self):
+        self.assertNotIn('post_worker_init', self.load())
+        with mock.patch.dict(os.environ, {'SERVER_MODE': 'wsgi'}):
+            config = runpy.run_path(loadtest_server.GUNICORN_CONFIG)
+        self.assertIn('post_worker_init', config)
+        self.assertEqual(config['preload_app'], True)
+
+    def test_worker_hooks_export_stats_and_exit_reasons(self):
+        config = self.load()
+        worker = mock.Mock(nr=20, max_requests=20, spec=['nr', 'max_requests'])
+        config['post_request'](worker, None, {}, None)
+        self.assertEqual(metrics.REGISTRY.get_sample_value('airways_worker_requests'), 20)
+
+        exits = {reason: metrics.REGISTRY.get_sample_value('airways_worker_exits_total', {'reason': reason}) or 0
+                 for reason in ('max_requests', 'timeout')}
+        config['worker_exit'](None, worker)
+        config['worker_abort'](worker)
+        config['worker_exit'](None, worker)
+        for reason, before in exits.items():
+            self.assertEqual(
+                metrics.REGISTRY.get_sample_value('airways_worker_exits_total', {'reason': reason}), before + 1,
+            )
+
+
+class WithdrawalHistoryTests(TestCase):
+    def setUp(self):
+        self.user = create_user('923001000')
+        self.client.force_login(self.user)
+        yesterday = timezone.now() - timedelta(days=1)
+        for i in range(25):
+            Withdrawal.objects.create(user=self.user, amount=Decimal(1000 + i), status='Approved')
+        # Metade com o mesmo instante: o desempate é pelo id
+        Withdrawal.objects.filter(user=self.user, amount__lt=1013).update(created_at=yesterday)
+        Withdrawal.objects.filter(user=self.user, amount__gte=1013).update(created_at=yesterday - timedelta(hours=1))
+
+    def test_cursor_walks_every_withdrawal_once(self):
+        seen, cursor = [], None
+        while True:
+            response = self.client.get(reverse('withdrawal_history'), {'cursor': cursor} if cursor else {})
+            data = response.json()
+            self.assertLessEqual(len(data['records']), history.PAGE_SIZE)
+            seen += [record['amount'] for record in data['records']]
+            cursor = data['next_cursor']
+            if not cursor:
+                break
+        expected = [str(w.amount) for w in Withdrawal.objects.order_by('-created_at', '-id')]
+        self.assertEqual(seen, expected)
+
+    def test_invalid_cursor_is_rejected(self):
+        response = self.client.get(reverse('withdrawal_history'), {'cursor': 'abc'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_pages_render_first_page_with_constant_queries(self):
+        response = self.client.get(reverse('perfil'))
+        self.assertEqual(len(response.context['withdrawal_records']), history.PAGE_SIZE)
+        self.assertContains(response, 'CARREGAR MAIS')
+
+        with CaptureQueriesContext(connection) as captured:
+            self.client.get(reverse('saque'))
+        before = len(captured)
+        for i in range(20):
+            Withdrawal.objects.create(user=self.user, amount=Decimal('500.00'))
+        Withdrawal.objects.filter(user=self.user, amount=Decimal('500.00')).update(created_at=timezone.now() - timedelta(days=2))
+        with CaptureQueriesContext(connection) as captured:
+            self.client.get(reverse('saque'))
+        self.assertEqual(len(captured), before)
+
+    def test_daily_limit_counts_todays_withdrawals_in_either_spelling(self):
+        self.assertTrue(self.client.get(reverse('saque')).context['can_withdraw_today'])
+        Withdrawal.objects.create(user=self.user, amount=Decimal('2000.00'), status='Pending')
+        self.assertFalse(self.client.get(reverse('saque')).context['can_withdraw_today'])
+
+
+
+class AsyncViewTests(TestCase):
+    """Vistas async servidas pelo handler ASGI (modo SERVER_MODE=asgi)."""
+
+    def setUp(self):
+        # As rotas são escolhidas ao importar o core/urls.py; a limpeza volta às síncronas
+        self.addCleanup(self.reload_urls)
+        self.enterContext(override_settings(SERVER_MODE='asgi'))
+        self.reload_urls()
+        caches['sessions'].clear()
+        config_cache.invalidate()
+        self.level = create_level()
+        self.user = create_user('923001100', roulette_spins=1)
+        self.async_client.force_login(self.user)
+
+    def reload_urls(self):
+        importlib.reload(urls)
+        importlib.reload(importlib.import_module(settings.ROOT_URLCONF))
+        clear_url_caches()
+
+    def test_routes_follow_server_mode(self):
+        self.assertIs(resolve(reverse('menu')).func, views.amenu)
+        self.assertIs(resolve(reverse('spin_roulette')).func, views.aspin_roulette)
+        with override_settings(SERVER_MODE='wsgi'):
+            self.reload_urls()
+            self.assertIs(resolve(reverse('menu')).func, views.menu)
+            self.assertIs(resolve(reverse('process_task')).func, views.process_task)
+
+    async def test_task_credits_once_and_replays_stored_response(self):
+        await UserLevel.objects.acreate(user=self.user, level=self.level)
+        headers = {'Idempotency-Key': 'async-1'}
+        first = (await self.async_client.post(reverse('process_task'), headers=headers)).json()
+        second = (await self.async_client.post(reverse('process_task'), headers=headers)).json()
+        self.assertTrue(first['success'])
+        self.assertEqual(first, second)
+        await self.user.arefresh_from_db()
+        self.assertEqual(self.user.available_balance, Decimal('500.00'))
+        self.assertEqual(await Task.objects.filter(user=self.user).acount(), 1)
+
+        # O limite diário é recusado na pré-verificação, sem gravar a chave nem abrir a transação
+        data = (await self.async_client.post(reverse('process_task'), headers={'Idempotency-Key': 'async-2'})).json()
+        self.assertEqual(data['message'], 'Limite diário de tarefas alcançado.')
+        self.assertFalse(await IdempotencyKey.objects.filter(key='async-2').aexists())
+
+    async def test_spin_is_refused_once_spins_run_out(self):
+        first = (await self.async_client.post(reverse('spin_roulette'))).json()
+        second = (await self.async_client.post(reverse('spin_roulette'))).json()
+        self.assertTrue(first['success'])
+        self.assertEqual(second, {'success': False, 'message': 'Sem giros.'})
+        self.assertEqual(await Roulette.objects.filter(user=self.user).acount(), 1)
+
+    async def test_dashboard_pages_read_with_async_orm(self):
+        await UserLevel.objects.acreate(user=self.user, level=self.level)
+        await Task.objects.acreate(user=self.user, earnings=Decimal('500.00'))
+        self.assertEqual((await self.async_client.get(reverse('menu'))).status_code, 200)
+        response = await self.async_client.get(reverse('renda'))
+        self.assertEqual(response.context['daily_income'], Decimal('500.00'))
+        self.assertContains(response, 'VIP1')
+
+
+class SerialLiveServerThread(LiveServerThread):
+    # Um pedido de cada vez: com o SQLite em memória as threads do servidor partilham a mesma ligação
+    def _create_server(self, connections_override=None):
+        return WSGIServer((self.host, self.port), QuietWSGIRequestHandler, allow_reuse_address=False)
+
+
+class LoadTestServerTests(LiveServerTestCase):
+    server_thread_class = SerialLiveServerThread
+
+    def test_reports_every_concurrency_level(self):
+        for i in range(2):
+            CustomUser.objects.create_user(phone_number=f'8100000{i}', password='carga123', roulette_spins=1)
+        output = os.path.join(tempfile.mkdtemp(), 'carga.json')
+        self.addCleanup(shutil.rmtree, os.path.dirname(output))
+        call_command(
+            'loadtest_server', url=self.live_server_url, prefix='81', connections='1,2', duration=0.3,
+            output=output, stdout=StringIO(),
+        )
+        with open(output) as f:
+            levels = json.load(f)['levels']
+        self.assertEqual([level['connections'] for level in levels], [1, 2])
+        self.assertTrue(all(level['requests'] > 0 and level['errors'] == 0 for level in levels))
+        self.assertEqual(levels[0]['concurrency'], 1.0)
+        self.assertEqual(Roulette.objects.count(), 2)
+
+
+
+class LedgerStressTests(TransactionTestCase):
+    """Lançamentos em threads paralelas com ligações próprias (SQLite num ficheiro ou PostgreSQL)."""
+
+    def setUp(self):
+        self.user = create_user('923000091')
+
+    def run_threads(self, count, target):
+        barrier = threading.Barrier(count)
+        errors = []
+
+        def worker(i):
+            try:
+                barrier.wait()
+                target(i)
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=worker, args=(i,)) for i in range(count)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return errors
+
+    def test_parallel_credits_are_never_lost(self):
+        def credit(i):
+            for _ in range(25):
+                ledger.post(self.user.pk, Decimal('1.00'), 'task')
+
+        self.assertEqual(self.run_threads(8, credit), [])
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.available_balance, Decimal('200.00'))
+        self.assertEqual(LedgerEntry.objects.filter(user=self.user).count(), 200)
+
+    def test_parallel_debits_never_overdraw(self):
+        ledger.post(self.user.pk, Decimal('100.00'), 'deposit')
+        errors = self.run_threads(16, lambda i: ledger.post(self.user.pk, Decimal('-10.00'), 'withdrawal'))
+        self.assertEqual(len(errors), 6)
+        self.assertTrue(all(isinstance(e, ledger.InsufficientFunds) for e in errors))
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.available_balance, Decimal('0.00'))
+        self.assertEqual(LedgerEntry.objects.filter(user=self.user, kind='withdrawal').count(), 10)
+
+
+@skipUnlessDBFeature('has_select_for_update')
+class ConcurrentRequestTests(TransactionTestCase):
+    """Pedidos paralelos reais; requer uma base de dados com bloqueio de linhas (PostgreSQL)."""
+
+    def setUp(self):
+        self.user = create_user('923000090', roulette_spins=5, level=create_level())
+
+    def run_parallel(self, name, count):
+        results = []
+        barrier = threading.Barrier(count)
+
+        def worker(i):
+            client = Client()
+            client.force_login(self.user)
+            try:
+                barrier.wait()
+                results.append(client.post(reverse(name), headers={'Idempotency-Key': f'{name}-{i}'}).json())
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=worker, args=(i,)) for i in range(count)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
+
+    def test_parallel_tasks_credit_once(self):
+        results = self.run_parallel('process_task', 10)
+        self.assertEqual(sum(result['success'] for result in results), 1)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.available_balance, Decimal('500.00'))
+        self.assertEqual(Task.objects.filter(user=self.user).count(), 1)
+
+    def test_parallel_spins_consume_exactly_available_spins(self):
+        results = self.run_parallel('spin_roulette', 12)
+        self.assertEqual(sum(result['success'] for result in results), 5)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.roulette_spins, 0)
+        self.assertEqual(Roulette.objects.filter(user=self.user).count(), 5)
+
+    def test_parallel_first_purchases_count_investor_once(self):
+        levels = [
+            Level.objects.create(
+                name=f'VIP{i}', deposit_value=Decimal('100.00'), daily_gain=Decimal('10.00'),
+                monthly_gain=Decimal('300.00'), cycle_days=30,
+            )
+            for i in (2, 3, 4)
+        ]
+        buyer = create_user('923000092', invited_by=self.user, available_balance=Decimal('1000.00'))
+        barrier = threading.Barrier(len(levels))
+
+        def worker(level):
+            client = Client()
+            client.force_login(buyer)
+            try:
+                barrier.wait()
+                client.post(reverse('nivel'), {'level_id': level.pk})
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=worker, args=(level,)) for level in levels]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(UserLevel.objects.filter(user=buyer, is_active=True).count(), 3)
+        self.assertEqual(TeamStats.objects.get(user=self.user).level_a_investors, 1)
+
+
+@skipUnless(connection.vendor == 'postgresql', 'EXPLAIN só é verificado em PostgreSQL')
+class IndexUsageTests(TestCase):
+    """Falha se alguma consulta das vistas principais cair num Seq Scan das tabelas quentes."""
+
+    HOT_TABLES = re.compile(r'Seq Scan on (core_task|core_userlevel|core_withdrawal|core_deposit|core_roulette)\b')
+
+    def setUp(self):
+        self.user = create_user('923000040', level=create_level())
+        self.client.force_login(self.user)
+
+    def assert_no_seq_scan(self, method, name):
+        with CaptureQueriesContext(connection) as ctx:
+            getattr(self.client, method)(reverse(name))
+        with connection.cursor() as cursor:
+            cursor.execute('SET enable_seqscan = off')
+            for query in ctx.captured_queries:
+                if not query['sql'].startswith('SELECT'):
+                    continue
+                cursor.execute('EXPLAIN ' + query['sql'])
+                plan = '\n'.join(row[0] for row in cursor.fetchall())
+                self.assertIsNone(self.HOT_TABLES.search(plan), f'{name}: {query["sql"]}\n{plan}')
+            cursor.execute('RESET enable_seqscan')
+
+    def test_views_use_indexes(self):
+        for name in ('menu', 'renda', 'tarefa', 'saque', 'nivel', 'roleta', 'perfil'):
+            self.assert_no_seq_scan('get', name)
+        for name in ('process_task', 'spin_roulette'):
+            self.assert_no_seq_scan('post', name)
@@ -1,7 +1,15 @@
+from django.conf import settings
 from django.urls import path
 from django.contrib.auth import views as auth_views
 from django.views.generic.base import RedirectView
-from . import views
+from . import metrics, views
+
+# Com SERVER_MODE=asgi as vistas mais usadas são servidas pelas versões async; em WSGI ficam as
+# síncronas, sem a passagem de cada pedido por async_to_sync
+if settings.SERVER_MODE == 'asgi':
+    menu, renda, process_task, spin_roulette = views.amenu, views.arenda, views.aprocess_task, views.aspin_roulette
+else:
+    menu, renda, process_task, spin_roulette = views.menu, views.renda, views.process_task, views.spin_roulette
 
 urlpatterns = [
     # Redirecionamento para a página de login
@@ -10,21 +18,25 @@ urlpatterns = [
     # Rota principal que verifica o status de autenticação
     path('', views.home, name='home'),
     
-    path('menu/', views.menu, name='menu'),
+    path('menu/', menu, name='menu'),
     path('cadastro/', views.cadastro, name='cadastro'),
     path('login/', views.user_login, name='login'),
     path('logout/', views.user_logout, name='logout'),
     path('deposito/', views.deposito, name='deposito'),
     path('saque/', views.saque, name='saque'),
     path('tarefa/', views.tarefa, name='tarefa'),
-    path('process_task/', views.process_task, name='process_task'),
+    path('process_task/', process_task, name='process_task'),
     path('nivel/', views.nivel, name='nivel'),
     path('equipa/', views.equipa, name='equipa'),
     path('roleta/', views.roleta, name='roleta'),
-    path('spin-roulette/', views.spin_roulette, name='spin_roulette'),
+    path('spin-roulette/', spin_roulette, name='spin_roulette'),
     path('sobre/', views.sobre, name='sobre'),
     path('perfil/', views.perfil, name='perfil'),
-    path('renda/', views.renda, name='renda'),
+    path('perfil/saques/', views.withdrawal_history, name='withdrawal_history'),
+    path('renda/', renda, name='renda'),
+
+    # Métricas no formato Prometheus
+    path('metrics/', metrics.metrics_view, name='metrics'),
     
     # URLs para alteração de senha
     path('change_password/', auth_views.PasswordChangeView.as_view(
@@ -0,0 +1,64 @@
+from functools import partial
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib import auth
+from django.contrib.auth.middleware import AuthenticationMiddleware
+from django.core.cache import caches
+from django.utils.crypto import constant_time_compare
+from django.utils.functional import SimpleLazyObject
+
+from .models import CustomUser
+
+# Validade curta: saldos e outros campos do usuário invalidam a entrada quando mudam
+CACHE_TIMEOUT = 60
+
+
+def _cache():
+    # O mesmo cache das sessões, partilhado entre os workers
+    return caches[settings.SESSION_CACHE_ALIAS]
+
+
+def cache_key(user_id):
+    return f'user:{user_id}'
+
+
+def invalidate(*user_ids):
+    _cache().delete_many([cache_key(user_id) for user_id in user_ids])
+
+
+def get_user(request):
+    """Como `django.contrib.auth.get_user`, mas lê primeiro o usuário do cache."""
+    try:
+        user_id = CustomUser._meta.pk.to_python(request.session[auth.SESSION_KEY])
+        backend_path = request.session[auth.BACKEND_SESSION_KEY]
+    except KeyError:
+        return auth.get_user(request)
+
+    session_hash = request.session.get(auth.HASH_SESSION_KEY)
+    if backend_path in settings.AUTHENTICATION_BACKENDS and session_hash:
+        user = _cache().get(cache_key(user_id))
+        if user is not None and user.is_active and constant_time_compare(session_hash, user.get_session_auth_hash()):
+            user.backend = backend_path
+            return user
+
+    user = auth.get_user(request)
+    if user.is_authenticated:
+        _cache().set(cache_key(user.pk), user, CACHE_TIMEOUT)
+    return user
+
+
+async def aget_user(request):
+    """`get_user` para vistas async; como o `request.auser` do Django, lê o usuário uma vez por pedido."""
+    if not hasattr(request, '_acached_user'):
+        request._acached_user = await sync_to_async(get_user)(request)
+    return request._acached_user
+
+
+class CachedAuthenticationMiddleware(AuthenticationMiddleware):
+    """`AuthenticationMiddleware` que obtém `request.user` e `request.auser()` através de `get_user` com cache."""
+
+    def process_request(self, request):
+        super().process_request(request)
+        request.user = SimpleLazyObject(lambda: get_user(request))
+        request.auser = partial(aget_user, request)
@@ -0,0 +1,11 @@
+from datetime import datetime, time, timedelta
+
+from django.utils import timezone
+
+
+def local_day_range(day=None):
+    """Intervalo semiaberto `[início, fim)` do dia local, para filtrar com os índices das colunas."""
+    day = day or timezone.localdate()
+    start = timezone.make_aware(datetime.combine(day, time.min))
+    end = timezone.make_aware(datetime.combine(day + timedelta(days=1), time.min))
+    return start, end
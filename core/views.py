@@ -1,19 +1,31 @@
+from asgiref.sync import sync_to_async
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth import login, authenticate, logout, update_session_auth_hash
 from django.contrib.auth.forms import AuthenticationForm, PasswordChangeForm
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.db.models import Sum
+from django.db import transaction
+from django.db.models import F, Sum
 from django.urls import reverse
 from django.http import JsonResponse
 from django.views.decorators.http import require_POST
-import random
 from datetime import date, time, datetime
 from django.utils import timezone
 from decimal import Decimal
 
+from . import config_cache, history, ledger, metrics, referrals
 from .forms import RegisterForm, DepositForm, WithdrawalForm, BankDetailsForm
-from .models import PlatformSettings, CustomUser, Level, UserLevel, BankDetails, Deposit, Withdrawal, Task, PlatformBankDetails, Roulette, RouletteSettings
+from .models import PlatformSettings, CustomUser, Level, UserLevel, BankDetails, Deposit, Withdrawal, Task, PlatformBankDetails, Roulette, RouletteSettings, TeamStats
+from .dashboard import aget_dashboard, get_dashboard
+from .deposits import approve_deposits
+from .idempotency import idempotent, new_key as new_idempotency_key, stored_response as stored_idempotent_response
+from .roulette import get_sampler
+from .utils import local_day_range
+
+# Subsídios por tarefa para a rede: Nível A (100 KZ), Nível B (30 KZ), Nível C (10 KZ)
+TASK_SUBSIDIES = (Decimal('100.00'), Decimal('30.00'), Decimal('10.00'))
+# Comissões sobre a compra de nível: Nível A (15%), Nível B (3%), Nível C (1%)
+LEVEL_COMMISSIONS = (Decimal('0.15'), Decimal('0.03'), Decimal('0.01'))
 
 # --- FUNÇÃO HOME ---
 def home(request):
@@ -23,30 +35,23 @@ def home(request):
         return redirect('cadastro')
 
 # --- FUNÇÃO MENU ---
+# As vistas `a*` são as versões async de menu, renda, process_task e spin_roulette; o core/urls.py
+# só as usa com SERVER_MODE=asgi. Em WSGI correriam dentro de async_to_sync e ficariam mais lentas.
+# O menu só mostra o link do WhatsApp: os totais do painel ficam para a renda
+def _menu_context(user, whatsapp_link):
+    return {'user': user, 'whatsapp_link': whatsapp_link}
+
 @login_required
 def menu(request):
-    user = request.user
-    active_level = UserLevel.objects.filter(user=user, is_active=True).first()
-    approved_deposit_total = Deposit.objects.filter(user=user, is_approved=True).aggregate(Sum('amount'))['amount__sum'] or 0
-    today = date.today()
-    daily_income = Task.objects.filter(user=user, completed_at__date=today).aggregate(Sum('earnings'))['earnings__sum'] or 0
-    total_withdrawals = Withdrawal.objects.filter(user=user, status='Aprovado').aggregate(Sum('amount'))['amount__sum'] or 0
+    whatsapp_link = config_cache.platform_setting('whatsapp_link', '#')
+    return render(request, 'menu.html', _menu_context(request.user, whatsapp_link))
 
-    try:
-        platform_settings = PlatformSettings.objects.first()
-        whatsapp_link = platform_settings.whatsapp_link
-    except (PlatformSettings.DoesNotExist, AttributeError):
-        whatsapp_link = '#'
-
-    context = {
-        'user': user,
-        'active_level': active_level,
-        'approved_deposit_total': approved_deposit_total,
-        'daily_income': daily_income,
-        'total_withdrawals': total_withdrawals,
-        'whatsapp_link': whatsapp_link,
-    }
-    return render(request, 'menu.html', context)
+@login_required
+async def amenu(request):
+    user = await request.auser()
+    context = _menu_context(user, await sync_to_async(config_cache.platform_setting)('whatsapp_link', '#'))
+    # A renderização é síncrona: processadores de contexto, mensagens na sessão
+    return await sync_to_async(render)(request, 'menu.html', context)
 
 # --- CADASTRO (REMOVIDO 1000 KZ) ---
 def cadastro(request):
@@ -69,17 +74,16 @@ def cadastro(request):
                     messages.error(request, 'Código de convite inválido.')
                     return render(request, 'cadastro.html', {'form': form})
             
-            user.save()
+            # A ligação à rede do convidante é feita pelo post_save, na mesma transação
+            with transaction.atomic():
+                user.save()
             login(request, user)
             messages.success(request, 'Cadastro realizado com sucesso!')
             return redirect('menu')
     else:
         form = RegisterForm(initial={'invited_by_code': invite_code_from_url}) if invite_code_from_url else RegisterForm()
     
-    try:
-        whatsapp_link = PlatformSettings.objects.first().whatsapp_link
-    except (PlatformSettings.DoesNotExist, AttributeError):
-        whatsapp_link = '#'
+    whatsapp_link = config_cache.platform_setting('whatsapp_link', '#')
     return render(request, 'cadastro.html', {'form': form, 'whatsapp_link': whatsapp_link})
 
 def user_login(request):
@@ -91,10 +95,7 @@ def user_login(request):
             return redirect('menu')
     else:
         form = AuthenticationForm()
-    try:
-        whatsapp_link = PlatformSettings.objects.first().whatsapp_link
-    except (PlatformSettings.DoesNotExist, AttributeError):
-        whatsapp_link = '#'
+    whatsapp_link = config_cache.platform_setting('whatsapp_link', '#')
     return render(request, 'login.html', {'form': form, 'whatsapp_link': whatsapp_link})
 
 @login_required
@@ -105,9 +106,9 @@ def user_logout(request):
 # --- DEPÓSITO ---
 @login_required
 def deposito(request):
-    platform_bank_details = PlatformBankDetails.objects.all()
-    deposit_instruction = PlatformSettings.objects.first().deposit_instruction if PlatformSettings.objects.first() else 'Instruções de depósito não disponíveis.'
-    level_deposits = Level.objects.all().values_list('deposit_value', flat=True).distinct().order_by('deposit_value')
+    platform_bank_details = config_cache.platform_bank_details()
+    deposit_instruction = config_cache.platform_setting('deposit_instruction', 'Instruções de depósito não disponíveis.')
+    level_deposits = sorted({level.deposit_value for level in config_cache.levels()})
     level_deposits_list = [str(d) for d in level_deposits] 
 
     if request.method == 'POST':
@@ -116,6 +117,7 @@ def deposito(request):
             deposit = form.save(commit=False)
             deposit.user = request.user
             deposit.save()
+            metrics.record(metrics.DEPOSITS_CREATED)
             return render(request, 'deposito.html', {
                 'platform_bank_details': platform_bank_details,
                 'deposit_instruction': deposit_instruction,
@@ -140,11 +142,7 @@ def approve_deposit(request, deposit_id):
     if not request.user.is_staff:
         return redirect('menu')
     deposit = get_object_or_404(Deposit, id=deposit_id)
-    if not deposit.is_approved:
-        deposit.is_approved = True
-        deposit.save()
-        deposit.user.available_balance += deposit.amount
-        deposit.user.save()
+    if approve_deposits(Deposit.objects.filter(pk=deposit.pk)):
         messages.success(request, 'Depósito aprovado.')
     return redirect('renda')
 
@@ -154,14 +152,14 @@ def saque(request):
     MIN_WITHDRAWAL_AMOUNT = 2000
     START_TIME = time(9, 0, 0)
     END_TIME = time(17, 0, 0)
-    withdrawal_instruction = PlatformSettings.objects.first().withdrawal_instruction if PlatformSettings.objects.first() else ''
-    withdrawal_records = Withdrawal.objects.filter(user=request.user).order_by('-created_at')
+    withdrawal_instruction = config_cache.platform_setting('withdrawal_instruction')
+    # A primeira página do histórico serve também para o limite diário
+    withdrawal_page = history.withdrawal_page(request.user)
+    withdrawal_records, history_cursor = withdrawal_page
     has_bank_details = BankDetails.objects.filter(user=request.user).exists()
     now = timezone.localtime(timezone.now()).time()
-    today = timezone.localdate(timezone.now())
     is_time_to_withdraw = START_TIME <= now <= END_TIME
-    withdrawals_today_count = Withdrawal.objects.filter(user=request.user, created_at__date=today, status__in=['Pendente', 'Aprovado']).count()
-    can_withdraw_today = withdrawals_today_count == 0
+    can_withdraw_today = history.withdrawals_today(request.user, withdrawal_page) == 0
     
     if request.method == 'POST':
         form = WithdrawalForm(request.POST)
@@ -178,17 +176,23 @@ def saque(request):
             elif request.user.available_balance < amount:
                 messages.error(request, 'Saldo insuficiente.')
             else:
-                Withdrawal.objects.create(user=request.user, amount=amount)
-                request.user.available_balance -= amount
-                request.user.save()
-                messages.success(request, 'Saque solicitado.')
-                return redirect('saque')
+                try:
+                    with transaction.atomic():
+                        withdrawal = Withdrawal.objects.create(user=request.user, amount=amount)
+                        ledger.post(request.user, -amount, 'withdrawal', reference=f'withdrawal:{withdrawal.pk}')
+                        metrics.record(metrics.WITHDRAWALS_REQUESTED)
+                except ledger.InsufficientFunds:
+                    messages.error(request, 'Saldo insuficiente.')
+                else:
+                    messages.success(request, 'Saque solicitado.')
+                    return redirect('saque')
     else:
         form = WithdrawalForm()
 
     context = {
         'withdrawal_instruction': withdrawal_instruction,
         'withdrawal_records': withdrawal_records,
+        'history_cursor': history_cursor,
         'form': form,
         'has_bank_details': has_bank_details,
         'is_time_to_withdraw': is_time_to_withdraw,
@@ -203,20 +207,43 @@ def tarefa(request):
     user = request.user
     active_level = UserLevel.objects.filter(user=user, is_active=True).first()
     has_active_level = active_level is not None
-    today = date.today()
-    tasks_completed_today = Task.objects.filter(user=user, completed_at__date=today).count()
+    today_start, today_end = local_day_range()
+    tasks_completed_today = Task.objects.filter(user=user, completed_at__gte=today_start, completed_at__lt=today_end).count()
     
     context = {
         'has_active_level': has_active_level,
         'active_level': active_level,
         'tasks_completed_today': tasks_completed_today,
         'max_tasks': 1,
+        'idempotency_key': new_idempotency_key(),
     }
     return render(request, 'tarefa.html', context)
 
 @login_required
 @require_POST
 def process_task(request):
+    return _process_task(request)
+
+@login_required
+@require_POST
+async def aprocess_task(request):
+    # Repetições com a mesma chave devolvem a resposta gravada sem abrir a transação
+    response = await stored_idempotent_response(request, 'process_task')
+    if response is not None:
+        return response
+
+    # Pré-verificações sem bloqueio com o ORM async: os pedidos recusados não chegam à transação,
+    # que volta a verificar tudo com a linha do usuário bloqueada
+    user = await request.auser()
+    if not await UserLevel.objects.filter(user=user, is_active=True).aexists():
+        return JsonResponse({'success': False, 'message': 'Você não possui um nível VIP ativo.'})
+    today_start, today_end = local_day_range()
+    if await Task.objects.filter(user=user, completed_at__gte=today_start, completed_at__lt=today_end).aexists():
+        return JsonResponse({'success': False, 'message': 'Limite diário de tarefas alcançado.'})
+    return await sync_to_async(_process_task)(request)
+
+@idempotent(endpoint='process_task')
+def _process_task(request):
     user = request.user
     
     try:
@@ -227,45 +254,29 @@ def process_task(request):
             return JsonResponse({'success': False, 'message': 'Você não possui um nível VIP ativo.'})
 
         # 2. Verifica se a tarefa já foi feita hoje (evita duplicidade)
-        today = timezone.localdate()
-        if Task.objects.filter(user=user, completed_at__date=today).exists():
+        today_start, today_end = local_day_range()
+        if Task.objects.filter(user=user, completed_at__gte=today_start, completed_at__lt=today_end).exists():
             return JsonResponse({'success': False, 'message': 'Limite diário de tarefas alcançado.'})
 
         # 3. Pega o valor do ganho (USANDO O NOME CORRETO DO SEU MODELS: daily_gain)
         task_earnings = Decimal(str(active_user_level.level.daily_gain))
 
-        # 4. Registra a tarefa no banco (Para aparecer no Admin)
-        Task.objects.create(
-            user=user, 
-            earnings=task_earnings
-            # completed_at é auto_now_add, então não precisa passar manualmente
-        ) 
-        
-        # 5. Adiciona o valor ao saldo do usuário que realizou a tarefa
-        user.available_balance += task_earnings
-        user.save()
-
-        # 6. Distribuição de Subsídios para a Rede (A, B, C)
-        # Nível A (100 KZ)
-        p1 = user.invited_by
-        if p1:
-            p1.available_balance += Decimal('100.00')
-            p1.subsidy_balance += Decimal('100.00')
-            p1.save()
-
-            # Nível B (30 KZ)
-            p2 = p1.invited_by
-            if p2:
-                p2.available_balance += Decimal('30.00')
-                p2.subsidy_balance += Decimal('30.00')
-                p2.save()
-
-                # Nível C (10 KZ)
-                p3 = p2.invited_by
-                if p3:
-                    p3.available_balance += Decimal('10.00')
-                    p3.subsidy_balance += Decimal('10.00')
-                    p3.save()
+        with transaction.atomic():
+            # 4. Registra a tarefa no banco (Para aparecer no Admin)
+            task = Task.objects.create(
+                user=user, 
+                earnings=task_earnings
+                # completed_at é auto_now_add, então não precisa passar manualmente
+            ) 
+            reference = f'task:{task.pk}'
+
+            # 5. Adiciona o valor ao saldo do usuário que realizou a tarefa
+            ledger.post(user, task_earnings, 'task', reference=reference)
+
+            # 6. Distribuição de Subsídios para a Rede (A, B, C)
+            for ancestor_id, subsidy in zip(referrals.uplines(user), TASK_SUBSIDIES):
+                ledger.post(ancestor_id, subsidy, 'task_subsidy', subsidy=True, reference=reference)
+            metrics.record(metrics.TASKS_PROCESSED)
 
         return JsonResponse({
             'success': True, 
@@ -273,8 +284,9 @@ def process_task(request):
         })
 
     except Exception as e:
-        # Se der qualquer erro, o JSON evita a "Conexão Interrompida" e mostra o erro real
-        return JsonResponse({'success': False, 'message': f'Erro: {str(e)}'})
+        # Se der qualquer erro, o JSON evita a "Conexão Interrompida" e mostra o erro real; o 500
+        # impede que a resposta fique gravada sob a chave de idempotência e a repetição volta a tentar
+        return JsonResponse({'success': False, 'message': f'Erro: {str(e)}'}, status=500)
 
 @login_required
 def nivel(request):
@@ -283,49 +295,42 @@ def nivel(request):
         level_to_buy = get_object_or_404(Level, id=level_id)
         val = level_to_buy.deposit_value
 
-        user_levels = UserLevel.objects.filter(user=request.user, is_active=True).values_list('level__id', flat=True)
-        if level_to_buy.id in user_levels:
-            messages.error(request, 'Você já possui este nível.')
-            return redirect('nivel')
-
-        if request.user.available_balance >= val:
-            request.user.available_balance -= val
-            UserLevel.objects.create(user=request.user, level=level_to_buy, is_active=True)
-            request.user.level_active = True
-            request.user.save()
-
-            # Nível A (15%)
-            p1 = request.user.invited_by
-            if p1 and UserLevel.objects.filter(user=p1, is_active=True).exists():
-                com1 = val * Decimal('0.15')
-                p1.available_balance += com1
-                p1.subsidy_balance += com1
-                p1.save()
-
-                # Nível B (3%)
-                p2 = p1.invited_by
-                if p2 and UserLevel.objects.filter(user=p2, is_active=True).exists():
-                    com2 = val * Decimal('0.03')
-                    p2.available_balance += com2
-                    p2.subsidy_balance += com2
-                    p2.save()
-
-                    # Nível C (1%)
-                    p3 = p2.invited_by
-                    if p3 and UserLevel.objects.filter(user=p3, is_active=True).exists():
-                        com3 = val * Decimal('0.01')
-                        p3.available_balance += com3
-                        p3.subsidy_balance += com3
-                        p3.save()
-
-            messages.success(request, f'Nível {level_to_buy.name} ativado!')
-        else:
+        try:
+            with transaction.atomic():
+                # Os níveis ativos só são lidos com o usuário bloqueado: dois pedidos simultâneos
+                # veriam ambos "sem níveis" e contariam o investidor duas vezes nos convidantes
+                CustomUser.objects.select_for_update().filter(pk=request.user.pk).values_list('pk').get()
+                user_levels = set(
+                    UserLevel.objects.filter(user=request.user, is_active=True).values_list('level__id', flat=True)
+                )
+                if level_to_buy.id in user_levels:
+                    messages.error(request, 'Você já possui este nível.')
+                    return redirect('nivel')
+                ledger.post(request.user, -val, 'level_purchase', reference=f'level:{level_to_buy.pk}')
+                user_level = UserLevel.objects.create(user=request.user, level=level_to_buy, is_active=True)
+                CustomUser.objects.filter(pk=request.user.pk).update(level_active=True)
+                reference = f'userlevel:{user_level.pk}'
+
+                upline = referrals.uplines(request.user, with_active_level=True)
+                # O primeiro nível ativo torna o usuário investidor na equipa dos convidantes
+                if not user_levels:
+                    referrals.increment([ancestor_id for ancestor_id, _ in upline], 'investors')
+
+                # Comissões para a rede (A, B, C); a cadeia pára no primeiro convidante sem nível ativo
+                for (ancestor_id, has_active_level), rate in zip(upline, LEVEL_COMMISSIONS):
+                    if not has_active_level:
+                        break
+                    ledger.post(ancestor_id, val * rate, 'level_commission', subsidy=True, reference=reference)
+        except ledger.InsufficientFunds:
             messages.error(request, 'Saldo insuficiente.')
+        else:
+            messages.success(request, f'Nível {level_to_buy.name} ativado!')
         return redirect('nivel')
     
     context = {
-        'levels': Level.objects.all().order_by('deposit_value'),
-        'user_levels': UserLevel.objects.filter(user=request.user, is_active=True).values_list('level__id', flat=True),
+        'levels': config_cache.levels(),
+        # Lista ordenada: também faz parte da chave do fragmento dos cartões de nível
+        'user_levels': sorted(UserLevel.objects.filter(user=request.user, is_active=True).values_list('level__id', flat=True)),
     }
     return render(request, 'nivel.html', context)
 
@@ -333,23 +338,19 @@ def nivel(request):
 @login_required
 def equipa(request):
     user = request.user
-    level_a = CustomUser.objects.filter(invited_by=user)
-    level_b = CustomUser.objects.filter(invited_by__in=level_a)
-    level_c = CustomUser.objects.filter(invited_by__in=level_b)
+    stats = TeamStats.objects.filter(pk=user.pk).first() or TeamStats(user=user)
 
     context = {
-        'team_count': level_a.count() + level_b.count() + level_c.count(),
-        'total_investors': (level_a.filter(userlevel__is_active=True).distinct().count() + 
-                           level_b.filter(userlevel__is_active=True).distinct().count() + 
-                           level_c.filter(userlevel__is_active=True).distinct().count()),
+        'team_count': stats.team_count,
+        'total_investors': stats.total_investors,
         'invite_link': request.build_absolute_uri(reverse('cadastro')) + f'?invite={user.invite_code}',
         'subsidy_balance': user.subsidy_balance,
-        'level_a_count': level_a.count(),
-        'level_a_investors': level_a.filter(userlevel__is_active=True).distinct().count(),
-        'level_b_count': level_b.count(),
-        'level_b_investors': level_b.filter(userlevel__is_active=True).distinct().count(),
-        'level_c_count': level_c.count(),
-        'level_c_investors': level_c.filter(userlevel__is_active=True).distinct().count(),
+        'level_a_count': stats.level_a_count,
+        'level_a_investors': stats.level_a_investors,
+        'level_b_count': stats.level_b_count,
+        'level_b_investors': stats.level_b_investors,
+        'level_c_count': stats.level_c_count,
+        'level_c_investors': stats.level_c_investors,
     }
     return render(request, 'equipa.html', context)
 
@@ -357,48 +358,57 @@ def equipa(request):
 @login_required
 def roleta(request):
     user = request.user
-    roulette_settings = RouletteSettings.objects.first()
-    prizes_list = [p.strip() for p in roulette_settings.prizes.split(',')] if roulette_settings and roulette_settings.prizes else ['0', '500', '1000', '0', '5000', '200', '0', '10000']
-    recent_winners = Roulette.objects.filter(is_approved=True).order_by('-spin_date')[:10]
-    context = {'roulette_spins': user.roulette_spins, 'prizes_list': prizes_list, 'recent_winners': recent_winners}
+    prizes_list = config_cache.roulette_prizes()
+    recent_winners = Roulette.objects.filter(is_approved=True).select_related('user').order_by('-spin_date')[:10]
+    context = {'roulette_spins': user.roulette_spins, 'prizes_list': prizes_list, 'recent_winners': recent_winners, 'idempotency_key': new_idempotency_key()}
     return render(request, 'roleta.html', context)
 
 @login_required
 @require_POST
 def spin_roulette(request):
+    return _spin_roulette(request)
+
+@login_required
+@require_POST
+async def aspin_roulette(request):
+    response = await stored_idempotent_response(request, 'spin_roulette')
+    if response is not None:
+        return response
+
+    user = await request.auser()
+    if not await CustomUser.objects.filter(pk=user.pk, roulette_spins__gt=0).aexists():
+        return JsonResponse({'success': False, 'message': 'Sem giros.'})
+    return await sync_to_async(_spin_roulette)(request)
+
+@idempotent(endpoint='spin_roulette')
+def _spin_roulette(request):
     user = request.user
     if not user.roulette_spins or user.roulette_spins <= 0:
         return JsonResponse({'success': False, 'message': 'Sem giros.'})
 
-    roulette_settings = RouletteSettings.objects.first()
-    prizes_raw = [p.strip() for p in roulette_settings.prizes.split(',')] if roulette_settings and roulette_settings.prizes else ['0', '500', '1000', '0', '5000', '200', '0', '10000']
-    weighted_pool = []
-    for p in prizes_raw:
-        val = Decimal(p)
-        if val == 0: weighted_pool.extend([p] * 10)
-        elif val <= 500: weighted_pool.extend([p] * 5)
-        else: weighted_pool.append(p)
-
-    winning_prize_str = random.choice(weighted_pool)
-    prize_amount = Decimal(winning_prize_str)
-    user.roulette_spins -= 1
-    user.subsidy_balance += prize_amount
-    user.available_balance += prize_amount
-    user.save()
-    Roulette.objects.create(user=user, prize=prize_amount, is_approved=True)
+    sampler = get_sampler()
+    winner = sampler.draw()
+    winning_prize_str = sampler.prizes[winner]
+    prize_amount = sampler.amounts[winner]
+    with transaction.atomic():
+        if not CustomUser.objects.filter(pk=user.pk, roulette_spins__gt=0).update(roulette_spins=F('roulette_spins') - 1):
+            return JsonResponse({'success': False, 'message': 'Sem giros.'})
+        roulette = Roulette.objects.create(user=user, prize=prize_amount, is_approved=True)
+        ledger.post(user, prize_amount, 'roulette', subsidy=True, reference=f'roulette:{roulette.pk}')
+        metrics.record(metrics.ROULETTE_SPINS)
+    user.refresh_from_db(fields=['roulette_spins'])
 
     return JsonResponse({'success': True, 'prize': winning_prize_str, 'remaining_spins': user.roulette_spins})
 
 @login_required
 def sobre(request):
-    platform_settings = PlatformSettings.objects.first()
-    history_text = platform_settings.history_text if platform_settings else 'Informação indisponível.'
+    history_text = config_cache.platform_setting('history_text', 'Informação indisponível.')
     return render(request, 'sobre.html', {'history_text': history_text})
 
 @login_required
 def perfil(request):
     bank_details, _ = BankDetails.objects.get_or_create(user=request.user)
-    withdrawal_records = Withdrawal.objects.filter(user=request.user).order_by('-created_at')
+    withdrawal_records, history_cursor = history.withdrawal_page(request.user)
     if request.method == 'POST':
         if 'update_bank' in request.POST:
             form = BankDetailsForm(request.POST, instance=bank_details)
@@ -418,26 +428,47 @@ def perfil(request):
         'password_form': PasswordChangeForm(request.user),
         'user_levels': UserLevel.objects.filter(user=request.user, is_active=True),
         'withdrawal_records': withdrawal_records,
+        'history_cursor': history_cursor,
     }
     return render(request, 'perfil.html', context)
 
 @login_required
-def renda(request):
-    user = request.user
-    active_level = UserLevel.objects.filter(user=user, is_active=True).first()
-    approved_deposit_total = Deposit.objects.filter(user=user, is_approved=True).aggregate(Sum('amount'))['amount__sum'] or 0
-    today = date.today()
-    daily_income = Task.objects.filter(user=user, completed_at__date=today).aggregate(Sum('earnings'))['earnings__sum'] or 0
-    total_withdrawals = Withdrawal.objects.filter(user=user, status='Aprovado').aggregate(Sum('amount'))['amount__sum'] or 0
-    total_income = (Task.objects.filter(user=user).aggregate(Sum('earnings'))['earnings__sum'] or 0) + user.subsidy_balance
-    
-    context = {
+def withdrawal_history(request):
+    try:
+        records, next_cursor = history.withdrawal_page(request.user, request.GET.get('cursor'))
+    except history.InvalidCursor as e:
+        return JsonResponse({'success': False, 'message': str(e)}, status=400)
+    return JsonResponse({
+        'success': True,
+        'records': [
+            {
+                'date': timezone.localtime(record.created_at).strftime('%d/%m/%Y'),
+                'amount': str(record.amount),
+                'status': record.status,
+            }
+            for record in records
+        ],
+        'next_cursor': next_cursor,
+    })
+
+def _renda_context(user, dashboard):
+    return {
         'user': user,
-        'active_level': active_level,
-        'approved_deposit_total': approved_deposit_total,
-        'daily_income': daily_income,
-        'total_withdrawals': total_withdrawals,
-        'total_income': total_income,
+        'dashboard': dashboard,
+        'approved_deposit_total': dashboard['approved_deposit_total'],
+        'daily_income': dashboard['daily_income'],
+        'total_withdrawals': dashboard['total_withdrawals'],
+        'total_income': dashboard['total_income'],
     }
-    return render(request, 'renda.html', context)
+
+@login_required
+def renda(request):
+    user = request.user
+    return render(request, 'renda.html', _renda_context(user, get_dashboard(user)))
+
+@login_required
+async def arenda(request):
+    user = await request.auser()
+    context = _renda_context(user, await aget_dashboard(user))
+    return await sync_to_async(render)(request, 'renda.html', context)
     
\ No newline at end of file
@@ -0,0 +1,143 @@
+import gc
+import math
+import os
+import shutil
+import tempfile
+
+# Métricas Prometheus partilhadas entre workers: cada processo grava os seus valores neste diretório.
+# Tem de estar definido antes de a aplicação importar o prometheus_client.
+os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', os.path.join(tempfile.gettempdir(), 'airways-prometheus'))
+# Com preload_app o master importa a aplicação (e cria as métricas) antes do on_starting
+os.makedirs(os.environ['PROMETHEUS_MULTIPROC_DIR'], exist_ok=True)
+
+# SERVER_MODE=wsgi (padrão): workers síncronos, um pedido de cada vez por worker.
+# SERVER_MODE=asgi: workers uvicorn; as vistas async (process_task, spin_roulette, menu, renda) libertam
+# o event loop enquanto esperam pela base de dados e o worker atende outras ligações entretanto.
+SERVER_MODE = os.environ.get('SERVER_MODE', 'wsgi')
+if SERVER_MODE not in ('wsgi', 'asgi'):
+    raise RuntimeError(f'SERVER_MODE inválido: {SERVER_MODE!r} (use wsgi ou asgi)')
+
+
+def _read(path):
+    try:
+        with open(path) as f:
+            return f.read().split()
+    except OSError:
+        return None
+
+
+def available_cpus():
+    """CPUs que o processo pode usar: afinidade (taskset) e quota do cgroup do contentor."""
+    cpus = len(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else os.cpu_count() or 1
+    # cgroup v2 ("max 100000" ou "50000 100000") e v1
+    quota = _read('/sys/fs/cgroup/cpu.max')
+    if quota is None:
+        v1 = (_read('/sys/fs/cgroup/cpu/cpu.cfs_quota_us'), _read('/sys/fs/cgroup/cpu/cpu.cfs_period_us'))
+        quota = v1[0] + v1[1] if None not in v1 else None
+    if quota and quota[0] not in ('max', '-1'):
+        cpus = min(cpus, math.ceil(int(quota[0]) / int(quota[1])))
+    return max(cpus, 1)
+
+
+def available_memory_mb():
+    """Memória do contentor (limite do cgroup) ou, sem limite, a memória física."""
+    total = os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES')
+    for path in ('/sys/fs/cgroup/memory.max', '/sys/fs/cgroup/memory/memory.limit_in_bytes'):
+        limit = _read(path)
+        if limit and limit[0].isdigit():
+            total = min(total, int(limit[0]))
+            break
+    return total // (1024 * 1024)
+
+
+# Memória reservada a cada worker. Com preload_app cada worker ocupa ~25 MB próprios (PSS) depois
+# de aquecido; a margem cobre os caches em memória e o crescimento até à reciclagem.
+WORKER_MEMORY_MB = int(os.environ.get('GUNICORN_WORKER_MEMORY_MB', 96))
+
+CPUS = available_cpus()
+MEMORY_MB = available_memory_mb()
+if SERVER_MODE == 'asgi':
+    # Um event loop por CPU; a concorrência vem das vistas async e não de threads do gunicorn
+    wsgi_app = 'airways.asgi:application'
+    worker_class = 'uvicorn_worker.UvicornWorker'
+    slots = CPUS
+else:
+    wsgi_app = 'airways.wsgi:application'
+    # A regra 2 x CPUs + 1 do gunicorn: metade dos pedidos está à espera da base de dados
+    slots = 2 * CPUS + 1
+# Processos até onde a memória chega; os pedidos simultâneos que faltam passam a threads, que partilham
+# a memória do worker. Cada thread mantém a sua ligação à base de dados (CONN_MAX_AGE), por isso
+# workers x threads tem de caber no limite de ligações do PostgreSQL.
+workers = int(os.environ.get('WEB_CONCURRENCY') or max(1, min(slots, MEMORY_MB // WORKER_MEMORY_MB)))
+if SERVER_MODE == 'wsgi':
+    threads = int(os.environ.get('GUNICORN_THREADS') or math.ceil(slots / workers))
+    if threads > 1:
+        worker_class = 'gthread'
+
+# Importa a aplicação no master antes do fork: o código e os dados lidos no arranque ficam em páginas
+# partilhadas (copy-on-write) entre os workers. O reload por HUP deixa de recarregar o código.
+preload_app = True
+
+# Recicla cada worker ao fim de ~1000 pedidos (fugas de memória, fragmentação); o jitter evita que
+# todos reiniciem ao mesmo tempo. O graceful_timeout deixa terminar os pedidos em curso.
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 1000))
+max_requests_jitter = max_requests // 10
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 30))
+graceful_timeout = 30
+# Ligações keep-alive do proxy da plataforma (gthread e uvicorn; o worker síncrono fecha sempre)
+keepalive = 5
+# O heartbeat dos workers em memória: num disco lento o master mataria workers saudáveis
+if os.path.isdir('/dev/shm'):
+    worker_tmp_dir = '/dev/shm'
+
+
+def on_starting(server):
+    # Descarta os ficheiros de uma execução anterior do master
+    path = os.environ['PROMETHEUS_MULTIPROC_DIR']
+    shutil.rmtree(path, ignore_errors=True)
+    os.makedirs(path, exist_ok=True)
+
+
+def when_ready(server):
+    server.log.info(
+        'Modo %s: %d workers x %d threads (%s; %d CPUs, %d MB, %d MB por worker)',
+        SERVER_MODE, server.cfg.workers, server.cfg.threads, server.cfg.worker_class_str,
+        CPUS, MEMORY_MB, WORKER_MEMORY_MB,
+    )
+
+
+def pre_fork(server, worker):
+    # Move os objetos carregados pelo master para fora do alcance do GC: sem isto, a primeira recolha de
+    # cada worker escreve nos cabeçalhos desses objetos e copia as páginas partilhadas pelo preload
+    gc.freeze()
+
+
+def post_request(worker, req, environ, resp):
+    # Só nos workers sync/gthread; o uvicorn não chama os hooks por pedido
+    from core import metrics
+
+    metrics.observe_worker(worker)
+
+
+def worker_abort(worker):
+    # SIGABRT do master: o pedido ultrapassou o timeout
+    worker.timed_out = True
+
+
+def worker_exit(server, worker):
+    # O uvicorn recicla pelo seu próprio contador (limit_max_requests): as saídas contam como shutdown
+    from core import metrics
+
+    if getattr(worker, 'timed_out', False):
+        reason = 'timeout'
+    elif worker.nr >= worker.max_requests:
+        reason = 'max_requests'
+    else:
+        reason = 'shutdown'
+    metrics.WORKER_EXITS.labels(reason).inc()
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+
+    multiprocess.mark_process_dead(worker.pid)